@@ -8,6 +8,45 @@
 import struct
 import os
 import array
+import utime
+
+## @brief     Scale from raw gyro counts to rad/s
+#  @details   The BNO055 reports 900 LSB per rad/s
+GYR_SCALE = 1/900
+## @brief     Scale from raw Euler angle counts to degrees
+#  @details   The BNO055 reports 16 LSB per degree
+EUL_SCALE = 1/16
+## @brief     Operating mode register
+OPR_MODE = 0x3D
+## @brief     Operating mode value for CONFIG mode
+#  @details   The only mode in which the calibration profile can be written
+CONFIG_MODE = 0x00
+## @brief     Operating mode value for NDOF fusion mode
+NDOF_MODE = 0x0C
+## @brief     First calibration profile register
+#  @details   The profile occupies registers 0x55 to 0x6A
+CALIB_DATA = 0x55
+## @brief     Length of the calibration profile in bytes
+CALIB_LEN = 22
+## @brief     File used to store the calibration profile
+CALIB_FILE = 'IMU_cal_coeffs.bin'
+## @brief     Magic number at the start of a calibration profile file
+CALIB_MAGIC = b'BC'
+## @brief     Length of a calibration profile file in bytes
+#  @details   Magic number, profile and checksum
+CALIB_FILE_LEN = 2 + CALIB_LEN + 2
+
+def _fletcher16 (data):
+    ''' @brief      Computes the Fletcher-16 checksum of a buffer
+        @param data The bytes to check
+        @return     The 16-bit checksum
+    '''
+    a = 0
+    b = 0
+    for byte in data:
+        a = (a + byte) % 255
+        b = (b + a) % 255
+    return (b << 8) | a
 
 class BNO055:
     ''' @brief    An orientation sensor driver class for the BNO055 from Bosch Sensortec.
@@ -29,18 +68,57 @@ class BNO055:
         self.i2c = i2c
         ## @brief     An array filled with calibration coefficients read by the i2c
         #  @details   Defines a variable that specifies the calibration coefficients array.
-        self.calib_coefs = array.array('b', 22*[0])
+        self.calib_coefs = bytearray(CALIB_LEN)
         ## @brief     A boolean flag used to start IMU calibration
         #  @details   Works with the task IMU and user interface to do IMU calibration
         self.calib_IMU_flag = calib_IMU_flag
+        ## @brief     Raw gyro and Euler angle registers
+        #  @details   Registers 0x14 to 0x1F are read straight into this array of signed 16-bit
+        #             values, which on the little-endian STM32 needs no further decoding.
+        #             Ordered [gyr_x, gyr_y, gyr_z, heading, roll, pitch].
+        self._state_raw = array.array('h', 6*[0])
+        ## @brief     Scaled gyro rates and Euler angles
+        #  @details   Filled by read_state() in the order [gyr_x, gyr_y, gyr_z, heading, roll, pitch],
+        #             with rates in rad/s and angles in degrees
+        self.state = array.array('f', 6*[0])
+        ## @brief     Last calibration status register value reported to the user
+        #  @details   Used to print the status only when it changes during calibration,
+        #             and -1 before the first call of a calibration
+        self._last_cal_byte = -1
+        # The operating mode is set once here rather than before every read,
+        # after restoring any saved calibration profile
+        self.begin()
         
+    def set_mode (self, mode):
+        ''' @brief        Switches the operating mode
+            @details      Waits for the mode switch to complete, which takes up to 19 ms
+                          when leaving CONFIG mode.
+            @param mode   The new value of the OPR_MODE register, such as CONFIG_MODE or NDOF_MODE
+        '''
+        self.i2c.mem_write(mode, 0x28, OPR_MODE)
+        utime.sleep_ms(20)
+    
     def set_operating (self):
         ''' @brief Sets operating mode
         '''
-        self.i2c.mem_write(0x0C, 0x28, 0x3D)
+        self.i2c.mem_write(NDOF_MODE, 0x28, OPR_MODE)
+    
+    def begin (self):
+        ''' @brief    Restores any saved calibration profile and starts fusion
+            @details  Called once at boot. The profile registers can only be written in
+                      CONFIG mode, so the profile is restored there before switching to NDOF.
+            @return   True if a saved calibration profile was restored
+        '''
+        profile = self.load_calib_profile()
+        if profile is not None:
+            self.set_mode(CONFIG_MODE)
+            self.i2c.mem_write(profile, 0x28, CALIB_DATA)
+        self.set_mode(NDOF_MODE)
+        return profile is not None
     
     def get_calib_status (self):
         ''' @brief Gets calibration status of the i2c
+            @return A tuple of the (mag, acc, gyr, sys) calibration levels, each from 0 to 3
         '''
         cal_bytes = self.i2c.mem_read(1, 0x28, 0x35)
         print('Calibration Status')
@@ -49,41 +127,81 @@ class BNO055:
                      (cal_bytes[0] & 0b11 <<4) >> 4,
                      (cal_bytes[0] & 0b11 <<6) >> 6)
         print("Values:", self._cal_status)
-        print('\n')        
+        print('\n')
+        return self._cal_status
     
     def get_calib_coef (self):
-        ''' @brief Gets calibration coefficients of the i2c
+        ''' @brief   Gets calibration coefficients of the i2c
+            @details The 22 profile registers are only valid in CONFIG mode, so the sensor
+                     is briefly taken out of fusion mode while they are read.
+            @return  The calib_coefs bytearray holding the profile
         '''
-        #create byte array of 22 spots, read all 
-        self.calib_coefs = array.array('b', 22*[0])
-        self._calib_coef.decode('utf-8')
-        print(self.calib_coef)
+        self.set_mode(CONFIG_MODE)
+        self.i2c.mem_read(self.calib_coefs, 0x28, CALIB_DATA)
+        self.set_mode(NDOF_MODE)
+        return self.calib_coefs
+    
+    def save_calib_profile (self, filename=CALIB_FILE):
+        ''' @brief          Saves the current calibration profile to a binary file
+            @details        The file holds a 2 byte magic number, the 22 profile bytes and a
+                            Fletcher-16 checksum of the profile.
+            @param filename The file to write
+        '''
+        profile = self.get_calib_coef()
+        with open(filename, 'wb') as f:
+            f.write(CALIB_MAGIC)
+            f.write(profile)
+            f.write(struct.pack('<H', _fletcher16(profile)))
+    
+    def load_calib_profile (self, filename=CALIB_FILE):
+        ''' @brief          Reads a calibration profile saved by save_calib_profile()
+            @param filename The file to read
+            @return         The 22 profile bytes, or None if the file is missing or corrupt
+        '''
+        if filename not in os.listdir():
+            return None
+        with open(filename, 'rb') as f:
+            data = f.read()
+        if len(data) != CALIB_FILE_LEN or data[0:2] != CALIB_MAGIC:
+            return None
+        profile = data[2:2 + CALIB_LEN]
+        if struct.unpack('<H', data[2 + CALIB_LEN:])[0] != _fletcher16(profile):
+            return None
+        return profile
+    
+    def delete_calib_profile (self, filename=CALIB_FILE):
+        ''' @brief          Deletes a calibration profile saved by save_calib_profile()
+            @param filename The file to delete
+            @return         True if a saved profile was deleted
+        '''
+        if filename not in os.listdir():
+            return False
+        os.remove(filename)
+        return True
         
     def set_calib_coef (self):
-        ''' @brief Sets calibration status of the i2c
+        ''' @brief   Sets calibration status of the i2c
+            @details Always runs a fresh manual calibration: the first call deletes any saved
+                     profile, so a stale one is not restored at the next boot, and later calls
+                     wait for the user to calibrate the sensor by hand. The profile is saved
+                     once every calibration level reads 3 and the calibration flag is then
+                     cleared. Saved profiles are only restored by begin().
         '''
-        filename = "IMU_cal_coeffs.txt"
-        if filename in os.listdir():
-            with open(filename, 'r') as f:
-                cal_data_string = f.readline()
-                cal_values = bytes(int(cal_value) for cal_value in cal_data_string.strip().split(','))              
-                self._calib_coef = self.i2c.mem_write(cal_values,0x28,0x55)
-                print('IMU Calibrated.')
-                self.calib_IMU_flag.write(0)
-        else:
-            with open(filename, 'w') as f:
-                if self._cal_status == bytearray('3,3,3,3'):
-                    
-                    #array.array('b', 22*[0]) = cal_values
-                    
-                    #IMU_coefs = (R55, R56, R57, R58, R59, R5A, R5B, R5C, R5D, R5E, R5F, R60, R61, R62, R63, R64, R65, R66, R67, R68, R69, RA) 
-                    #f.write(f"{R55}, {R56}, {R57}, {R58}, {R59}, {R5A}, {R5B}, {R5C}, {R5D}, {R5E}, {R5F}, {R60}, {R61}, {R62}, {R63}, {R64}, {R65}, {R66}, {R67}, {R68}, {R69}, {RA}\r\n")
-                    pass
+        if self._last_cal_byte == -1 and self.delete_calib_profile():
+            print('Saved IMU calibration profile deleted.')
+        status = self.i2c.mem_read(1, 0x28, 0x35)[0]
+        if status != self._last_cal_byte:
+            self._last_cal_byte = status
+            self.get_calib_status()
+        if status == 0xFF:
+            self.save_calib_profile()
+            print('IMU Calibrated. Calibration profile saved.')
+            self.calib_IMU_flag.write(0)
+            self._last_cal_byte = -1
         
     def euler_angle (self):
         ''' @brief Obtains and returns euler angles measured by the i2c
         '''
-        self.set_operating()
         eul_bytes = bytearray(6)
         eul_bytes = self.i2c.mem_read(eul_bytes, 0x28, 0x1A)    
         eul_signed_ints = struct.unpack('<hhh', eul_bytes)       
@@ -94,10 +212,28 @@ class BNO055:
     def angular_vel (self):
         ''' @brief Obtains and returns angular velocity measured by the i2c
         '''
-        self.set_operating()
         ang_bytes = bytearray(6)
         ang_bytes = self.i2c.mem_read(ang_bytes, 0x28, 0x14)
         ang_signed_ints = struct.unpack('<hhh', ang_bytes)        
         ang_vals = tuple(ang_int/900 for ang_int in ang_signed_ints)
         return(ang_vals)
-  
\ No newline at end of file
+    
+    def read_state (self):
+        ''' @brief   Reads gyro rates and Euler angles in a single I2C transaction
+            @details The gyro (0x14 to 0x19) and Euler (0x1A to 0x1F) registers are contiguous,
+                     so one burst read fetches both into a preallocated buffer.
+            @return  The state array [gyr_x, gyr_y, gyr_z, heading, roll, pitch] with rates
+                     in rad/s and angles in degrees. The same array is reused by every call.
+        '''
+        raw = self._state_raw
+        state = self.state
+        gyr = GYR_SCALE
+        eul = EUL_SCALE
+        self.i2c.mem_read(raw, 0x28, 0x14)
+        state[0] = raw[0]*gyr
+        state[1] = raw[1]*gyr
+        state[2] = raw[2]*gyr
+        state[3] = raw[3]*eul
+        state[4] = raw[4]*eul
+        state[5] = raw[5]*eul
+        return state
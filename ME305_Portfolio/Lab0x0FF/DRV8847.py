@@ -7,6 +7,7 @@
 '''
 import pyb
 import utime
+import shares
 
 
 class DRV8847:
@@ -17,12 +18,14 @@ class DRV8847:
     '''
 
 
-    def __init__ (self, nSLEEP, nFAULT, tim):
+    def __init__ (self, nSLEEP, nFAULT, tim, retries=0, backoff_ms=100):
         ''' @brief              Constructs a motor driver object
             @details            The motor driver object is created from three attributes: nSLEEP, nFAULT, and timer number.
             @param nSLEEP       This is an active-high enable pin that corresponds to pin A15
             @param nFAULT       This is a pin that detects faults and corresponds to pin B2
             @param tim          Variable that specifies timer number
+            @param retries      Number of times retry() may re-enable the driver after a fault
+            @param backoff_ms   Delay before the first retry, doubled after every failed retry
         '''
         ## @brief     This is an active-high enable pin that corresponds to pin A15
         #  @details   When set on high, it enables the motors. When set on low, it disables the motors.
@@ -34,8 +37,22 @@ class DRV8847:
         #  @details   Uses an attribute of frequency to create a timer object
         self.tim = pyb.Timer(tim, freq = 20000)
         ## @brief     A boolean flag that signals the motor of a fault detection
-        #  @details   This variable initializes the fault callback flag
+        #  @details   Set by the interrupt and cleared by reset_fault() or a successful retry()
         self.fault_cb_flag = 0
+        ## @brief     Number of fault interrupts since the driver was created
+        self.fault_count = 0
+        ## @brief     The utime.ticks_us() value of each fault interrupt not yet handled
+        #  @details   Filled by fault_cb() and emptied by handle_fault(). Once full, later
+        #             interrupts are counted in fault_times.dropped instead.
+        self.fault_times = shares.Queue(8, 'l', shares.DROP_NEWEST)
+        ## @brief     Number of automatic retries allowed after a fault
+        self.retries = retries
+        ## @brief     Delay, in milliseconds, before the first retry
+        self.backoff_ms = backoff_ms
+        ## @brief     Number of retries made since the last reset_fault()
+        self.attempts = 0
+        ## @brief     The utime.ticks_ms() value after which the next retry may be made
+        self.retry_time = 0
         ## @brief     Registers the callback function and causes an interrupt when fault is triggered
         #  @details   Defines a variable for the interrupt request for fault detection
         self.fault = pyb.ExtInt(self.nFAULT, mode=pyb.ExtInt.IRQ_FALLING, pull=pyb.Pin.PULL_NONE, callback=self.fault_cb)       
@@ -57,66 +74,152 @@ class DRV8847:
         self.nSLEEP.low()
         pass
     
-    def fault_cb (self, IRQ_irc):
-        ''' @brief Callback function to run on fault condition.
+    def fault_cb (self, IRQ_src):
+        ''' @brief   Callback function to run on fault condition.
+            @details Runs in hard interrupt context, so it puts the driver to sleep at once and
+                     only queues the time of the fault, neither of which allocates. Logging and
+                     retries are left to handle_fault().
             @param IRQ_src The source of the interrupt request.
         '''
+        self.nSLEEP.low()
+        self.fault_times.put(utime.ticks_us())
         self.fault_cb_flag = 1
+        self.fault_count += 1
+    
+    def handle_fault (self):
+        ''' @brief   Reports a fault and schedules the next retry.
+            @details Called outside interrupt context, normally by the motor task once it has
+                     stopped the motors. The driver was already put to sleep by fault_cb().
+                     Every queued fault interrupt is consumed.
+            @return  The time, in microseconds, from the first queued fault interrupt to the
+                     fault being handled
+        '''
         self.disable()
-        print('Error: Fault detected')
-        pass
+        now = utime.ticks_us()
+        latency = 0
+        if self.fault_times.num_in():
+            latency = utime.ticks_diff(now, self.fault_times.get())
+            self.fault_times.clear()
+        self.retry_time = utime.ticks_add(utime.ticks_ms(), self.backoff_ms << self.attempts)
+        print('Error: Fault detected, handled after {:} us'.format(latency))
+        return latency
+    
+    def can_retry (self):
+        ''' @brief   Checks whether an automatic retry is still allowed
+            @return  True if fewer than retries attempts have been made since reset_fault()
+        '''
+        return self.attempts < self.retries
+    
+    def retry (self):
+        ''' @brief   Re-enables the driver once the backoff delay has passed.
+            @details If nFAULT is still low after waking the driver, it is put back to sleep and
+                     the next delay is doubled.
+            @return  True if the driver was re-enabled and reports no fault
+        '''
+        if not self.can_retry() or utime.ticks_diff(utime.ticks_ms(), self.retry_time) < 0:
+            return False
+        self.attempts += 1
+        #Cleared before waking the driver so a fault from here on is recorded and kept
+        self.fault_times.clear()
+        self.fault_cb_flag = 0
+        self.enable()
+        if self.nFAULT.value() == 0:
+            self.disable()
+            self.retry_time = utime.ticks_add(utime.ticks_ms(), self.backoff_ms << self.attempts)
+            print('Fault persists, retry {:} of {:} failed'.format(self.attempts, self.retries))
+            return False
+        print('Fault cleared, driver re-enabled')
+        return True
+    
+    def reset_fault (self):
+        ''' @brief Clears the fault flag and the retry count before the driver is enabled by the user.
+        '''
+        self.fault_times.clear()
+        self.fault_cb_flag = 0
+        self.attempts = 0
     
-    def motor (self, pinA, pinB, channel_A, channel_B): 
+    def motor (self, pinA, pinB, channel_A, channel_B, deadband=0, threshold=0): 
         ''' @brief Initializes and return a motor object associated with DRV8847.
+            @param deadband   Duty cycle, in percent, needed to overcome static friction
+            @param threshold  Smallest duty cycle magnitude, in percent, that is not treated as zero
             @return An object of class Motor
         '''
-        return Motor(pinA, pinB, channel_A, channel_B, self.tim)
+        return Motor(pinA, pinB, channel_A, channel_B, self.tim, deadband, threshold)
     
 class Motor:
     ''' @brief A motor class for one channel of the DRV8847.
         @details Objects of this class can be used to apply PWM to a given DC motor.
+                 The duty cycle last written to each channel is cached so that a
+                 timer register is only written when its value changes.
     '''
 
-    def __init__ (self, pinA, pinB, channel_A, channel_B, tim):
+    def __init__ (self, pinA, pinB, channel_A, channel_B, tim, deadband=0, threshold=0):
         ''' @brief Initializes and returns a motor object associated wtih the DRV8847.
             @details Objects of this class should not be instantiated directly. Instead
                      create a DRV8847 object and use that to create Motor objects using
                      the method DRV8847.motor().
+            @param deadband   Duty cycle, in percent, needed to overcome static friction
+            @param threshold  Smallest duty cycle magnitude, in percent, that is not treated as zero
         '''
         ## @brief     Variable that specifies timer number
         #  @details   This variable was created to generalize timer number and allow for specification in task files
         self.tim = tim
         ## @brief     Variable that specifies channel number corresponding to motor 1
         #  @details   This variable was created to generalize channel number and allow for specification in task files
-        self.channel_A = self.tim.channel(channel_A, pyb.Timer.PWM, pin=pinA)
+        self.channel_A = self.tim.channel(channel_A, pyb.Timer.PWM, pin=pinA, pulse_width_percent=0)
         ## @brief     Variable that specifies channel number corresponding to motor 2
         #  @details   This variable was created to generalize channel number and allow for specification in task files
-        self.channel_B = self.tim.channel(channel_B, pyb.Timer.PWM, pin=pinB)
+        self.channel_B = self.tim.channel(channel_B, pyb.Timer.PWM, pin=pinB, pulse_width_percent=0)
+        ## @brief     Duty cycle last written to channel A
+        self.duty_A = 0
+        ## @brief     Duty cycle last written to channel B
+        self.duty_B = 0
+        ## @brief     Variable that defines duty cycle for PWM input
+        #  @details   The signed duty cycle requested by the last call to set_duty()
+        self.duty = 0
+        self.set_deadband(deadband, threshold)
         pass
     
+    def set_deadband (self, deadband, threshold=0):
+        ''' @brief   Sets the static friction compensation of the motor.
+            @details A requested duty cycle d with magnitude of at least threshold is applied as
+                     deadband + |d|*(100 - deadband)/100 in the direction of d, so the smallest
+                     nonzero request already overcomes static friction while 100 percent is
+                     unchanged. Requests below threshold stop the motor instead of chattering.
+            @param deadband   Duty cycle, in percent, needed to overcome static friction
+            @param threshold  Smallest duty cycle magnitude, in percent, that is not treated as zero
+        '''
+        ## @brief     Duty cycle, in percent, added to overcome static friction
+        self.deadband = deadband
+        ## @brief     Smallest duty cycle magnitude that drives the motor
+        self.threshold = threshold
+        ## @brief     Scale applied to requested duty cycles above the deadband
+        self._db_scale = (100 - deadband)/100
+    
     def set_duty (self, duty):
         ''' @brief Set the PWM duty cycle for the motor channel.
             @details This method sets the duty cycle to be sent to the motor to the 
                      given level. Positive values cause effort in one direction, 
-                     negative values in the opposite direction.
+                     negative values in the opposite direction. Channels whose
+                     duty cycle is unchanged are not written.
             @param duty A signed number holding the duty cycle of the PWM signal sent to the motor.
         '''
-        # forward motion
-        ## @brief     Variable that defines duty cycle for PWM input
-        #  @details   Duty cycle values control motor speed
         self.duty = duty
-        if self.duty > 0:
-            self.channel_A.pulse_width_percent(self.duty)
-            self.channel_B.pulse_width_percent(0)
-            
+        duty_A = 0
+        duty_B = 0
+        # forward motion
+        if duty > 0:
+            if duty >= self.threshold:
+                duty_A = self.deadband + duty*self._db_scale
         # backward motion
-        if self.duty < 0:
-            self.channel_A.pulse_width_percent(0)
-            self.channel_B.pulse_width_percent(-self.duty)
+        elif duty < 0:
+            if -duty >= self.threshold:
+                duty_B = self.deadband - duty*self._db_scale
+        # no motion leaves both channels at 0
         
-        # no motion
-        if self.duty == 0:
-            self.channel_A.pulse_width_percent(0)
-            self.channel_A.pulse_width_percent(0)
-        pass
-    
+        if duty_A != self.duty_A:
+            self.channel_A.pulse_width_percent(duty_A)
+            self.duty_A = duty_A
+        if duty_B != self.duty_B:
+            self.channel_B.pulse_width_percent(duty_B)
+            self.duty_B = duty_B
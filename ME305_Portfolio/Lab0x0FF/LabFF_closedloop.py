@@ -6,7 +6,11 @@
    @date        November 15, 2021
 '''
 
-from ulab import numpy as np
+import array
+
+## @brief     Conversion from motor torque to PWM duty cycle in percent
+#  @details   Duty = 100*R*T/(Kt*Vdc) for the DRV8847 and motor constants, which works out to 13.345*100/4
+DUTY_PER_TORQUE = 13.345*100/4
 
 class ClosedLoop:
     ''' @brief   A closed loop speed control used in conjuction with the motor and encoder drivers
@@ -20,7 +24,7 @@ class ClosedLoop:
             @param sat_max    Variable used to define maximum saturation limit for the PWM level used for motor speed
             @param sat_min    Variable used to define minimum saturation limit for the PWM level used for motor speed
             @param L          Variable used to define actuation level
-            @state_vect       Variable used to define state vectors
+            @param state_vect A shares.StateVector holding the state vector
             @param gain       Variable used to define proportional gain value
         '''
         ## @brief    Variable used to define maximum saturation limit for the PWM level
@@ -35,36 +39,121 @@ class ClosedLoop:
         ## @brief    Variable used to define proportional gain value
         #  @details  This value is the proportional gain inputted by the user.
         self.gain = gain
-        ## @brief    Variable used to define state vectors
-        #  @details  This array is filled with data in the following order: [position, velocity, angle, angular velocity]
+        ## @brief    Gains mapping the state vector directly to duty cycle
+        #  @details  The negated gains multiplied by DUTY_PER_TORQUE, folded together once in set_gain()
+        self.duty_gain = array.array('f', 4*[0])
+        self.set_gain(gain)
+        ## @brief    Shared state vector read by the controller
+        #  @details  Filled with data in the following order: [position, angle, velocity, angular velocity]
         self.state_vect = state_vect
         
     def run (self):
         ''' @brief Uses state vector values and gain values to compute torque to compute actuation value L.
+            @details Computes the saturated duty cycle directly from the folded gains and writes L once.
+                     No arrays or lists are created.
         '''
-        ## @brief    Variable used to define the array for state vectors
-        #  @details  This array will be filled with state vector data read from the touch panel and IMU
-        self.state_vect_array = np.array([self.state_vect[0].read(), self.state_vect[1].read(), self.state_vect[2].read(), self.state_vect[3].read()])                  
-        ## @brief    Variable used to define the torque calculated
-        #  @details  This value is calculated using gain values and the state vector values
-        self.Torque = np.dot(-self.gain,self.state_vect_array)
-        self.L.write((13.345)*self.Torque*100/4)
-        if self.L.read() > self.sat_max:
-           self.L.write(self.sat_max)
-        if self.L.read() < self.sat_min:
-           self.L.write(self.sat_min)
-        pass                  
-                           
+        k = self.duty_gain
+        state_vect = self.state_vect
+        #Reads the state vector in place, repeating if a sensor update intervened
+        while True:
+            seq = state_vect.read_begin()
+            values = state_vect.values
+            duty = k[0]*values[0] + k[1]*values[1] + k[2]*values[2] + k[3]*values[3]
+            if not state_vect.read_retry(seq):
+                break
+        if duty > self.sat_max:
+            duty = self.sat_max
+        elif duty < self.sat_min:
+            duty = self.sat_min
+        self.L.write(duty)
     
-    def get__Kp (self):
-        ''' @brief Returns gain value for modification
+    def set_gain (self, gain):
+        ''' @brief      Sets the controller gains
+            @details    The sign of the control law and the torque to duty conversion are folded
+                        into duty_gain here so that run() needs only four multiplications.
+            @param gain The four gains ordered like the state vector, in N*m per state unit
         '''
-        return self.Kp
-        
+        self.gain = gain
+        for i in range(4):
+            self.duty_gain[i] = -gain[i]*DUTY_PER_TORQUE
+
+class ClosedLoopPair:
+    ''' @brief   Closed loop control of both platform axes at once
+        @details Evaluates the two state feedback laws as one 2x4 gain matrix product, so both
+                 duty cycles are computed from the same instant of the two state vectors.
+    '''
 
-    def set__Kp (self, Kp):
-        ''' @brief Sets modified gain value
+    def __init__ (self, sat_max, sat_min, L_1, L_2, state_vect_x, state_vect_y, gain):
+        ''' @brief              Constructs a two axis controller object
+            @param sat_max      Variable used to define maximum saturation limit for the PWM level used for motor speed
+            @param sat_min      Variable used to define minimum saturation limit for the PWM level used for motor speed
+            @param L_1          Variable used to define actuation level for motor 1
+            @param L_2          Variable used to define actuation level for motor 2
+            @param state_vect_x A shares.StateVector holding state vector x, which drives motor 1
+            @param state_vect_y A shares.StateVector holding state vector y, which drives motor 2
+            @param gain         A 2x4 gain matrix whose rows are the x and y gains
+        '''
+        ## @brief    Variable used to define maximum saturation limit for the PWM level
+        self.sat_max = sat_max
+        ## @brief    Variable used to define minimum saturation limit for the PWM level
+        self.sat_min = sat_min
+        ## @brief    Variable used to define actuation level for motor 1
+        self.L_1 = L_1
+        ## @brief    Variable used to define actuation level for motor 2
+        self.L_2 = L_2
+        ## @brief    Shared state vector x read by the controller
+        #  @details  Ordered [x, th_y, xd, th_yd]
+        self.state_vect_x = state_vect_x
+        ## @brief    Shared state vector y read by the controller
+        #  @details  Ordered [y, th_x, yd, th_xd]
+        self.state_vect_y = state_vect_y
+        ## @brief    Gain matrix mapping both state vectors directly to duty cycle
+        #  @details  Row major 2x4 matrix of the negated gains multiplied by DUTY_PER_TORQUE
+        self.duty_gain = array.array('f', 8*[0])
+        ## @brief    Saturated duty cycle computed for motor 1
+        self.duty_1 = 0
+        ## @brief    Saturated duty cycle computed for motor 2
+        self.duty_2 = 0
+        self.set_gain(gain)
+        
+    def run (self):
+        ''' @brief   Computes the saturated duty cycles of both motors
+            @details Results are stored in duty_1 and duty_2 and written once to L_1 and L_2.
+        '''
+        k = self.duty_gain
+        svx = self.state_vect_x
+        svy = self.state_vect_y
+        #Reads both state vectors in place, repeating if a sensor update intervened
+        while True:
+            seq_x = svx.read_begin()
+            seq_y = svy.read_begin()
+            x = svx.values
+            y = svy.values
+            duty_1 = k[0]*x[0] + k[1]*x[1] + k[2]*x[2] + k[3]*x[3]
+            duty_2 = k[4]*y[0] + k[5]*y[1] + k[6]*y[2] + k[7]*y[3]
+            if not (svx.read_retry(seq_x) or svy.read_retry(seq_y)):
+                break
+        sat_max = self.sat_max
+        sat_min = self.sat_min
+        if duty_1 > sat_max:
+            duty_1 = sat_max
+        elif duty_1 < sat_min:
+            duty_1 = sat_min
+        if duty_2 > sat_max:
+            duty_2 = sat_max
+        elif duty_2 < sat_min:
+            duty_2 = sat_min
+        self.duty_1 = duty_1
+        self.duty_2 = duty_2
+        self.L_1.write(duty_1)
+        self.L_2.write(duty_2)
+    
+    def set_gain (self, gain):
+        ''' @brief      Sets the controller gain matrix
+            @param gain A 2x4 gain matrix whose rows are the x and y gains, in N*m per state unit
         '''
-        ## @brief    Kp represents the proportional gain value
-        #  @details  This value is used for modification
-        self.Kp = Kp
\ No newline at end of file
+        ## @brief    The 2x4 gain matrix given by the user
+        self.gain = gain
+        for row in range(2):
+            for col in range(4):
+                self.duty_gain[4*row + col] = -gain[row][col]*DUTY_PER_TORQUE
@@ -0,0 +1,130 @@
+''' @file       LabFF_config.py
+    @brief      Boot time configuration of the Lab FF task graph.
+    @details    Reads a JSON file once at boot that declares which tasks run,
+                their periods and priorities, the gain matrix and the pin and
+                timer assignments. Any section left out of the file keeps the
+                value in DEFAULTS, so a bench file only needs the settings
+                being swept, for example
+
+                    {"control_freq": 2000,
+                     "tasks": [{"name": "panel",  "period": 500},
+                               {"name": "imu",    "period": 10000},
+                               {"name": "motors", "period": 500},
+                               {"name": "logger", "period": 500},
+                               {"name": "user",   "period": 50000}]}
+
+                The shares connecting the tasks are fixed by the task
+                constructors; leaving a task out of the list only stops it
+                from being scheduled.
+    @author     Faith Chau
+    @author     Luisa Chiu
+    @date       October 18, 2026
+'''
+
+import json
+import os
+
+## @brief     Name of the configuration file read at boot
+CONFIG_FILE = 'config.json'
+
+## @brief     Names of the tasks that can be listed in the configuration
+#  @details   panel and imu publish the state vectors, motors runs the controller,
+#             logger records frames for the data log and user runs the serial interface
+TASK_NAMES = ('panel', 'imu', 'motors', 'logger', 'user')
+
+## @brief     Configuration used for every section missing from the file
+#  @details   Periods and phases are in microseconds and frequencies in Hz. Tasks with a
+#             larger priority run first in a frame. When control_freq is nonzero, every task
+#             except user runs from a timer interrupt at control_freq, each on every
+#             round(period*control_freq/1e6)-th release. Ball velocities are estimated in mm/s;
+#             the velocity gains were tuned when the panel task reported mm/us, so they carry
+#             a factor of 1e-6. The logger task should follow the motors task so each frame
+#             holds the duty cycles computed from its state vectors; log.sink is a file name or
+#             'usb', and the buffered frames are written out every log.flush_period microseconds.
+#             record sets up the raw sensor recorder started with the 'r' key in the same way,
+#             with a ring of record.buffer bytes. The ring is allocated, and the drivers are
+#             wrapped, only once recording starts; a buffer of 0 disables the 'r' key.
+DEFAULTS = {
+    'tasks': [{'name': 'panel',  'period': 500,   'priority': 3},
+              {'name': 'imu',    'period': 10000, 'priority': 3, 'phase': 250},
+              {'name': 'motors', 'period': 80,    'priority': 2},
+              {'name': 'logger', 'period': 80,    'priority': 2},
+              {'name': 'user',   'period': 50000, 'priority': 1}],
+    'control_freq': 0,
+    'profile': True,
+    'gains': [[-0.026, -0.026, -0.005e-6, 0.006],      #X-GAINS
+              [0.0099, 0.027, -0.001e-6, -0.005]],     #Y-GAINS
+    'saturation': 80,
+    'driver': {'nSLEEP': 'A15', 'nFAULT': 'B2', 'timer': 3, 'retries': 3, 'backoff_ms': 100},
+    'motor_1': {'pins': ['B4', 'B5'], 'channels': [1, 2], 'deadband': 0, 'threshold': 0},
+    'motor_2': {'pins': ['B0', 'B1'], 'channels': [3, 4], 'deadband': 0, 'threshold': 0},
+    'panel': {'pins': ['A7', 'A1', 'A6', 'A0'], 'samples': 8, 'timer': 6, 'sample_freq': 250000,
+              'settle_us': 4},
+    'imu': {'bus': 1},
+    'log': {'sink': 'log.bin', 'frames': 512, 'decimation': 1, 'chunk': 256, 'flush_period': 10000,
+            'export_rows': 8},
+    'record': {'sink': 'rec.bin', 'buffer': 8192, 'chunk': 4096, 'flush_period': 10000},
+    'control_timer': 7,
+    }
+
+
+def load(filename=CONFIG_FILE):
+    ''' @brief          Reads the configuration file
+        @details        Sections given in the file replace those in DEFAULTS. Sections that
+                        are dictionaries are merged key by key.
+        @param filename The JSON file to read. If it does not exist, DEFAULTS is used.
+        @return         The configuration dictionary
+    '''
+    cfg = dict(DEFAULTS)
+    if filename in os.listdir():
+        with open(filename, 'r') as f:
+            user = json.load(f)
+        for key in user:
+            if key not in DEFAULTS:
+                raise ValueError('Unknown configuration section: ' + key)
+            if isinstance(DEFAULTS[key], dict):
+                section = dict(DEFAULTS[key])
+                for item in user[key]:
+                    if item not in section:
+                        raise ValueError('Unknown configuration key: ' + key + '.' + item)
+                    section[item] = user[key][item]
+                cfg[key] = section
+            else:
+                cfg[key] = user[key]
+        print('Configuration loaded from ' + filename)
+    check(cfg)
+    return cfg
+
+
+def check(cfg):
+    ''' @brief      Validates a configuration dictionary
+        @details    Raises ValueError naming the first problem found, so that a bad bench
+                    file fails at boot instead of while the platform is moving.
+        @param cfg  The configuration dictionary
+    '''
+    names = []
+    for task in cfg['tasks']:
+        name = task.get('name')
+        if name not in TASK_NAMES:
+            raise ValueError('Unknown task: ' + str(name))
+        if name in names:
+            raise ValueError('Task listed twice: ' + name)
+        if 'period' not in task:
+            raise ValueError('No period for task: ' + name)
+        if task['period'] < 0:
+            raise ValueError('Negative period for task: ' + name)
+        names.append(name)
+    gains = cfg['gains']
+    if len(gains) != 2 or len(gains[0]) != 4 or len(gains[1]) != 4:
+        raise ValueError('gains must be a 2x4 matrix')
+    if cfg['control_freq'] < 0:
+        raise ValueError('control_freq must not be negative')
+
+
+def divider(period, control_freq):
+    ''' @brief              Converts a task period to a number of timer releases
+        @param period       The task period in microseconds
+        @param control_freq The timer release rate in Hz
+        @return             The number of releases between runs, at least 1
+    '''
+    return max(1, (period*control_freq + 500000)//1000000)
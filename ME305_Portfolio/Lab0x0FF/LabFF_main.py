@@ -101,86 +101,170 @@ import BNO055
 import task_panel
 import task_IMU
 import closedloop
+import scheduler
+import micropython
+import config
+import logger
+import recorder
 from ulab import numpy as np
 
+
+def make_motor(motor_drv, motor_cfg):
+    ''' @brief             Creates a motor object from its configuration section
+        @param motor_drv   The DRV8847 motor driver object
+        @param motor_cfg   A dictionary with pins, channels, deadband and threshold
+        @return            An object of class DRV8847.Motor
+    '''
+    pin_A, pin_B = motor_cfg['pins']
+    channel_A, channel_B = motor_cfg['channels']
+    return motor_drv.motor(getattr(Pin.cpu, pin_A), getattr(Pin.cpu, pin_B), channel_A, channel_B,
+                           motor_cfg['deadband'], motor_cfg['threshold'])
+
         
 def main():
     ''' @brief The main program
     '''
+    # Lets exceptions raised in interrupt handlers be reported
+    micropython.alloc_emergency_exception_buf(100)
     
-    ## @brief     The period (in us) of the task
-    #  @details   Specifies the largest number that can be stored in the timer, also known as the "Auto Reload" value
-    period = 50000 # Number of microseconds between each desired interval
-    period_pan = 500
-    period_motor = 80
-    period_IMU = 80
-    gain_1 = np.array([-0.026, -0.026, -0.005, 0.006])   #X-GAINS
-    gain_2 = np.array(([0.0099, 0.027, -0.001, -0.005])) #Y-GAINS
+    ## @brief     Settings read from config.json, merged over config.DEFAULTS
+    #  @details   Declares the tasks and their periods, the gain matrix and the pin assignments
+    cfg = config.load()
+    ## @brief     Task periods, in microseconds, by task name
+    periods = {}
+    for task in config.DEFAULTS['tasks'] + cfg['tasks']:
+        periods[task['name']] = task['period']
+    # Rate, in Hz, of the timer driven panel -> IMU -> controller -> motor chain.
+    # 0 runs the whole chain from the cooperative scheduler instead.
+    control_freq = cfg['control_freq']
     L_1 = shares.Share(0)
     L_2 = shares.Share(0)
     balance_flag = shares.Share(0)
     calib_pan_flag = shares.Share(0)
     calib_IMU_flag = shares.Share(0)
     disable_flag = shares.Share(0)
-    state_vect_x = [shares.Share(0), shares.Share(0), shares.Share(0), shares.Share(0)] #[x, th_y, xd, th_yd]
-    state_vect_y = [shares.Share(0), shares.Share(0), shares.Share(0), shares.Share(0)]  #[y, th_x, yd, th_xd]
+    state_vect_x = shares.StateVector(4) #[x, th_y, xd, th_yd]
+    state_vect_y = shares.StateVector(4) #[y, th_x, yd, th_xd]
     
     ## @brief     The motor driver object that calls the DRV8847 Dual H-Bridge Motor Driver 
-    #  @details   This motor driver object was created in the DRV8847.py file
-    motor_drv = DRV8847.DRV8847(Pin.cpu.A15, Pin.cpu.B2, 3)
+    #  @details   This motor driver object was created in the DRV8847.py file. After a fault
+    #             the driver is re-enabled up to driver.retries times with doubling delays.
+    drv_cfg = cfg['driver']
+    motor_drv = DRV8847.DRV8847(getattr(Pin.cpu, drv_cfg['nSLEEP']), getattr(Pin.cpu, drv_cfg['nFAULT']), drv_cfg['timer'],
+                                retries=drv_cfg['retries'], backoff_ms=drv_cfg['backoff_ms'])
     ## @brief     The motor object that calls motor 1
     #  @details   This motor object was defined in main.py    
-    motor_1 = motor_drv.motor(Pin.cpu.B4, Pin.cpu.B5, 1, 2)
+    motor_1 = make_motor(motor_drv, cfg['motor_1'])
     ## @brief     The motor object that calls motor 2
     #  @details   This motor object was defined in main.py
-    motor_2 = motor_drv.motor(Pin.cpu.B0, Pin.cpu.B1, 3, 4) 
-    ## @brief     The controller object that calls controller for motor 1
-    #  @details   This motor object was defined in main.py
-    closedloop_1 = closedloop.ClosedLoop(80, -80, L_1, state_vect_x, gain_1)
-    ## @brief     The controller object that calls controller for motor 2
-    #  @details   This motor object was defined in main.py    
-    closedloop_2 = closedloop.ClosedLoop(80, -80, L_2, state_vect_y, gain_2)
-    ## @brief      This is a placeholder for the motor driver object for task 5
-    #  @details    This is used so we call the motor driver once in all of our tasks
-    motor_none = None   
+    motor_2 = make_motor(motor_drv, cfg['motor_2'])
+    ## @brief     The controller object that computes the duty cycles of both motors
+    #  @details   Row 1 of the gain matrix drives motor 1 from state vector x and row 2 drives
+    #             motor 2 from state vector y
+    controller = closedloop.ClosedLoopPair(cfg['saturation'], -cfg['saturation'], L_1, L_2, state_vect_x, state_vect_y,
+                                           np.array(cfg['gains']))
     ## @brief     Touch panel object
     #  @details   Used to interface with touch panel task
-    panel_obj = touch_pan.Touch_Pan(Pin.cpu.A7, Pin.cpu.A1, Pin.cpu.A6, Pin.cpu.A0)
+    pan_cfg = cfg['panel']
+    panel_obj = touch_pan.Touch_Pan(*[getattr(Pin.cpu, name) for name in pan_cfg['pins']])
+    ## @brief     Timer pacing the oversampled touch panel readings
+    #  @details   By default 8 samples at 250 kHz take 32 us per axis, filtered with a median
+    panel_timer = pyb.Timer(pan_cfg['timer'], freq=pan_cfg['sample_freq'])
+    panel_obj.set_oversampling(pan_cfg['samples'], panel_timer, settle_us=pan_cfg['settle_us'])
     ## @brief     IMU object
     #  @details   Used to interface with IMU task
-    IMU_obj = BNO055.BNO055(pyb.I2C(1, pyb.I2C.MASTER), calib_IMU_flag)
+    IMU_obj = BNO055.BNO055(pyb.I2C(cfg['imu']['bus'], pyb.I2C.MASTER), calib_IMU_flag)
 
     
+    ## @brief        The cooperative scheduler that dispatches the tasks
+    #  @details      Sensor tasks have the highest priority so that the motor tasks always use
+    #                readings taken in the same frame. With profile enabled, run time, jitter and
+    #                deadline misses are recorded for every task and can be printed from the user task.
+    task_sched = scheduler.Scheduler(profile=cfg['profile'])
+    ## @brief     Records state frames at the control rate for the 'd' key
+    #  @details   Frames are buffered in RAM and written to the log sink in the background
+    log_cfg = cfg['log']
+    data_log = logger.Logger(state_vect_x, state_vect_y, L_1, L_2, frames=log_cfg['frames'],
+                             decimation=log_cfg['decimation'], chunk=log_cfg['chunk'])
+    ## @brief     Records the raw panel conversions and IMU registers for the 'r' key
+    #  @details   None when record.buffer is 0. The description of each recording holds the
+    #             settings needed to replay it on the host with tools.replay.
+    rec_cfg = cfg['record']
+    sensor_rec = None
+    if rec_cfg['buffer'] > 0:
+        sensor_rec = recorder.Recorder(rec_cfg['buffer'], rec_cfg['chunk'],
+                                       {'periods': periods, 'control_freq': control_freq, 'gains': cfg['gains'],
+                                        'saturation': cfg['saturation'], 'panel_pins': pan_cfg['pins'],
+                                        'imu_bus': cfg['imu']['bus']})
+        sensor_rec.attach_panel(panel_obj)
+        sensor_rec.attach_imu(IMU_obj)
+    ## @brief        Timing counters shared by the scheduler, the motor tasks and the user task
+    #  @details      None when profiling is disabled
+    stats = task_sched.stats
+    
     ## @brief        Creates a parameterized task constructor for task_userinterface.py
     #  @details      The constructor takes input arguments and objects and passes them into user task
-    task1 = task_userinterface.Task_User(period, L_1, L_2, balance_flag, calib_pan_flag, calib_IMU_flag, disable_flag, state_vect_x, state_vect_y)
+    task1 = task_userinterface.Task_User(periods['user'], balance_flag, calib_pan_flag, calib_IMU_flag, disable_flag, state_vect_x, state_vect_y, L_1, L_2, stats,
+                                         data_log, pyb.USB_VCP() if log_cfg['sink'] == 'usb' else log_cfg['sink'],
+                                         log_cfg['export_rows'], recorder=sensor_rec, record_sink=rec_cfg['sink'])
     ## @brief        Creates a parameterized task constructor for task_panel.py
     #  @details      The constructor takes input arguments and objects and passes them into touch panel task   
-    task2 = task_panel.Task_Panel(period_pan, panel_obj, state_vect_x, state_vect_y, calib_pan_flag)
+    task2 = task_panel.Task_Panel(periods['panel'], panel_obj, state_vect_x, state_vect_y, calib_pan_flag,
+                                  defer_calibration=control_freq > 0)
     ## @brief        Creates a parameterized task constructor for task_IMU.py
     #  @details      The constructor takes input arguments and objects and passes them into IMU task
-    task3 = task_IMU.Task_IMU(period_IMU, IMU_obj, state_vect_x, calib_IMU_flag, state_vect_y)    
-    ## @brief        Creates a parameterized task constructor for task_motor.py corresponding to motor 1
-    #  @details      The constructor takes input arguments and objects and passes them into user task
-    task4 = task_motor.Task_Motor(period_motor, motor_1, motor_drv, L_1, balance_flag, state_vect_x, state_vect_y, disable_flag, closedloop_1)
-    ## @brief        Creates a parameterized task constructor for task_motor.py corresponding to motor 2
-    #  @details      The constructor takes input arguments and objects and passes them into user task
-    task5 = task_motor.Task_Motor(period_motor, motor_2, motor_none, L_2, balance_flag, state_vect_x, state_vect_y, disable_flag, closedloop_2)
-                                  
-    task_list = [task1, task2, task3, task4, task5]
+    task3 = task_IMU.Task_IMU(periods['imu'], IMU_obj, state_vect_x, calib_IMU_flag, state_vect_y)    
+    ## @brief        Creates a parameterized task constructor for task_motor.py driving both motors
+    #  @details      One task reads both state vectors and updates all four PWM channels back to back
+    task4 = task_motor.Task_MotorPair(periods['motors'], motor_1, motor_2, motor_drv, controller, balance_flag, disable_flag,
+                                      stats, stats.probe('ClosedLoop') if stats else -1,
+                                      stats.probe('Motor fault') if stats else -1)
+    ## @brief        The task objects by the names used in the configuration file
+    tasks = {'panel': task2, 'imu': task3, 'motors': task4, 'logger': data_log, 'user': task1}
+    ## @brief        Names printed in the timing table by configuration name
+    names = {'panel': 'Panel', 'imu': 'IMU', 'motors': 'Motors', 'logger': 'Logger', 'user': 'User'}
     
-
+    # Tasks of equal priority keep the order they are listed in
+    ## @brief        The configured tasks in dispatch order
+    task_list = sorted(cfg['tasks'], key=lambda task: -task.get('priority', 0))
     
+    if control_freq > 0:
+        ## @brief        Runs the sensor, controller and motor tasks at a fixed rate
+        #  @details      The chain is released by a timer and run through micropython.schedule(),
+        #                while the user interface and touch panel calibration stay in the
+        #                cooperative scheduler in the background
+        control_loop = scheduler.TimerLoop(pyb.Timer(cfg['control_timer']), control_freq, stats)
+        for task in task_list:
+            name = task['name']
+            if name == 'user':
+                task_sched.add(task1, task['period'], priority=1, name=names[name])
+            else:
+                control_loop.add(tasks[name], config.divider(task['period'], control_freq), name=names[name])
+                if name == 'panel':
+                    task_sched.add(task2.run_calibration, periods['user'], priority=1, name='Panel cal')
+        task_sched.add(data_log.flush, log_cfg['flush_period'], priority=0, name='Log flush')
+        if sensor_rec is not None:
+            task_sched.add(sensor_rec.flush, rec_cfg['flush_period'], priority=0, name='Rec flush')
+        control_loop.start()
+        task_sched.run_forever()
+        control_loop.stop()
     
-    while(True):
-        try:
-            
-            for task in task_list:
-                task.run()
-                
-        except KeyboardInterrupt:
-            break
+    else:
+        # A phase offsets a task, e.g. the IMU by half a panel period so that the
+        # I2C transfer does not land in the same frame as a panel scan
+        for task in task_list:
+            task_sched.add(tasks[task['name']], task['period'], priority=task.get('priority', 0),
+                           phase=task.get('phase', 0), name=names[task['name']])
+        task_sched.add(data_log.flush, log_cfg['flush_period'], priority=0, name='Log flush')
+        if sensor_rec is not None:
+            task_sched.add(sensor_rec.flush, rec_cfg['flush_period'], priority=0, name='Rec flush')
+        task_sched.run_forever()
         
+    data_log.stop()
+    data_log.close()
+    if sensor_rec is not None:
+        sensor_rec.stop()
+        sensor_rec.close()
     print('Program Terminating')
     
     
@@ -26,8 +26,8 @@ class Task_IMU():
             @param period_IMU       The period, in microseconds, between runs of the IMU task
             @param IMU_obj          IMU object created to interface with IMU task
             @param calib_IMU_flag   A boolean flag used to enable IMU calibration
-            @param state_vect_x     List used to define state vector x
-            @param state_vect_y     List used to define state vector y
+            @param state_vect_x     Shared state vector x
+            @param state_vect_y     Shared state vector y
         '''
         ## @brief     The frequency of the IMU task
         #  @details   Defines variable that specifies timer frequency
@@ -38,10 +38,10 @@ class Task_IMU():
         ## @brief     A boolean flag used to start IMU calibration
         #  @details   Works with the task IMU and user interface to enable IMU calibration
         self.calib_IMU_flag = calib_IMU_flag
-        ## @brief     A shared list used to define state vector x
+        ## @brief     A shared vector used to define state vector x
         #  @details   Contains variables for x position, theta y, x velocity, and angular velocity (theta y dot)
         self.state_vect_x = state_vect_x
-        ## @brief     A shared list used to define state vector y
+        ## @brief     A shared vector used to define state vector y
         #  @details   Contains variables for y position, theta x, y velocity, and angular velocity (theta x dot)
         self.state_vect_y = state_vect_y
         ## @brief     Sets the number of runs to 0
@@ -56,15 +56,12 @@ class Task_IMU():
         '''
         if self.state == S0_INIT:
             #Constantly updating euler angle and angular velocity readings to state vector arrays
-            angle = self.IMU_obj.euler_angle()
+            #Reads [gyr_x, gyr_y, gyr_z, heading, roll, pitch] in one I2C transaction
+            imu_state = self.IMU_obj.read_state()
             
-            self.state_vect_x[1].write(angle[2])
-            self.state_vect_y[1].write(angle[1])
-
-            
-            angular_velocity = self.IMU_obj.angular_vel()
-            self.state_vect_x[3].write(angular_velocity[2])
-            self.state_vect_y[3].write(angular_velocity[1])
+            #Each angle is published together with its rate
+            self.state_vect_x.write_pair(1, imu_state[5], 3, imu_state[2])
+            self.state_vect_y.write_pair(1, imu_state[4], 3, imu_state[1])
             
             if self.calib_IMU_flag.read() == 1:
                 self.state = S1_CALIBRATE
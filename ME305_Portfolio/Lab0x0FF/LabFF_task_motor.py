@@ -7,8 +7,7 @@
    \image html  LabFF_TaskMotor.png "Lab FF Task Motor FSM"
 '''
 
-#from ulab import numpy as np
-#import closedloop
+import utime
 
 ## @brief     State 1 of the motor task
 #  @details   Creates an initial state condition for state 1. State 1 is the enable state.
@@ -19,115 +18,113 @@ S2_BALANCE = 1
 ## @brief     State 3 of the motor task
 #  @details   Creates an initial state condition for state 3. State 3 is the fault alert state.
 S3_DISABLE = 3
+## @brief     State 4 of the motor task
+#  @details   Entered by Task_MotorPair after a driver fault. The motors are stopped and the
+#             driver waits to be re-enabled by DRV8847.retry() or by the user.
+S4_FAULT = 4
 
 
-class Task_Motor():
-    ''' @brief      Motor task that creates variables for motor driver functions and parameters
-        @details    Implements a finite state machine for the motor driver
+class Task_MotorPair():
+    ''' @brief      Motor task that drives both platform motors from one controller
+        @details    Implements a finite state machine that owns both motors and a
+                    closedloop.ClosedLoopPair, polls the flags once per run and updates all
+                    four PWM channels back to back so the two axes are never skewed.
     '''
     
-    
-    def __init__(self, period_motor, motor_obj, motor_drv, L, balance_flag, state_vect_x, state_vect_y, disable_flag, closedloop):
-        ''' @brief                   Constructs a motor task
-            @details                 The motor task is implemented as a finite state machine.
-            @param period            The period, in microseconds, between runs of the task
-            @param motor_obj         The motor object that calls motors 1 or 2
+    def __init__(self, period_motor, motor_1, motor_2, motor_drv, controller, balance_flag, disable_flag, stats=None, probe=-1, fault_probe=-1):
+        ''' @brief                   Constructs a two motor task
+            @param period_motor      The period, in microseconds, between runs of the task
+            @param motor_1           The motor object tilting the platform about y, driven by state vector x
+            @param motor_2           The motor object tilting the platform about x, driven by state vector y
             @param motor_drv         The motor driver object that calls DRV8847
-            @param enable_flag       A boolean flag used to enable a corresponding motor
-            @param step_flag         A boolean flag used to start step response
-            @param L                 Variable used to define actuation level
-    '''
-    
-        ## @brief     The motor object that calls motors 1 or 2
-        #  @details   Motors 1 or 2 were defined in the main.py file  
-        self.motor_obj = motor_obj
+            @param controller        The closedloop.ClosedLoopPair object computing both duty cycles
+            @param balance_flag      A boolean flag used to start balancing
+            @param disable_flag      A boolean flag used to disable the motors
+            @param stats             Optional scheduler.TaskStats object used to time the controller
+            @param probe             The TaskStats slot reserved for timing the controller
+            @param fault_probe       The TaskStats slot recording the fault handling latency
+        '''
+        ## @brief     The frequency of the task
+        self.period_motor = period_motor
+        ## @brief     The motor object driven by state vector x
+        self.motor_1 = motor_1
+        ## @brief     The motor object driven by state vector y
+        self.motor_2 = motor_2
         ## @brief     The motor driver object that calls DRV8847
-        #  @details   This motor driver was defined in the main.py file
+        #  @details   Enabled when balancing starts and disabled when the motors are disabled
         self.motor_drv = motor_drv
-        ## @brief     Variable used to define actuation level
-        #  @details   This value is calculated using gain, measured angular velocity, and reference angular velocity
-        self.L = L
+        ## @brief     The two axis controller object
+        self.controller = controller
         ## @brief     A boolean flag used to start balancing the platform and/or ball
-        #  @details   Works with the motor task and user interface to implement closed-loop control that balances the platform and ball   
         self.balance_flag = balance_flag
         ## @brief     A boolean flag used to disable motors
-        #  @details   Works with the motor task and user interface to halt motor movement
         self.disable_flag = disable_flag
-        ## @brief     A shared list used to define state vector x
-        #  @details   Contains variables for x position, theta y, x velocity, and angular velocity (theta y dot)
-        self.state_vect_x = state_vect_x
-        ## @brief     A shared list used to define state vector y
-        #  @details   Contains variables for y position, theta x, y velocity, and angular velocity (theta x dot)
-        self.state_vect_y = state_vect_y
-        ## @brief     The frequency of the task
-        #  @details   Defines variable that specifies timer frequency
-        self.period_motor = period_motor
-        ## @brief     Initializes starting state to be state 2
-        #  @details   Motors begin in the stop state
+        ## @brief     Run time counters for the controller, or None
+        self.stats = stats
+        ## @brief     The TaskStats slot used to time the controller
+        self.probe = probe
+        ## @brief     The TaskStats slot used to record driver faults
+        #  @details   Each handled fault adds one run whose time is the delay from the fault
+        #             interrupt to the fault being handled by the task
+        self.fault_probe = fault_probe
+        ## @brief     Initializes starting state
+        #  @details   Motors begin in the run state, waiting for the balance flag
         self.state = S1_RUN
         ## @brief     Sets the number of runs to 0
-        #  @details   Defines a variable to keep track of runs
         self.runs = 0
-        ## @brief     The controller object that refers to closedloop.py
-        #  @details   Creates the controller object used to perform closed loop speed control of the motors
-        self.closedloop = closedloop
-
         
     def run(self):
         ''' @brief Runs one iteration of the FSM
         '''
-       
-        if self.state == S1_RUN:                                         
-                                                         
-                if self.balance_flag.read() == 1:
-                   self.transition_to(S2_BALANCE)     
-                      
-                   
-                    
-        if self.state == S2_BALANCE:
-            
-              self.closedloop.run()      
-              if self.motor_drv == None:
-                 self.motor_obj.set_duty(self.L.read())                   
-
-                  
-              else:
-                  self.motor_obj.set_duty(self.L.read())
-                  
-                  if self.disable_flag.read() == 1:
-                      self.transition_to(S3_DISABLE)
-                  
-
-                  
-#               else:
-#                   self.gains_x = np.array([-0.026, -0.026, -0.005, 0.006]) #X-GAINS
-#                   self.state_vect_x_array = np.array([self.state_vect_x[0].read(), self.state_vect_x[1].read(), self.state_vect_x[2].read(), self.state_vect_x[3].read()])
-#                   self.Torque_x = np.dot(-self.gains_x,self.state_vect_x_array)
-#                   self.L.write((13.345)*self.Torque_x*100/4)
-#                   if self.L.read() > 80:
-#                      self.L.write(80)
-#                   if self.L.read() < -80:
-#                      self.L.write(-80)
-#                   self.motor_obj.set_duty(self.L.read())
-#                   
-#                   if self.disable_flag.read() == 1:
-#                      self.transition_to(S3_DISABLE)
-                           
-        if self.state == S3_DISABLE:
-            if self.motor_drv == None:
-                 self.motor_obj.set_duty(0)
-                 self.disable_flag.write(0)
-                 self.transition_to(S1_RUN)
+        if self.state == S1_RUN:
+            if self.balance_flag.read() == 1:
+                self.motor_drv.reset_fault()
+                self.motor_drv.enable()
+                self.transition_to(S2_BALANCE)
+        
+        elif self.state == S2_BALANCE:
+            if self.motor_drv.fault_cb_flag:
+                #Stops the motors before the driver is put to sleep
+                self.motor_1.set_duty(0)
+                self.motor_2.set_duty(0)
+                latency = self.motor_drv.handle_fault()
+                if self.stats is not None:
+                    self.stats.record(self.fault_probe, latency)
+                self.transition_to(S4_FAULT)
+                return
+            controller = self.controller
+            if self.stats is None:
+                controller.run()
             else:
-                 self.motor_obj.set_duty(0)
-                 self.disable_flag.write(0)
-                 self.transition_to(S1_RUN)
-                                            
-                
+                start = utime.ticks_us()
+                controller.run()
+                self.stats.measure(self.probe, start)
+            self.motor_1.set_duty(controller.duty_1)
+            self.motor_2.set_duty(controller.duty_2)
+            if self.disable_flag.read() == 1:
+                self.transition_to(S3_DISABLE)
+        
+        elif self.state == S4_FAULT:
+            if self.disable_flag.read() == 1:
+                self.transition_to(S3_DISABLE)
+            elif not self.motor_drv.can_retry():
+                print('Motors disabled by a driver fault. Press b to recommence balancing.')
+                self.transition_to(S3_DISABLE)
+            elif self.motor_drv.retry():
+                self.transition_to(S2_BALANCE)
+        
+        if self.state == S3_DISABLE:
+            self.motor_1.set_duty(0)
+            self.motor_2.set_duty(0)
+            self.motor_drv.disable()
+            self.balance_flag.write(0)
+            self.disable_flag.write(0)
+            self.transition_to(S1_RUN)
+        
+        self.runs += 1
 
     def transition_to(self, new_state):
         ''' @brief            Transitions the FSM to a new state
-            @details          A function that transitions the FSM to a new state
             @param new_state  The state to transition to
         '''
-        self.state = new_state
\ No newline at end of file
+        self.state = new_state
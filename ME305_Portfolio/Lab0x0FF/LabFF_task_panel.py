@@ -1,20 +1,18 @@
 '''@file        LabFF_task_panel.py
    @brief       Responsible for interfacing with the touch panel using the panel object
-   @details     Implements a finite state machine that interacts with touch panel driver
+   @details     Implements a finite state machine that interacts with touch panel driver.
+                Ball position and velocity are estimated with an alpha-beta tracker.
    @author      Faith Chau
    @author      Luisa Chiu
    @date        December 9, 2021
    \image html  LabFF_TaskPanel.png "Lab FF Task Panel TSM"
 '''
-    
+
+import array
 import utime
 
 S0_INIT = 0
 
-S1_POSITION = 1
- 
-S2_VELOCITY = 2
-
 S3_CALIBRATE = 3
 
 class Task_Panel():
@@ -24,14 +22,21 @@ class Task_Panel():
     
 
    
-    def __init__(self, period_pan, panel_obj, state_vect_x, state_vect_y, calib_pan_flag):
+    def __init__(self, period_pan, panel_obj, state_vect_x, state_vect_y, calib_pan_flag, alpha=0.2, beta=None, hold_us=50000, defer_calibration=False):
         ''' @brief                   Constructs a touch panel task
             @details                 Touch panel task attributes include the period, panel object, state vectors, and panel flag for calibration
             @param period_pan        The period, in microseconds, between runs of the panel task
             @param panel_obj         The panel object of the touch panel driver class
-            @param state_vect_x      List used to define state vector x
-            @param state_vect_y      List used to define state vector y
+            @param state_vect_x      Shared state vector x
+            @param state_vect_y      Shared state vector y
             @param calib_pan_flag    A boolean flag used to enable touch panel calibration
+            @param alpha             Position gain of the alpha-beta tracker, between 0 and 1
+            @param beta              Velocity gain of the alpha-beta tracker. Defaults to the
+                                     critically damped value alpha**2/(2 - alpha).
+            @param hold_us           Time, in microseconds, the last estimate is held after contact
+                                     is lost before the ball is treated as gone
+            @param defer_calibration True to leave calibration to run_calibration(), for tasks
+                                     run from a timer interrupt
         '''
         ## @brief     The frequency of the panel task
         #  @details   Variable that specifies timer frequency
@@ -42,10 +47,10 @@ class Task_Panel():
         ## @brief     A boolean flag used to start touch panel calibration
         #  @details   Works with the task panel and user interface to enable resistive touch panel calibration
         self.calib_pan_flag = calib_pan_flag
-        ## @brief     A shared list used to define state vector x
+        ## @brief     A shared vector used to define state vector x
         #  @details   Contains variables for x position, theta y, x velocity, and angular velocity (theta y dot)
         self.state_vect_x = state_vect_x
-        ## @brief     A shared list used to define state vector y
+        ## @brief     A shared vector used to define state vector y
         #  @details   Contains variables for y position, theta x, y velocity, and angular velocity (theta x dot)
         self.state_vect_y = state_vect_y
         ## @brief     Sets initial state to State 0
@@ -54,74 +59,106 @@ class Task_Panel():
         ## @brief     Sets the number of runs to 0
         #  @details   Defines a variable to keep track of runs
         self.runs = 0     
-        ## @brief     The utime.ticks_us() value associated with the next run of the FSM
-        #  @details   Defines a variable that adds the period to the ongoing timer
-        self.next_time = utime.ticks_add(utime.ticks_us(), self.period_pan)
-        ## @brief     Initializes x position variable
-        #  @details   Continuously updated to calculate positional velocity in x-direction
-        self.first_pos_x = 0
-        ## @brief     Initializes y position variable
-        #  @details   Continuously updated to calculate positional velocity in y-direction
-        self.first_pos_y = 0
+        ## @brief     Position gain of the alpha-beta tracker
+        #  @details   Fraction of the measurement residual added to the predicted position
+        self.alpha = alpha
+        ## @brief     Velocity gain of the alpha-beta tracker
+        #  @details   Fraction of the residual, divided by the measured time step, added to the velocity
+        self.beta = alpha*alpha/(2 - alpha) if beta is None else beta
+        ## @brief     Time contact may be lost before the estimate is reset
+        #  @details   Short losses of contact, such as a bouncing ball, hold the last estimate
+        self.hold_us = hold_us
+        ## @brief     Whether calibration is left to run_calibration()
+        #  @details   Set when run() is called from the timer driven control loop
+        self.defer_calibration = defer_calibration
+        ## @brief     Whether the tracker holds a valid estimate
+        #  @details   Cleared when contact has been lost for longer than hold_us
+        self.tracking = False
+        ## @brief     The utime.ticks_us() value of the last measurement with contact
+        #  @details   Used to compute the real time step between measurements
+        self.last_time = 0
+        ## @brief     Estimated x position in mm
+        self.x_est = 0
+        ## @brief     Estimated y position in mm
+        self.y_est = 0
+        ## @brief     Estimated x velocity in mm/s
+        self.x_velocity = 0
+        ## @brief     Estimated y velocity in mm/s
+        self.y_velocity = 0
+        ## @brief     Positions read by touch panel
+        #  @details   Preallocated [x, y, z] buffer filled in place by the panel driver on every run
+        self.positions = array.array('f', 3*[0])
         
     def run(self):
         ''' @brief Runs one iteration of the FSM
+            @details The scheduler calls this method once every period_pan microseconds
         '''
-        current_time = utime.ticks_us()
-        if (utime.ticks_diff(current_time, self.next_time) >= 0):
+        if self.state == S0_INIT:
             
-            if self.state == S0_INIT:
-                
-                if self.calib_pan_flag.read() == 1:
-                    self.transition_to(S3_CALIBRATE)
-                
-                else:
-                    if self.runs == 0:
-                        #Initializes velocity calculations
-                        self.positions = self.panel_obj.get_coords()
-                        self.first_pos_x = self.positions[0]
-                        self.first_pos_y = self.positions[1]
-                        
-                    else:
-                        #Runs get.coords() to obtain touch panel readings
-                        ## @brief     Object associated with position read by touch panel
-                        #  @details   Uses panel object to update state vectors
-                        self.positions = self.panel_obj.get_coords()        
+            if self.calib_pan_flag.read() == 1:
+                self.transition_to(S3_CALIBRATE)
+            
+            else:
+                now = utime.ticks_us()
+                positions = self.positions
+                if self.panel_obj.scan_into(positions):
+                    dt_us = utime.ticks_diff(now, self.last_time)
+                    if self.tracking and dt_us > 0:
+                        #Alpha-beta update using the measured time step
+                        dt = dt_us*1e-6
+                        alpha = self.alpha
+                        beta_dt = self.beta/dt
                         
-                        #Reads ball position on touch panel when contact is made
-                        self.state_vect_x[0].write(self.positions[0])
-                        self.state_vect_y[0].write(self.positions[1])
+                        x_pred = self.x_est + self.x_velocity*dt
+                        residual = positions[0] - x_pred
+                        self.x_est = x_pred + alpha*residual
+                        self.x_velocity += beta_dt*residual
                         
-                        #Continues velocity calculations
-                        ## @brief     Defines x position variable read after position changes
-                        #  @details   Continuously updated to calculate positional velocity in x-direction
-                        self.second_pos_x = self.positions[0]         
-                        ## @brief     Defines y position variable read after position changes
-                        #  @details   Continuously updated to calculate positional velocity in y-direction                            
-                        self.second_pos_y = self.positions[1]  
-                        ## @brief     Calculates x velocity after position changes
-                        #  @details   Change in x position over task period
-                        self.x_velocity = (self.second_pos_x - self.first_pos_x)/self.period_pan
-                        ## @brief     Calculates y velocity after position changes
-                        #  @details   Change in y position over task period
-                        self.y_velocity = (self.second_pos_y - self.first_pos_y)/self.period_pan
-
-                        self.first_pos_x = self.second_pos_x
-                        self.first_pos_y = self.second_pos_y
-                        self.state_vect_x[2].write(self.x_velocity)
-                        self.state_vect_y[2].write(self.y_velocity)
+                        y_pred = self.y_est + self.y_velocity*dt
+                        residual = positions[1] - y_pred
+                        self.y_est = y_pred + alpha*residual
+                        self.y_velocity += beta_dt*residual
+                    else:
+                        #Contact (re)acquired: start from the measurement at rest
+                        self.x_est = positions[0]
+                        self.y_est = positions[1]
+                        self.x_velocity = 0
+                        self.y_velocity = 0
+                        self.tracking = True
+                    self.last_time = now
+                    
+                elif self.tracking and utime.ticks_diff(now, self.last_time) > self.hold_us:
+                    #Contact lost for too long: the ball is gone, so only the platform is balanced
+                    self.tracking = False
+                    self.x_est = 0
+                    self.y_est = 0
+                    self.x_velocity = 0
+                    self.y_velocity = 0
+                
+                #Publishes ball position and velocity together
+                self.state_vect_x.write_pair(0, self.x_est, 2, self.x_velocity)
+                self.state_vect_y.write_pair(0, self.y_est, 2, self.y_velocity)
      
         
-            if self.state == S3_CALIBRATE:
-                #Runs calibrate() function
-                self.panel_obj.calibrate()
-                self.calib_pan_flag.write(0)
-                self.runs = 0
-                self.transition_to(S0_INIT)
+        if self.state == S3_CALIBRATE and not self.defer_calibration:
+            self.run_calibration()
            
         self.runs += 1 
-        self.next_time = utime.ticks_add(self.next_time, self.period_pan)      
             
+    def run_calibration(self):
+        ''' @brief   Runs the touch panel calibration if it has been requested
+            @details Calibration waits on the user, so when the task runs from a timer interrupt
+                     it is constructed with defer_calibration=True and this method is called from
+                     the background loop instead. Readings are not published while calibrating.
+        '''
+        if self.state == S3_CALIBRATE:
+            #Runs calibrate() function
+            self.panel_obj.calibrate()
+            self.calib_pan_flag.write(0)
+            self.runs = 0
+            self.tracking = False
+            self.transition_to(S0_INIT)
+
 
     def transition_to(self, new_state):
         ''' @brief            Transitions the FSM to a new state
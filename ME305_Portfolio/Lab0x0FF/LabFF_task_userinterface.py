@@ -6,9 +6,10 @@
     @date        December 9, 2021
     \image html  LabFF_TaskUser.png "Lab FF Task User FSM"
 '''
-import utime
-import pyb
 import array
+import pyb
+from logger import FRAME_SIZE
+import telemetry
 
 ## @brief     State 0 of the user interface task
 #  @details   Creates an initial state condition for state 0.
@@ -31,24 +32,91 @@ S3_calibrate_panel = 3
 S4_calibrate_IMU = 4
 
 ## @brief     State 5 of the user interface task
-#  @details   Creates an initial state condition for state 5. State 5 collects state vector data for both x and y directions for 5 seconds.
+#  @details   Creates an initial state condition for state 5. State 5 logs or streams state vector data for both x and y directions, or records the raw sensor readings, until 's' is pressed.
 S5_collect_data = 5
 
 ## @brief     State 6 of the user interface task
-#  @details   Creates an initial state condition for state 6. State 6 prints the collected state vector data.
+#  @details   Creates an initial state condition for state 6. State 6 waits for the logged or recorded data to be written out and closes the log.
 S6_print_data = 6
 
 ## @brief     State 7 of the user interface task
 #  @details   Creates an initial state condition for state 7. State 7 disables motors 1 and 2 by setting the PWM levels to 0.
 S7_disable = 7
 
+## @brief     State 8 of the user interface task
+#  @details   Creates an initial state condition for state 8. State 8 prints a log file as text, a few rows per run.
+S8_export_data = 8
+
+## @brief     Column names printed before exported log rows
+EXPORT_HEADER = ('time [s], x pos [mm], theta_y [deg], x-vel [mm/s], ang vel(y) [rad/s], '
+                 'y pos [mm], theta_x [deg], y-vel [mm/s], ang vel(x) [rad/s], L_1 [%], L_2 [%]')
+## @brief     Decimal places of each column of an exported log row, after the time
+EXPORT_DECIMALS = (2, 2, 2, 2, 2, 2, 2, 2, 1, 1)
+## @brief     Decimal places of the time column of an exported log row
+EXPORT_TIME_DECIMALS = 4
+## @brief     Magnitude from which exported values are printed as nan
+#  @details   No sensor reading comes near it; it bounds the length of a row
+EXPORT_LIMIT = 1e9
+## @brief     Space reserved in the export buffer for each row, in bytes
+#  @details   Eleven values of at most 16 characters, their separators and the line end
+EXPORT_ROW_MAX = 200
+## @brief     Powers of ten used to scale exported values to integers
+_POWERS = (1, 10, 100, 1000, 10000)
+
+
+def put_fixed(buf, pos, value, decimals):
+    ''' @brief          Writes a number in fixed point notation into a buffer
+        @details        Writes the same text as '{:.nf}'.format(value), apart from the rounding of
+                        exact halves, straight into buf so no string is built. Values of
+                        EXPORT_LIMIT or more in magnitude, and nan, are written as nan.
+        @param buf      The bytearray written to
+        @param pos      The offset the text starts at
+        @param value    The number written
+        @param decimals The number of digits after the decimal point, up to 4
+        @return         The offset after the text
+    '''
+    if not -EXPORT_LIMIT < value < EXPORT_LIMIT:
+        buf[pos] = 110
+        buf[pos + 1] = 97
+        buf[pos + 2] = 110
+        return pos + 3
+    if value < 0:
+        buf[pos] = 45
+        pos += 1
+        value = -value
+    scale = _POWERS[decimals]
+    n = int(value*scale + 0.5)
+    whole = n//scale
+    frac = n - whole*scale
+    #Integer digits, written from the last one backwards
+    end = pos + 1
+    rest = whole
+    while rest >= 10:
+        rest //= 10
+        end += 1
+    i = end
+    while i > pos:
+        i -= 1
+        buf[i] = 48 + whole % 10
+        whole //= 10
+    if decimals == 0:
+        return end
+    buf[end] = 46
+    pos = end + 1 + decimals
+    i = pos
+    while i > end + 1:
+        i -= 1
+        buf[i] = 48 + frac % 10
+        frac //= 10
+    return pos
+
 
 
 class Task_User():
     ''' @brief      User interface task for data collection and interaction with all the tasks
         @details    Implements a finite state machine that communicates with the user to interface with all the tasks
     '''    
-    def __init__(self, period, balance_flag, calib_pan_flag, calib_IMU_flag, disable_flag, state_vect_x, state_vect_y, L_1, L_2):
+    def __init__(self, period, balance_flag, calib_pan_flag, calib_IMU_flag, disable_flag, state_vect_x, state_vect_y, L_1, L_2, stats=None, logger=None, log_sink='log.bin', export_rows=8, timing_runs=20, recorder=None, record_sink='rec.bin'):
         ''' @brief                  Constructs the user interface task
             @details                The user task is implemented as a finite state machine that interacts between the user and the program.
             @param period           The period, in microseconds, between runs of the task
@@ -58,8 +126,15 @@ class Task_User():
             @param disable_flag     A boolean flag used to disable the motors
             @param L_1              Variable used to define actuation level for motor 1
             @param L_2              Variable used to define actuation level for motor 2
-            @param state_vect_x     List used to define state vector x
-            @param state_vect_y     List used to define state vector y
+            @param state_vect_x     Shared state vector x
+            @param state_vect_y     Shared state vector y
+            @param stats            Optional scheduler.TaskStats object printed with the 'p' key
+            @param logger           Optional logger.Logger object started with the 'd' key
+            @param log_sink         File name, or object with a write() method, the log is written to
+            @param export_rows      Number of log rows printed per run when exporting a log file
+            @param timing_runs      Number of runs between task timing packets while streaming telemetry
+            @param recorder         Optional recorder.Recorder object started with the 'r' key
+            @param record_sink      File name the recording is written to, or 'usb' to stream it as telemetry packets
         '''
         ## @brief     The frequency of the task
         #  @details   Defines variable that specifies timer frequency
@@ -70,18 +145,12 @@ class Task_User():
         ## @brief     Sets the number of runs to 0
         #  @details   Defines a variable to keep track of runs
         self.runs = 0
-        ## @brief     The utime.ticks_us() value associated with the next run of the FSM
-        #  @details   Defines a variable that adds the period to the ongoing timer
-        self.next_time = utime.ticks_add(utime.ticks_us(), self.period)
         ## @brief     A serial port to use for user I/O
         #  @details   Creates a new USB_VCP object
         self.ser = pyb.USB_VCP()
         ## @brief     A boolean flag used to start balancing the platform and/or ball
         #  @details   Works with the motor task and user interface to implement closed-loop control that balances the platform and ball
         self.balance_flag = balance_flag        
-        ## @brief     A variable used for indexing
-        #  @details   This value helps index state vector points for data collection
-        self.i = 0
         ## @brief     A boolean flag used to start touch panel calibration
         #  @details   Works with the task panel and user interface to do resistive touch panel calibration
         self.calib_pan_flag = calib_pan_flag
@@ -91,10 +160,10 @@ class Task_User():
         ## @brief     A boolean flag used to disable motors
         #  @details   Works with the motor task and user interface to halt motor movement
         self.disable_flag = disable_flag
-        ## @brief     A shared list used to define state vector x
+        ## @brief     A shared vector used to define state vector x
         #  @details   Contains variables for x position, theta y, x velocity, and angular velocity (theta y dot)
         self.state_vect_x = state_vect_x
-        ## @brief     A shared list used to define state vector y
+        ## @brief     A shared vector used to define state vector y
         #  @details   Contains variables for y position, theta x, y velocity, and angular velocity (theta x dot)
         self.state_vect_y = state_vect_y     
         ## @brief     Variable used to define actuation level for motor 1
@@ -103,53 +172,69 @@ class Task_User():
         ## @brief     Variable used to define actuation level for motor 2
         #  @details   This value is calculated using input gain and torque
         self.L_2 = L_2
-        ## @brief     The utime.ticks_us() value associated with the next run of the FSM
-        #  @details   Defines a variable that adds the period to the ongoing timer
-        self.next_time = utime.ticks_add(utime.ticks_us(), self.period) 
-        ## @brief    An array for time
-        #  @details  This variable creates an empty array of 1000 data points, which will be populated with time data
-        self.time_array = array.array('f',1000*[0])
-        ## @brief    An array for x position
-        #  @details  This variable creates an empty array of 1000 data points, which will be populated with x-position data gathered from the touch panel
-        self.x_array = array.array('f',1000*[0])
-        ## @brief    An array for theta y angle
-        #  @details  This variable creates an empty array of 1000 data points, which will be populated with angular position data in the y axis gathered from the IMU
-        self.thy_array = array.array('f',1000*[0])
-        ## @brief    An array for x velocity
-        #  @details  This variable creates an empty array of 1000 data points, which will be populated with x-velocity data gathered from the touch panel
-        self.xd_array = array.array('f',1000*[0])
-        ## @brief    An array for angular velocity (y direction)
-        #  @details  This variable creates an empty array of 1000 data points, which will be populated with angular velocity data in the y axis gathered from the IMU
-        self.thyd_array = array.array('f',1000*[0])
-        ## @brief    An array for y position
-        #  @details  This variable creates an empty array of 1000 data points, which will be populated with y-position data gathered from the touch panel
-        self.y_array = array.array('f',1000*[0])
-        ## @brief    An array for theta x angle
-        #  @details  This variable creates an empty array of 1000 data points, which will be populated with angular position data in the x axis gathered from the IMU
-        self.thx_array = array.array('f',1000*[0])
-        ## @brief    An array for y velocity
-        #  @details  This variable creates an empty array of 1000 data points, which will be populated with y-velocity data gathered from the touch panel
-        self.yd_array = array.array('f',1000*[0])
-        ## @brief    An array for angular velocity (x direction)
-        #  @details  This variable creates an empty array of 1000 data points, which will be populated with angular velocity data in the x axis gathered from the IMU
-        self.thxd_array = array.array('f',1000*[0])
+        ## @brief     Task run time and jitter counters
+        #  @details   Printed with the 'p' key and cleared with the 'P' key. None when profiling is disabled.
+        self.stats = stats
+        ## @brief     The state vector data logger
+        #  @details   Started with the 'd' key and stopped with the 's' key. None when logging is disabled.
+        self.logger = logger
+        ## @brief     Where the data logger writes its frames
+        #  @details   A file name on the flash, or the USB port to stream frames to the host
+        self.log_sink = log_sink
+        ## @brief     Where the data logger is writing its frames
+        #  @details   log_sink for the 'd' key or the telemetry sender for the 't' key
+        self._log_target = None
+        ## @brief     Sends binary telemetry packets over the serial port
+        #  @details   Used as the logger sink while streaming with the 't' key
+        self.telemetry = telemetry.Telemetry(self.ser, unit=FRAME_SIZE)
+        ## @brief     Number of runs between task timing packets while streaming
+        self.timing_runs = timing_runs
+        ## @brief     The raw sensor recorder
+        #  @details   Started with the 'r' key and stopped with the 's' key. None when recording is disabled.
+        self.recorder = recorder
+        ## @brief     Where the recorder writes its records
+        #  @details   A file name on the flash, or a sink sending TYPE_RAW telemetry packets
+        self.record_sink = telemetry.PacketSink(self.telemetry, telemetry.TYPE_RAW) if record_sink == 'usb' else record_sink
+        ## @brief     The logger or recorder started by the last 'd', 't' or 'r' key
+        self._collector = None
+        ## @brief     Number of log rows printed per run when exporting
+        #  @details   Bounds the time a run takes so the other tasks are never held up by an export
+        self.export_rows = export_rows
+        ## @brief     Reusable buffer the time stamp of a log frame is read into
+        self._tick_buf = bytearray(4)
+        ## @brief     Reusable buffer the ten values of a log frame are read into
+        self._value_buf = array.array('f', bytearray(FRAME_SIZE - 4))
+        ## @brief     Reusable buffer the exported rows are formatted into
+        self._text_buf = bytearray(export_rows*EXPORT_ROW_MAX)
+        ## @brief     A view of the text buffer, sliced without copying when written to the serial port
+        self._text_view = memoryview(self._text_buf)
+        ## @brief     Offset of the first formatted byte not yet written to the serial port
+        self._text_pos = 0
+        ## @brief     Offset after the last formatted byte
+        self._text_end = 0
+        ## @brief     The log file being exported, or None
+        self._export_file = None
+        ## @brief     The timestamp of the last exported frame
+        #  @details   Used to accumulate the exported time across wraps of utime.ticks_us()
+        self._export_tick = 0
+        ## @brief     The exported time of the last frame in seconds
+        self._export_time = 0
         
         
     def run(self):
             ''' @brief     Runs one iteration of the FSM
                 @details   Implements a finite state machine
             '''
-        ## @brief     Starts timer
-        #  @details   An increasing microsecond counter with an arbitrary reference point
-            current_time = utime.ticks_us()
-    
              
             if self.state == S0_init:
                 print("Welcome. Please calibrate the touch panel and IMU before balancing the ball. Press:" ,
                       "\'c\' to calibrate the touch panel,",
                       "\'C\' to calibrate the IMU,",
                       "\'b\' to balance the ball and/or platform,",
-                      "\'d\' to collect state vector data.",sep="\n")
+                      "\'d\' to collect state vector data,",
+                      "\'t\' to stream binary telemetry,",
+                      "\'r\' to record raw sensor readings for replay,",
+                      "\'p\' to print task timing statistics.",sep="\n")
                 self.state = S1_wait_for_char
                 
             elif self.state == S1_wait_for_char:
@@ -171,11 +256,51 @@ class Task_User():
                         self.transition_to(S2_ball) 
                     
                     elif (char_in == 'd'):
-                        ## @brief     Starts timer for data collection
-                        #  @details   An increasing microsecond counter equal to current_time
-                        self.collect_time = current_time
-                        print('Printing state vector data... ')
-                        self.transition_to(S5_collect_data) 
+                        if self.logger is None:
+                            print('Data logging is disabled.')
+                        else:
+                            self._log_target = self.log_sink
+                            self._collector = self.logger
+                            self.logger.start(self.log_sink)
+                            print('Logging state vector data... Press \'s\' to stop.')
+                            self.transition_to(S5_collect_data) 
+                    
+                    elif (char_in == 't'):
+                        if self.logger is None:
+                            print('Data logging is disabled.')
+                        else:
+                            print('Streaming telemetry... Press \'s\' to stop.')
+                            self._log_target = self.telemetry
+                            self._collector = self.logger
+                            if self.stats is not None:
+                                self.telemetry.send_names(self.stats)
+                            self.logger.start(self.telemetry)
+                            self.runs = 0
+                            self.transition_to(S5_collect_data) 
+                    
+                    elif (char_in == 'r'):
+                        if self.recorder is None:
+                            print('Sensor recording is disabled.')
+                        else:
+                            try:
+                                #The ring buffer is allocated by the first recording
+                                self.recorder.start(self.record_sink)
+                            except MemoryError:
+                                print('Not enough memory for a {:} byte recording buffer.'.format(self.recorder.size))
+                            else:
+                                print('Recording raw sensor readings... Press \'s\' to stop.')
+                                self._log_target = None
+                                self._collector = self.recorder
+                                self.transition_to(S5_collect_data)
+                    
+                    elif (char_in == 'p' or char_in == 'P'):
+                        if self.stats is None:
+                            print('Task profiling is disabled.')
+                        elif char_in == 'p':
+                            self.stats.print_table()
+                        else:
+                            self.stats.reset()
+                            print('Task timing statistics cleared.')
                     
                     else:
                         print('Command \'{:}\' is invalid.'.format(char_in))
@@ -194,44 +319,55 @@ class Task_User():
                  self.transition_to(S1_wait_for_char)                                                      
                 
             elif self.state == S5_collect_data:
-             ## @brief     Creates a variable that calculates difference between time reference points
-             #  @details   Used to collect data for a maximum time of 30 seconds
-             self.time_diff = utime.ticks_diff(current_time, self.collect_time)/1000000
-             if self.time_diff <= 5:
-                 
-                 self.time_array[self.i] = self.time_diff
-                 self.x_array[self.i] = self.state_vect_x[0].read()
-                 self.thy_array[self.i] = self.state_vect_x[1].read()
-                 self.xd_array[self.i] = self.state_vect_x[2].read()
-                 self.thyd_array[self.i] = self.state_vect_x[3].read()
-                 
-                 self.y_array[self.i] = self.state_vect_y[0].read()
-                 self.thx_array[self.i] = self.state_vect_y[1].read()
-                 self.yd_array[self.i] = self.state_vect_y[2].read()
-                 self.thxd_array[self.i] = self.state_vect_y[3].read()
-                 
-                 self.i += 1                   
-                 
-                 if self.ser.any():
-                     char_in = self.ser.read(1).decode()
-                     if(char_in == 's' or 'S'):
+                #Frames are recorded by the logger task and written out in the background
+                self.runs += 1
+                if self._log_target is self.telemetry and self.stats is not None and self.runs % self.timing_runs == 0:
+                    self.telemetry.send_timing(self.stats)
+                if self.ser.any():
+                    char_in = self.ser.read(1).decode()
+                    if (char_in == 's' or char_in == 'S'):
+                        self._collector.stop()
                         self.transition_to(S6_print_data)
-             else:
-                     self.transition_to(S6_print_data)
-                     
                      
             elif self.state == S6_print_data:
-                for number in range(self.i):
-                     print(str(round(self.time_array[number], 2)) + '[s], ' +str(round(self.x_array[number], 2)) + ' x pos [mm], ' + str(round(self.thy_array[number], 2)) + ' theta_y [deg], ' + str(round(self.xd_array[number], 2)) + ' x-vel [mm/s],' + str(round(self.thyd_array[number], 2)) + ' ang vel(y) [deg/s],' + 
-                          str(round(self.y_array[number], 2)) + ' y pos [mm], ' + str(round(self.thx_array[number], 2)) + ' theta_x [deg], ' + str(round(self.yd_array[number], 2)) + ' y-vel [mm/s],' + str(round(self.thxd_array[number], 2)) + ' ang vel(x) [deg/s]')
-
-#                    Use the code below to print data values without units (for ease of plotting)
-#                    print(str(round(self.time_array[number], 2)) + ', ' + str(round(self.x_array[number], 2)) + ', ' + str(round(self.thy_array[number], 2)) + ', ' + str(round(self.xd_array[number], 2)) + ', ' + str(round(self.thyd_array[number], 2)) + ', ' +
-#                          str(round(self.y_array[number], 2)) + ', ' + str(round(self.thx_array[number], 2)) + ', ' + str(round(self.yd_array[number], 2)) + ', ' + str(round(self.thxd_array[number], 2)))  
+                #Waits for the last packet to leave so no text is printed into it
+                if self._collector.pending() == 0 and self.telemetry.pump():
+                    self._collector.close()
+                    if self._collector is self.recorder:
+                        print('Finished recording. {:} records, {:} bytes written, {:} dropped.'.format(
+                              self.recorder.recorded, self.recorder.written, self.recorder.dropped))
+                    else:
+                        print('Finished collecting data. {:} frames logged, {:} dropped.'.format(
+                              self.logger.written, self.logger.dropped))
+                        if self._log_target is self.telemetry:
+                            print('{:} telemetry packets sent, {:} dropped.'.format(
+                                  self.telemetry.sent, self.telemetry.dropped))
+                    if isinstance(self._log_target, str) and self.logger.written > 0:
+                        self._export_file = open(self.log_sink, 'rb')
+                        self._export_time = -1
+                        print('Printing state vector data... Press any key to stop.')
+                        print(EXPORT_HEADER)
+                        self.transition_to(S8_export_data)
+                    else:
+                        self.transition_to(S0_init)
             
-                else:
-                    print('Finished collecting data.')
+            elif self.state == S8_export_data:
+                if self._text_pos == self._text_end:
+                    self._text_pos = 0
+                    self._text_end = self.export_text()
+                if self._text_end == 0 or self.ser.any():
+                    if self.ser.any():
+                        self.ser.read()
+                    self._export_file.close()
+                    self._export_file = None
+                    self._text_pos = self._text_end = 0
+                    print('Finished printing data.')
                     self.transition_to(S0_init)
+                else:
+                    #USB_VCP.write() may take only part of the text, or none of it on a timeout
+                    written = self.ser.write(self._text_view[self._text_pos:self._text_end])
+                    if written:
+                        self._text_pos += written
                     
             elif self.state == S7_disable:
                 self.disable_flag.write(1)
@@ -242,6 +378,36 @@ class Task_User():
                     raise ValueError('Invalid State.')         
 
             
+    def export_text(self):
+        ''' @brief          Formats up to export_rows frames of the log file as text rows
+            @details        Frames are read one at a time, and only when the text buffer has room
+                            for a whole row, so none are read without being printed.
+            @return         The number of bytes of text written into the text buffer
+        '''
+        export_file = self._export_file
+        tick_buf = self._tick_buf
+        values = self._value_buf
+        text_buf = self._text_buf
+        pos = 0
+        while pos + EXPORT_ROW_MAX <= len(text_buf):
+            if export_file.readinto(tick_buf) != 4 or export_file.readinto(values) != FRAME_SIZE - 4:
+                break
+            tick = tick_buf[0] | tick_buf[1] << 8 | tick_buf[2] << 16 | (tick_buf[3] & 0x3F) << 24
+            if self._export_time < 0:
+                self._export_time = 0
+            else:
+                self._export_time += ((tick - self._export_tick) & 0x3FFFFFFF)/1000000
+            self._export_tick = tick
+            pos = put_fixed(text_buf, pos, self._export_time, EXPORT_TIME_DECIMALS)
+            for i in range(10):
+                text_buf[pos] = 44
+                text_buf[pos + 1] = 32
+                pos = put_fixed(text_buf, pos + 2, values[i], EXPORT_DECIMALS[i])
+            text_buf[pos] = 13
+            text_buf[pos + 1] = 10
+            pos += 2
+        return pos
+    
     def transition_to(self, new_state):
         ''' @brief            Transitions the FSM to a new state
             @details          A function that transitions the FSM to a new state
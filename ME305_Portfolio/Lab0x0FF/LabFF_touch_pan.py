@@ -20,6 +20,29 @@ OUT_PP = micropython.const(Pin.OUT_PP)
 ## @brief     Constant created for Pin.IN
 #  @details   Used to increase task speed
 IN = micropython.const(Pin.IN)
+## @brief     Constant created for Pin.ANALOG
+#  @details   Used to increase task speed
+ANALOG = micropython.const(Pin.ANALOG)
+
+## @brief     Oversampling filter returning the median of the samples
+#  @details   Robust to single-sample spikes
+MEDIAN = micropython.const(0)
+## @brief     Oversampling filter returning the mean without the largest and smallest sample
+#  @details   Cheaper than MEDIAN, since it needs no sorting
+TRIMMED_MEAN = micropython.const(1)
+
+## @brief     Pin configuration used to scan z
+#  @details   y_p high, x_m low, y_m floating, reading x_p
+_CFG_Z = micropython.const(0)
+## @brief     Pin configuration used to scan x
+#  @details   x_p high, x_m low, y_p floating, reading y_m
+_CFG_X = micropython.const(1)
+## @brief     Pin configuration used to scan y
+#  @details   y_p high, y_m low, x_m floating, reading x_p
+_CFG_Y = micropython.const(2)
+## @brief     Pin configuration is not known
+#  @details   Forces every pin to be configured on the next scan
+_CFG_NONE = micropython.const(3)
 
 class Touch_Pan:
     ''' @brief   Hardware driver to interface resistive touch panels with the STM32 microcontroller
@@ -61,44 +84,180 @@ class Touch_Pan:
         ## @brief     Array to define beta values
         #  @details   Used to calibrate the touch panel and account for center offset
         self.beta = array.array('f', 6*[0]) 
+        
+        # Pin and ADC objects are created once here; scans only switch pin modes in place
+        ## @brief     Pin object for the x+ electrode
+        #  @details   Driven high in the x scan and read by the ADC in the y and z scans
+        self._pin_xp = Pin(x_p, IN)
+        ## @brief     Pin object for the x- electrode
+        #  @details   Driven low in the x and z scans, floating in the y scan
+        self._pin_xm = Pin(x_m, IN)
+        ## @brief     Pin object for the y+ electrode
+        #  @details   Driven high in the y and z scans, floating in the x scan
+        self._pin_yp = Pin(y_p, IN)
+        ## @brief     Pin object for the y- electrode
+        #  @details   Driven low in the y scan, read by the ADC in the x scan, floating in the z scan
+        self._pin_ym = Pin(y_m, IN)
+        ## @brief     ADC attached to the x+ electrode
+        #  @details   Reads the y and z components
+        self._adc_xp = pyb.ADC(x_p)
+        ## @brief     ADC attached to the y- electrode
+        #  @details   Reads the x component
+        self._adc_ym = pyb.ADC(y_m)
+        ## @brief     The pin configuration left by the last scan
+        #  @details   Lets each scan reconfigure only the pins that change
+        self._config = _CFG_NONE
+        ## @brief     Buffer filled by get_coords()
+        #  @details   Holds [x, y, z] from the most recent scan
+        self._coords = array.array('f', 3*[0])
+        ## @brief     Uncalibrated x-position value read by touch panel
+        #  @details   Raw ADC reading from the last x scan
+        self.x_ADC = 0
+        ## @brief     Uncalibrated y-position value read by touch panel
+        #  @details   Raw ADC reading from the last y scan
+        self.y_ADC = 0
+        ## @brief     Uncalibrated z-position value read by touch panel
+        #  @details   ADC reading from the last z scan as a fraction of full scale
+        self.z_ADC = 0
+        ## @brief     Number of ADC samples averaged per x or y reading
+        #  @details   1 takes a single conversion. Set with set_oversampling().
+        self.samples = 1
+        ## @brief     Filter used to combine oversampled readings
+        #  @details   MEDIAN or TRIMMED_MEAN
+        self.method = MEDIAN
+        ## @brief     Delay in microseconds between reconfiguring the pins and reading
+        #  @details   Lets the panel voltage settle; 0 reads immediately
+        self.settle_us = 0
+        ## @brief     Timer that paces the samples taken with ADC.read_timed()
+        #  @details   None while oversampling is disabled
+        self._sample_timer = None
+        ## @brief     Buffer filled by ADC.read_timed()
+        #  @details   Reallocated only by set_oversampling()
+        self._sample_buf = array.array('H', [0])
+
+    def _config_z(self):
+        ''' @brief Configures the pins to scan z, changing only what differs from the last scan
+        '''
+        if self._config == _CFG_Y:
+            self._pin_xm.init(OUT_PP, value=0)
+            self._pin_ym.init(IN)
+        elif self._config != _CFG_Z:
+            self._pin_xp.init(ANALOG)
+            self._pin_xm.init(OUT_PP, value=0)
+            self._pin_yp.init(OUT_PP, value=1)
+            self._pin_ym.init(IN)
+        self._config = _CFG_Z
+        
+    def _config_x(self):
+        ''' @brief Configures the pins to scan x, changing only what differs from the last scan
+        '''
+        if self._config != _CFG_Z:
+            self._pin_xm.init(OUT_PP, value=0)
+        self._pin_xp.init(OUT_PP, value=1)
+        self._pin_yp.init(IN)
+        self._pin_ym.init(ANALOG)
+        self._config = _CFG_X
+        
+    def _config_y(self):
+        ''' @brief Configures the pins to scan y
+            @details Every pin changes role between the x and y scans
+        '''
+        self._pin_xp.init(ANALOG)
+        self._pin_xm.init(IN)
+        self._pin_yp.init(OUT_PP, value=1)
+        self._pin_ym.init(OUT_PP, value=0)
+        self._config = _CFG_Y
+
+    def set_oversampling(self, samples, timer=None, settle_us=0, method=MEDIAN):
+        ''' @brief              Configures oversampled x and y readings
+            @details            Each x and y reading captures samples conversions paced by timer
+                                with ADC.read_timed() and combines them with the chosen method.
+                                The z reading only detects contact and always takes one conversion.
+            @param samples      The number of conversions per reading; 1 disables oversampling
+            @param timer        A pyb.Timer running at the desired sample rate. Required when
+                                samples is greater than 1.
+            @param settle_us    Delay in microseconds between switching the pins and reading
+            @param method       The filter used to combine samples, MEDIAN or TRIMMED_MEAN
+        '''
+        if samples > 1 and timer is None:
+            raise ValueError('Oversampling requires a timer')
+        if method == TRIMMED_MEAN and samples < 3:
+            raise ValueError('A trimmed mean needs at least 3 samples')
+        self.samples = samples
+        self._sample_timer = timer
+        self.settle_us = settle_us
+        self.method = method
+        self._sample_buf = array.array('H', samples*[0])
+        
+    def wrap_adcs(self, wrapper):
+        ''' @brief              Replaces both ADC objects with wrappers
+            @details            Used to record the raw conversions on the board and to replay
+                                them on the host; see recorder.py.
+            @param wrapper      A function taking an ADC object and its channel, 0 for the x+
+                                and 1 for the y- electrode, and returning an object with the
+                                read() and read_timed() methods of pyb.ADC
+        '''
+        self._adc_xp = wrapper(self._adc_xp, 0)
+        self._adc_ym = wrapper(self._adc_ym, 1)
+
+    def _read(self, adc):
+        ''' @brief      Takes one, possibly oversampled, reading
+            @param adc  The ADC object to read
+            @return     The filtered reading in ADC counts
+        '''
+        if self.settle_us:
+            utime.sleep_us(self.settle_us)
+        n = self.samples
+        if n == 1:
+            return adc.read()
+        buf = self._sample_buf
+        adc.read_timed(buf, self._sample_timer)
+        if self.method == TRIMMED_MEAN:
+            total = 0
+            low = 4095
+            high = 0
+            for i in range(n):
+                value = buf[i]
+                total += value
+                if value < low:
+                    low = value
+                if value > high:
+                    high = value
+            return (total - low - high)/(n - 2)
+        # Insertion sort in place; n is small
+        for i in range(1, n):
+            value = buf[i]
+            j = i - 1
+            while j >= 0 and buf[j] > value:
+                buf[j + 1] = buf[j]
+                j -= 1
+            buf[j + 1] = value
+        if n & 1:
+            return buf[n >> 1]
+        return (buf[(n >> 1) - 1] + buf[n >> 1])/2
 
     def get_x(self): 
         ''' @brief Reads x position. Returns uncalibrated values.
         '''
-        self._x_x_p = Pin(self.x_p, OUT_PP)
-        self._x_x_m = Pin(self.x_m, OUT_PP)
-        self._x_y_p = Pin(self.y_p, IN)
-        self._x_y_m = pyb.ADC(self.y_m)        
-        self._x_x_p.high()
-        self._x_x_m.low()
-        
+        self._config_x()
+        self.x_ADC = self._read(self._adc_ym)
         return self.x_ADC
         
     
     def get_y(self):  
         ''' @brief Reads y position. Returns uncalibrated values.
         '''
-        self._y_x_p = pyb.ADC(self.x_p)
-        self._y_x_m = Pin(self.x_m, IN)
-        self._y_y_p = Pin(self.y_p, OUT_PP)
-        self._y_y_m = Pin(self.y_m, OUT_PP)
-        
-        self._y_y_p.high()
-        self._y_y_m.low()
-
+        self._config_y()
+        self.y_ADC = self._read(self._adc_xp)
         return self.y_ADC
         
     def get_z(self):  
         ''' @brief Reads z "position" and creates a boolean flag for when contact is detected.
         '''
-        self._z_x_p = pyb.ADC(self.x_p)
-        self._z_x_m = Pin(self.x_m, OUT_PP)
-        self._z_y_p = Pin(self.y_p, OUT_PP)
-        self._z_y_m = Pin(self.y_m, IN)
-        
-        self._z_y_p.high()
-        self._z_x_m.low()
-        self.z_ADC = self.z_x_p.read()/4095
+        self._config_z()
+        if self.settle_us:
+            utime.sleep_us(self.settle_us)
+        self.z_ADC = self._adc_xp.read()/4095
         if self.z_ADC > 0.1:
             self.z_ADC_flag = 1
         else:
@@ -106,61 +265,60 @@ class Touch_Pan:
             
         return self.z_ADC
     
-    def get_coords(self):
-        ''' @brief Gets x, y, and z positions. Returns uncalibrated and calibrated values.
+    def scan_into(self, buf):
+        ''' @brief       Scans the panel and writes [x, y, z] into a caller-supplied buffer
+            @details     The z component is scanned first and the x and y scans are skipped
+                         when nothing touches the panel, in which case buf[0] and buf[1] are
+                         left unchanged, so callers must check the return value, buf[2] or
+                         z_ADC_flag before using them. x and y are calibrated positions once the panel has been calibrated
+                         and raw ADC readings before, oversampled as configured with
+                         set_oversampling(). Nothing is allocated.
+            @param buf   A preallocated array of at least three floats
+            @return      1 if contact was detected, otherwise 0
         '''
-        self._x_x_p = Pin(self.x_p, OUT_PP)
-        self._x_x_m = Pin(self.x_m, OUT_PP)
-        self._x_y_p = Pin(self.y_p, IN)
-        self._x_y_m = pyb.ADC(self.y_m)
-        self._x_x_p.high()
-        self._x_x_m.low()
-        ## @brief Uncalibrated x-position values read by touch panel
-        #  @details Measures x-position
-        self.x_ADC = self.x_y_m.read()
-        
-        self._y_x_p = pyb.ADC(self.x_p)
-        self._y_x_m = Pin(self.x_m, IN)
-        self._y_y_p = Pin(self.y_p, OUT_PP)
-        self._y_y_m = Pin(self.y_m, OUT_PP) 
-        self._y_y_p.high()
-        self._y_y_m.low()
-        ## @brief Uncalibrated y-position values read by touch panel
-        #  @details Measures y-position
-        self.y_ADC = self.y_x_p.read()      
-        
-        self._z_x_p = pyb.ADC(self.x_p)
-        self._z_x_m = Pin(self.x_m, OUT_PP)
-        self._z_y_p = Pin(self.y_p, OUT_PP)
-        self._z_y_m = Pin(self.y_m, IN)
-        
-        self._z_y_p.high()
-        self._z_x_m.low()
+        self._config_z()
+        if self.settle_us:
+            utime.sleep_us(self.settle_us)
+        z = self._adc_xp.read()/4095
+        self.z_ADC = z
+        buf[2] = z
+        if z <= 0.1:
+            self.z_ADC_flag = 0
+            return 0
+        self.z_ADC_flag = 1
         
-        ## @brief Uncalibrated z-position values read by touch panel
-        #  @details Measures z-position (contact with panel)
-        self.z_ADC = self.z_x_p.read()/4095
+        self._config_x()
+        x = self._read(self._adc_ym)
+        self._config_y()
+        y = self._read(self._adc_xp)
+        self.x_ADC = x
+        self.y_ADC = y
         
-        if self.z_ADC > 0.1:
-            self.z_ADC_flag = 1
+        if self.calibrate_flag == 1:
+            beta = self.beta
+            buf[0] = x*beta[0] + y*beta[1] + beta[4]
+            buf[1] = x*beta[2] + y*beta[3] + beta[5]
         else:
-            self.z_ADC_flag = 0
-            
-        
+            buf[0] = x
+            buf[1] = y
+        return 1
+    
+    def get_coords(self):
+        ''' @brief Gets x, y, and z positions. Returns uncalibrated and calibrated values.
+            @details Returns a new tuple on every call; use scan_into() in time critical code.
+                     As before, calibrated positions are (0, 0) when nothing touches the panel.
+        '''
+        coords = self._coords
+        if not self.scan_into(coords):
+            coords[0] = 0
+            coords[1] = 0
         if self.calibrate_flag == 1:
             ## @brief Calibrated x-position values read by touch panel
             #  @details Measures x-position accurately based on manual or automatic calibration constants
-            self.x_ADC_cal = self.x_ADC*self.beta[0] + self.y_ADC*self.beta[1] + self.beta[4]
+            self.x_ADC_cal = coords[0]
             ## @brief Calibrated y-position values read by touch panel
             #  @details Measures y-position accurately based on manual or automatic calibration constants
-            self.y_ADC_cal = self.x_ADC*self.beta[2] + self.y_ADC*self.beta[3] + self.beta[5]
-
-            if self.z_ADC > 0.1:
-                self.z_ADC_flag = 1
-            else:
-                self.z_ADC_flag = 0 
-                self.x_ADC_cal = 0
-                self.y_ADC_cal = 0
+            self.y_ADC_cal = coords[1]
             ## @brief Calibrated x and y positions read by panel
             #  @details Creates list of positions to be used for state vectors      
             self.calibrated_pos = (self.x_ADC_cal, self.y_ADC_cal)
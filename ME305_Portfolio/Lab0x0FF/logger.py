@@ -0,0 +1,207 @@
+''' @file       logger.py
+    @brief      Streaming binary logger for the ball balancing state.
+    @details    A Logger samples both state vectors and both actuation levels
+                into fixed size binary frames kept in a preallocated ring
+                buffer. Sampling is done by run(), so the logger is scheduled
+                like any other task right after the motor task, while flush()
+                is called from the background loop and writes the buffered
+                frames to a file or to the USB port.
+
+                Each frame is packed little endian as FRAME_FORMAT:
+                the utime.ticks_us() value, which wraps at 2**30, followed by
+                [x, th_y, xd, th_yd], [y, th_x, yd, th_xd], L_1 and L_2.
+                A frame that arrives while the ring is full is dropped and
+                counted.
+    @author     Faith Chau
+    @author     Luisa Chiu
+    @date       October 18, 2026
+'''
+
+import struct
+import utime
+
+## @brief     struct format of one logged frame
+FRAME_FORMAT = '<I10f'
+## @brief     Size of one logged frame in bytes
+FRAME_SIZE = struct.calcsize(FRAME_FORMAT)
+
+
+class Logger:
+    ''' @brief      Records state frames into a ring buffer and streams them out.
+        @details    run() is the only producer and flush() the only consumer,
+                    so the ring needs no locking as long as each is called
+                    from a single context. One slot is always left empty to
+                    tell a full ring from an empty one.
+    '''
+
+    def __init__(self, state_vect_x, state_vect_y, L_1, L_2, frames=512, decimation=1, chunk=64):
+        ''' @brief              Constructs an idle logger
+            @param state_vect_x Shared state vector x
+            @param state_vect_y Shared state vector y
+            @param L_1          Share holding the actuation level of motor 1
+            @param L_2          Share holding the actuation level of motor 2
+            @param frames       Number of frames the ring buffer can hold
+            @param decimation   A frame is recorded on every decimation-th call of run()
+            @param chunk        Largest number of frames written by one call of flush()
+        '''
+        ## @brief     Shared state vector x
+        self.state_vect_x = state_vect_x
+        ## @brief     Shared state vector y
+        self.state_vect_y = state_vect_y
+        ## @brief     Share holding the actuation level of motor 1
+        self.L_1 = L_1
+        ## @brief     Share holding the actuation level of motor 2
+        self.L_2 = L_2
+        ## @brief     Number of slots in the ring buffer
+        self.slots = frames + 1
+        ## @brief     The ring buffer of packed frames
+        self.buf = bytearray(self.slots*FRAME_SIZE)
+        ## @brief     A view of buf, sliced without copying when frames are written out
+        self._view = memoryview(self.buf)
+        ## @brief     A frame is recorded on every decimation-th call of run()
+        self.decimation = decimation
+        ## @brief     Largest number of frames written by one call of flush()
+        self.chunk = chunk
+        ## @brief     Whether run() records frames
+        self.active = False
+        ## @brief     The file or serial port frames are written to, or None
+        self.sink = None
+        ## @brief     Whether the sink is a file opened, and closed, by the logger
+        self._owns_sink = False
+        ## @brief     Slot the next frame is packed into
+        self._head = 0
+        ## @brief     Slot of the oldest frame not yet written out
+        self._tail = 0
+        ## @brief     Bytes of the tail frame already accepted by the sink
+        self._partial = 0
+        ## @brief     Calls of run() left before the next frame is recorded
+        self._countdown = 1
+        ## @brief     Number of frames recorded since start()
+        self.recorded = 0
+        ## @brief     Number of frames written to the sink since start()
+        self.written = 0
+        ## @brief     Number of frames dropped because the ring was full
+        self.dropped = 0
+
+    def start(self, sink):
+        ''' @brief      Starts recording
+            @param sink A file name to create, or an object with a write() method such as
+                        pyb.USB_VCP()
+        '''
+        self.stop()
+        self.close()
+        if isinstance(sink, str):
+            self.sink = open(sink, 'wb')
+            self._owns_sink = True
+        else:
+            self.sink = sink
+            self._owns_sink = False
+        self._head = 0
+        self._tail = 0
+        self._partial = 0
+        self._countdown = 1
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.active = True
+
+    def stop(self):
+        ''' @brief  Stops recording; frames already buffered are still written by flush()
+        '''
+        self.active = False
+
+    def close(self):
+        ''' @brief  Writes out every buffered frame and closes a file sink
+        '''
+        if self.sink is None:
+            return
+        while self.flush():
+            pass
+        if self._owns_sink:
+            self.sink.close()
+        self.sink = None
+
+    def pending(self):
+        ''' @brief  Returns the number of frames buffered but not yet written
+        '''
+        return (self._head - self._tail) % self.slots
+
+    def run(self):
+        ''' @brief   Records one frame if logging is active and the decimation count is reached
+        '''
+        if not self.active:
+            return
+        self._countdown -= 1
+        if self._countdown > 0:
+            return
+        self._countdown = self.decimation
+        head = self._head
+        next_head = head + 1
+        if next_head == self.slots:
+            next_head = 0
+        if next_head == self._tail:
+            self.dropped += 1
+            return
+        svx = self.state_vect_x
+        svy = self.state_vect_y
+        #Packs both state vectors in place, repeating if a sensor update intervened
+        while True:
+            seq_x = svx.read_begin()
+            seq_y = svy.read_begin()
+            x = svx.values
+            y = svy.values
+            struct.pack_into(FRAME_FORMAT, self.buf, head*FRAME_SIZE, utime.ticks_us(),
+                             x[0], x[1], x[2], x[3], y[0], y[1], y[2], y[3],
+                             self.L_1.read(), self.L_2.read())
+            if not (svx.read_retry(seq_x) or svy.read_retry(seq_y)):
+                break
+        self._head = next_head
+        self.recorded += 1
+
+    def flush(self):
+        ''' @brief   Writes up to chunk buffered frames to the sink
+            @details Frames are written straight from the ring buffer in at most two
+                     contiguous pieces. Only the bytes the sink accepts are consumed, so
+                     after a short write, or a write returning None as pyb.USB_VCP does
+                     when it would block, the rest is written by the next call.
+            @return  The number of bytes written
+        '''
+        if self.sink is None:
+            return 0
+        head = self._head
+        tail = self._tail
+        partial = self._partial
+        limit = self.chunk*FRAME_SIZE
+        count = 0
+        frames = 0
+        while tail != head and count < limit:
+            end = head if head > tail else self.slots
+            start = tail*FRAME_SIZE + partial
+            stop = end*FRAME_SIZE
+            if stop - start > limit - count:
+                stop = start + limit - count
+            n = self.sink.write(self._view[start:stop])
+            if not n:
+                break
+            count += n
+            partial += n
+            frames += partial//FRAME_SIZE
+            tail += partial//FRAME_SIZE
+            partial %= FRAME_SIZE
+            if tail == self.slots:
+                tail = 0
+            if n < stop - start:
+                break
+        self._tail = tail
+        self._partial = partial
+        self.written += frames
+        return count
+
+
+def read_frames(data):
+    ''' @brief      Unpacks logged frames
+        @param data A bytes-like object holding whole frames, such as a log file read back
+        @return     A generator of FRAME_FORMAT tuples
+    '''
+    for offset in range(0, len(data) - FRAME_SIZE + 1, FRAME_SIZE):
+        yield struct.unpack_from(FRAME_FORMAT, data, offset)
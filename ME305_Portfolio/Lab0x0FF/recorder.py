@@ -0,0 +1,444 @@
+''' @file       recorder.py
+    @brief      Records the raw sensor readings for replay on the host.
+    @details    While recording, a Recorder sits between the drivers and the
+                hardware: the Touch_Pan ADC objects and the BNO055 I2C bus
+                are wrapped so every conversion and every register read is
+                copied, with its utime.ticks_us() time stamp, into a ring
+                buffer allocated by the first recording. The drivers get
+                their own objects back when recording stops.
+                flush() is called from the background loop and writes the
+                buffered records to a file or through a telemetry packet sink.
+
+                A recording starts with MAGIC, a HEADER_FORMAT header and a
+                JSON description of the settings the readings depend on:
+                the info given to the Recorder, such as the gains and task
+                periods, and the oversampling and calibration of the panel.
+                Records follow, each packed little endian as RECORD_FORMAT
+                (ticks_us, kind, channel, length) and then length bytes:
+                - KIND_ADC: the conversions of one read() or read_timed() call
+                  as unsigned 16-bit values; channel is ADC_XP or ADC_YM
+                - KIND_I2C: the bytes of one I2C mem_read(); channel is the
+                  first register read
+                - KIND_GAP: records were dropped because the ring was full;
+                  length holds how many, up to 65535
+
+                The host replays a recording through the same drivers and
+                tasks with tools.replay.
+    @author     Faith Chau
+    @author     Luisa Chiu
+    @date       October 18, 2026
+'''
+
+import json
+import struct
+import utime
+
+## @brief     Bytes that start every recording
+MAGIC = b'SREC'
+## @brief     struct format following MAGIC: format version and length of the JSON description
+HEADER_FORMAT = '<BH'
+## @brief     Version of the recording format
+VERSION = 1
+## @brief     struct format of the header of one record
+RECORD_FORMAT = '<IBBH'
+## @brief     Size of the header of one record in bytes
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+## @brief     Record kind holding ADC conversions
+KIND_ADC = 1
+## @brief     Record kind holding I2C register bytes
+KIND_I2C = 2
+## @brief     Record kind marking dropped records
+KIND_GAP = 3
+
+## @brief     ADC channel of the Touch_Pan x+ electrode, read for the y and z scans
+ADC_XP = 0
+## @brief     ADC channel of the Touch_Pan y- electrode, read for the x scan
+ADC_YM = 1
+
+
+class RecordingADC:
+    ''' @brief      An ADC wrapper that records every conversion
+    '''
+
+    def __init__(self, adc, recorder, channel):
+        ''' @brief          Wraps an ADC object
+            @param adc      The pyb.ADC object read
+            @param recorder The Recorder the conversions are recorded by
+            @param channel  ADC_XP or ADC_YM
+        '''
+        ## @brief     The wrapped pyb.ADC object
+        self.adc = adc
+        ## @brief     The Recorder the conversions are recorded by
+        self.recorder = recorder
+        ## @brief     ADC_XP or ADC_YM
+        self.channel = channel
+
+    def read(self):
+        ''' @brief  Takes and records one conversion
+        '''
+        value = self.adc.read()
+        if self.recorder.active:
+            self.recorder.add_value(self.channel, value)
+        return value
+
+    def read_timed(self, buf, timer):
+        ''' @brief  Fills buf with conversions paced by timer and records them
+        '''
+        self.adc.read_timed(buf, timer)
+        if self.recorder.active:
+            self.recorder.add_values(self.channel, buf)
+
+
+class RecordingI2C:
+    ''' @brief      An I2C bus wrapper that records every register read
+        @details    Writes are passed through unrecorded, since they do not
+                    change what the drivers compute.
+    '''
+
+    def __init__(self, i2c, recorder):
+        ''' @brief          Wraps an I2C bus
+            @param i2c      The pyb.I2C object
+            @param recorder The Recorder the reads are recorded by
+        '''
+        ## @brief     The wrapped pyb.I2C object
+        self.i2c = i2c
+        ## @brief     The Recorder the reads are recorded by
+        self.recorder = recorder
+
+    def mem_read(self, data, addr, memaddr):
+        ''' @brief          Reads and records registers, like pyb.I2C.mem_read()
+            @param data     The number of bytes to read, or a buffer to fill
+            @param addr     The device address
+            @param memaddr  The first register read
+        '''
+        result = self.i2c.mem_read(data, addr, memaddr)
+        if self.recorder.active:
+            #A buffer passed in is recorded from directly rather than copied
+            self.recorder.add_bytes(memaddr, result if isinstance(data, int) else data)
+        return result
+
+    def mem_write(self, data, addr, memaddr):
+        ''' @brief  Writes registers, like pyb.I2C.mem_write()
+        '''
+        return self.i2c.mem_write(data, addr, memaddr)
+
+
+class Recorder:
+    ''' @brief      Buffers sensor records and streams them out.
+        @details    The sensor tasks are the only producers and flush() the only
+                    consumer. Both sensor tasks run in the same context, either
+                    the cooperative scheduler or the timer driven chain, so the
+                    ring needs no locking. Records are variable in length and
+                    never split: one that does not fit before the end of the
+                    ring starts again at the beginning, and _end marks where
+                    the data before the wrap stops.
+    '''
+
+    def __init__(self, size=8192, chunk=4096, info=None):
+        ''' @brief          Constructs an idle recorder
+            @param size     Size of the ring buffer in bytes
+            @param chunk    Largest number of bytes written by one call of flush()
+            @param info     A dictionary stored in the description of every recording
+        '''
+        ## @brief     Size of the ring buffer in bytes
+        self.size = size
+        ## @brief     The ring buffer of packed records
+        #  @details   Allocated by the first start(), so no memory is taken until a recording is made
+        self.buf = None
+        ## @brief     A view of buf, sliced without copying when records are written out
+        self._view = None
+        ## @brief     Largest number of bytes written by one call of flush()
+        self.chunk = chunk
+        ## @brief     Settings stored in the description of every recording
+        self.info = info or {}
+        ## @brief     The Touch_Pan attached, whose settings are described
+        self.panel = None
+        ## @brief     The BNO055 attached, whose I2C bus is wrapped while recording
+        self.imu = None
+        ## @brief     Whether readings are recorded
+        self.active = False
+        ## @brief     The file or packet sink records are written to, or None
+        self.sink = None
+        ## @brief     Whether the sink is a file opened, and closed, by the recorder
+        self._owns_sink = False
+        ## @brief     Offset the next record is packed at
+        self._head = 0
+        ## @brief     Offset of the oldest byte not yet written out
+        self._tail = 0
+        ## @brief     End of the data before the wrap, valid while _head is below _tail
+        self._end = 0
+        ## @brief     Records dropped since the last record that fitted
+        self._gap = 0
+        ## @brief     Number of records buffered since start()
+        self.recorded = 0
+        ## @brief     Number of bytes written to the sink since start()
+        self.written = 0
+        ## @brief     Number of records dropped because the ring was full
+        self.dropped = 0
+
+    def attach_panel(self, panel):
+        ''' @brief          Records the ADC conversions of a touch panel driver
+            @details        Its ADC objects are only wrapped while recording, so reading the
+                            panel costs nothing extra the rest of the time.
+            @param panel    A touch_pan.Touch_Pan object
+        '''
+        self.panel = panel
+
+    def attach_imu(self, imu):
+        ''' @brief          Records the register reads of an orientation sensor driver
+            @details        Its I2C bus is only wrapped while recording.
+            @param imu      A BNO055.BNO055 object
+        '''
+        self.imu = imu
+
+    def _wrap_adc(self, adc, channel):
+        ''' @brief  Wraps one ADC object of the attached panel, for Touch_Pan.wrap_adcs()
+        '''
+        return RecordingADC(adc, self, channel)
+
+    def describe(self):
+        ''' @brief  Returns the description stored at the start of a recording
+        '''
+        info = dict(self.info)
+        panel = self.panel
+        if panel is not None:
+            info['panel'] = {'samples': panel.samples, 'method': panel.method, 'settle_us': panel.settle_us,
+                             'calibrated': panel.calibrate_flag, 'beta': list(panel.beta)}
+        return info
+
+    def start(self, sink):
+        ''' @brief      Starts recording
+            @param sink A file name to create, or an object with a write() method such as
+                        telemetry.PacketSink
+        '''
+        self.stop()
+        self.close()
+        if self.buf is None:
+            self.buf = bytearray(self.size)
+            self._view = memoryview(self.buf)
+        if isinstance(sink, str):
+            self.sink = open(sink, 'wb')
+            self._owns_sink = True
+        else:
+            self.sink = sink
+            self._owns_sink = False
+        description = json.dumps(self.describe()).encode()
+        header = MAGIC + struct.pack(HEADER_FORMAT, VERSION, len(description)) + description
+        if len(header) >= self.size:
+            raise ValueError('Recording buffer too small for the description')
+        #The header goes through the ring like the records, so a short write cannot cut it
+        self.buf[0:len(header)] = header
+        self._head = len(header)
+        self._tail = 0
+        self._end = 0
+        self._gap = 0
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        if self.panel is not None:
+            self.panel.wrap_adcs(self._wrap_adc)
+        if self.imu is not None:
+            self.imu.i2c = RecordingI2C(self.imu.i2c, self)
+        self.active = True
+
+    def stop(self):
+        ''' @brief  Stops recording and restores the drivers' own ADC and I2C objects
+            @details Records already buffered are still written by flush().
+        '''
+        if not self.active:
+            return
+        self.active = False
+        if self.panel is not None:
+            self.panel.wrap_adcs(_unwrap_adc)
+        if self.imu is not None:
+            self.imu.i2c = self.imu.i2c.i2c
+
+    def close(self):
+        ''' @brief  Writes out every buffered record and closes a file sink
+        '''
+        if self.sink is None:
+            return
+        #Marks records dropped after the last one that fitted once there is room
+        while self.flush() or (self._gap and self._put_gap()):
+            pass
+        if self._owns_sink:
+            self.sink.close()
+        self.sink = None
+
+    def pending(self):
+        ''' @brief  Returns the number of bytes buffered but not yet written
+        '''
+        head = self._head
+        tail = self._tail
+        if head >= tail:
+            return head - tail
+        return self._end - tail + head
+
+    def _reserve(self, length):
+        ''' @brief          Finds room for a record, first writing any pending gap record
+            @param length   Number of payload bytes
+            @return         The offset to pack the record at, or -1 if the ring is full
+        '''
+        if self._gap and not self._put_gap():
+            self._gap += 1
+            self.dropped += 1
+            return -1
+        offset = self._claim(RECORD_SIZE + length)
+        if offset < 0:
+            self._gap += 1
+            self.dropped += 1
+        return offset
+
+    def _put_gap(self):
+        ''' @brief          Writes the pending gap record into the ring
+            @return         True if there was room for it
+        '''
+        offset = self._claim(RECORD_SIZE)
+        if offset < 0:
+            return False
+        struct.pack_into(RECORD_FORMAT, self.buf, offset, utime.ticks_us(), KIND_GAP, 0,
+                         self._gap if self._gap < 65535 else 65535)
+        self._head = offset + RECORD_SIZE
+        self._gap = 0
+        return True
+
+    def _claim(self, n):
+        head = self._head
+        tail = self._tail
+        if head >= tail:
+            if head + n <= self.size:
+                return head
+            if n < tail:
+                self._end = head
+                return 0
+            return -1
+        if head + n < tail:
+            return head
+        return -1
+
+    def add_value(self, channel, value):
+        ''' @brief          Records a single ADC conversion
+            @param channel  ADC_XP or ADC_YM
+            @param value    The conversion
+        '''
+        offset = self._reserve(2)
+        if offset < 0:
+            return
+        buf = self.buf
+        struct.pack_into(RECORD_FORMAT, buf, offset, utime.ticks_us(), KIND_ADC, channel, 2)
+        struct.pack_into('<H', buf, offset + RECORD_SIZE, value)
+        self._head = offset + RECORD_SIZE + 2
+        self.recorded += 1
+
+    def add_values(self, channel, values):
+        ''' @brief          Records the conversions of one read_timed() call
+            @param channel  ADC_XP or ADC_YM
+            @param values   An array of conversions
+        '''
+        n = len(values)
+        offset = self._reserve(2*n)
+        if offset < 0:
+            return
+        buf = self.buf
+        struct.pack_into(RECORD_FORMAT, buf, offset, utime.ticks_us(), KIND_ADC, channel, 2*n)
+        pos = offset + RECORD_SIZE
+        for i in range(n):
+            struct.pack_into('<H', buf, pos, values[i])
+            pos += 2
+        self._head = pos
+        self.recorded += 1
+
+    def add_bytes(self, memaddr, data):
+        ''' @brief          Records the bytes of one I2C register read
+            @param memaddr  The first register read
+            @param data     The bytes read, as a bytes or bytearray object, or an array of
+                            signed 16-bit values like the one BNO055.read_state() reads into,
+                            which is packed little endian
+        '''
+        words = not (isinstance(data, bytearray) or isinstance(data, bytes))
+        n = 2*len(data) if words else len(data)
+        offset = self._reserve(n)
+        if offset < 0:
+            return
+        buf = self.buf
+        struct.pack_into(RECORD_FORMAT, buf, offset, utime.ticks_us(), KIND_I2C, memaddr, n)
+        start = offset + RECORD_SIZE
+        if words:
+            pos = start
+            for i in range(len(data)):
+                struct.pack_into('<h', buf, pos, data[i])
+                pos += 2
+        else:
+            buf[start:start + n] = data
+        self._head = start + n
+        self.recorded += 1
+
+    def flush(self):
+        ''' @brief   Writes up to chunk buffered bytes to the sink
+            @details Bytes are written straight from the ring buffer in at most two
+                     contiguous pieces. Only the bytes the sink accepts are consumed, so
+                     after a short write, or a write returning None, the rest is written
+                     by the next call.
+            @return  The number of bytes written
+        '''
+        if self.sink is None:
+            return 0
+        head = self._head
+        tail = self._tail
+        count = 0
+        while tail != head and count < self.chunk:
+            if head < tail:
+                end = self._end
+                if tail >= end:
+                    tail = 0
+                    continue
+            else:
+                end = head
+            if end - tail > self.chunk - count:
+                end = tail + self.chunk - count
+            n = self.sink.write(self._view[tail:end])
+            if not n:
+                break
+            count += n
+            tail += n
+            if tail < end:
+                break
+        self._tail = tail
+        self.written += count
+        return count
+
+
+def _unwrap_adc(adc, channel):
+    ''' @brief  Returns the ADC object a RecordingADC wraps, for Touch_Pan.wrap_adcs()
+    '''
+    return adc.adc
+
+
+def read_recording(data):
+    ''' @brief      Unpacks a recording
+        @param data A bytes-like object holding a whole recording, such as a file read back
+        @return     A tuple of the description dictionary and a generator of
+                    (ticks_us, kind, channel, payload) tuples
+    '''
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError('Not a sensor recording')
+    version, length = struct.unpack_from(HEADER_FORMAT, data, len(MAGIC))
+    if version != VERSION:
+        raise ValueError('Unsupported recording version {:}'.format(version))
+    start = len(MAGIC) + struct.calcsize(HEADER_FORMAT)
+    description = json.loads(bytes(data[start:start + length]).decode())
+    return description, _read_records(data, start + length)
+
+
+def _read_records(data, offset):
+    while offset + RECORD_SIZE <= len(data):
+        tick, kind, channel, length = struct.unpack_from(RECORD_FORMAT, data, offset)
+        offset += RECORD_SIZE
+        if kind == KIND_GAP:
+            yield tick, kind, channel, length
+            continue
+        if offset + length > len(data):
+            return
+        yield tick, kind, channel, bytes(data[offset:offset + length])
+        offset += length
@@ -0,0 +1,349 @@
+''' @file       scheduler.py
+    @brief      Deadline-aware cooperative task scheduler.
+    @details    Dispatches task objects with a run() method at fixed periods.
+                Each pass of the scheduler samples the clock once and runs, in
+                priority order, every task whose release time has arrived, so
+                higher priority tasks (sensors) always run before lower
+                priority tasks (controllers) that are due in the same frame.
+                All bookkeeping lives in lists preallocated when tasks are
+                added; run() does not allocate.
+
+                When constructed with profile=True the scheduler also keeps a
+                TaskStats record of run time, release jitter and deadline
+                misses for every task. Other code sections can be timed by
+                registering a probe on the same TaskStats object.
+
+                TimerLoop runs a chain of tasks at a fixed rate from a
+                hardware timer. The timer interrupt only records the time and
+                hands the chain to micropython.schedule(), so the tasks run
+                outside hard interrupt context while the cooperative
+                Scheduler keeps running slower, blocking work in between.
+    @author     Faith Chau
+    @author     Luisa Chiu
+    @date       October 18, 2026
+'''
+
+import utime
+import array
+import micropython
+
+## @brief     Initial value of the minimum run time counters
+#  @details   Larger than any run time that can be measured with ticks_us()
+_NO_MIN = 0x3FFFFFFF
+
+
+class TaskStats:
+    ''' @brief      Preallocated execution-time and jitter counters.
+        @details    Each slot records the number of runs, the minimum, maximum
+                    and total run time, the maximum and total release jitter
+                    and the number of missed deadlines, all in microseconds.
+                    Counters are stored in arrays created up front so that
+                    recording never allocates.
+    '''
+
+    def __init__(self, size=16):
+        ''' @brief          Constructs an empty set of counters
+            @param size     The maximum number of tasks and probes recorded
+        '''
+        ## @brief     Names of the slots in use
+        #  @details   Slot numbers are indices into this list
+        self.names = []
+        ## @brief     Number of runs recorded in each slot
+        self.count = array.array('L', size*[0])
+        ## @brief     Shortest run time in each slot
+        self.t_min = array.array('l', size*[_NO_MIN])
+        ## @brief     Longest run time in each slot
+        self.t_max = array.array('l', size*[0])
+        ## @brief     Sum of run times in each slot
+        self.t_sum = array.array('L', size*[0])
+        ## @brief     Largest delay between release and start in each slot
+        self.jit_max = array.array('l', size*[0])
+        ## @brief     Sum of delays between release and start in each slot
+        self.jit_sum = array.array('L', size*[0])
+        ## @brief     Number of missed deadlines in each slot
+        #  @details   A deadline is missed when a run starts a whole period
+        #             late or takes longer than its period
+        self.misses = array.array('L', size*[0])
+
+    def probe(self, name):
+        ''' @brief          Reserves a slot for timing a section of code
+            @param name     The name printed for the slot
+            @return         The slot number to pass to record()
+        '''
+        if len(self.names) >= len(self.count):
+            raise ValueError('TaskStats is full')
+        self.names.append(name)
+        return len(self.names) - 1
+
+    def record(self, slot, duration, jitter=0, missed=False):
+        ''' @brief          Adds one run to a slot
+            @param slot     The slot number returned by probe()
+            @param duration The run time in microseconds
+            @param jitter   The delay in microseconds between release and start
+            @param missed   True if the run missed its deadline
+        '''
+        self.count[slot] += 1
+        self.t_sum[slot] += duration
+        if duration < self.t_min[slot]:
+            self.t_min[slot] = duration
+        if duration > self.t_max[slot]:
+            self.t_max[slot] = duration
+        self.jit_sum[slot] += jitter
+        if jitter > self.jit_max[slot]:
+            self.jit_max[slot] = jitter
+        if missed:
+            self.misses[slot] += 1
+
+    def measure(self, slot, start):
+        ''' @brief          Records the time elapsed since start in a slot
+            @param slot     The slot number returned by probe()
+            @param start    The utime.ticks_us() value taken before the section
+        '''
+        self.record(slot, utime.ticks_diff(utime.ticks_us(), start))
+
+    def reset(self):
+        ''' @brief  Clears all counters, keeping the slots
+        '''
+        for slot in range(len(self.count)):
+            self.count[slot] = 0
+            self.t_min[slot] = _NO_MIN
+            self.t_max[slot] = 0
+            self.t_sum[slot] = 0
+            self.jit_max[slot] = 0
+            self.jit_sum[slot] = 0
+            self.misses[slot] = 0
+
+    def print_table(self):
+        ''' @brief  Prints the counters of every slot
+        '''
+        print('{:<14}{:>9}{:>8}{:>8}{:>8}{:>9}{:>9}{:>8}'.format(
+              'Task', 'Runs', 'Min', 'Mean', 'Max', 'Jit avg', 'Jit max', 'Missed'))
+        for slot in range(len(self.names)):
+            n = self.count[slot]
+            if n == 0:
+                print('{:<14}{:>9}'.format(self.names[slot], 0))
+                continue
+            print('{:<14}{:>9}{:>8}{:>8}{:>8}{:>9}{:>9}{:>8}'.format(
+                  self.names[slot], n, self.t_min[slot], self.t_sum[slot]//n, self.t_max[slot],
+                  self.jit_sum[slot]//n, self.jit_max[slot], self.misses[slot]))
+        print('Times in microseconds')
+
+
+class Scheduler:
+    ''' @brief      A fixed-priority, period based cooperative scheduler.
+        @details    Tasks are added with add() and then dispatched by repeated
+                    calls to run(), or by run_forever(). A task released late
+                    by one or more whole periods is run once and then
+                    realigned to its original phase instead of being run
+                    repeatedly to catch up.
+    '''
+
+    def __init__(self, profile=False, size=16):
+        ''' @brief          Constructs an empty scheduler
+            @param profile  True to record run time and jitter for every task
+            @param size     The number of TaskStats slots to preallocate when profiling
+        '''
+        ## @brief     Run time and jitter counters, or None when not profiling
+        #  @details   Tasks occupy the first slots in the order they were added;
+        #             further slots can be reserved with TaskStats.probe()
+        self.stats = TaskStats(size) if profile else None
+        ## @brief     The TaskStats slot of each task, in dispatch order
+        self.slots = []
+        ## @brief     The task objects in dispatch order
+        #  @details   Sorted by descending priority, ties in order of add()
+        self.tasks = []
+        ## @brief     The functions called to run each task, in dispatch order
+        #  @details   The bound run() method of each task, looked up once in add()
+        self.calls = []
+        ## @brief     Names of the tasks in dispatch order
+        #  @details   Used when printing diagnostics
+        self.names = []
+        ## @brief     Task periods in microseconds, in dispatch order
+        self.periods = []
+        ## @brief     Task priorities, in dispatch order
+        self.priorities = []
+        ## @brief     utime.ticks_us() value of the next release of each task
+        self.releases = []
+
+    def add(self, task, period, priority=0, phase=0, name=None):
+        ''' @brief              Adds a task to the scheduler
+            @param task         An object with a run() method, or a function
+                                taking no arguments
+            @param period       The period, in microseconds, between runs.
+                                A period of 0 runs the task on every pass.
+            @param priority     Tasks with a larger priority run first when
+                                several are due in the same pass
+            @param phase        Delay, in microseconds, before the first run.
+                                Used to keep tasks of equal period from all
+                                landing in the same frame.
+            @param name         Optional name used in diagnostics
+            @return             The position of the task in dispatch order
+        '''
+        index = len(self.tasks)
+        while index > 0 and self.priorities[index - 1] < priority:
+            index -= 1
+        self.tasks.insert(index, task)
+        self.calls.insert(index, getattr(task, 'run', task))
+        self.names.insert(index, name or type(task).__name__)
+        self.periods.insert(index, period)
+        self.priorities.insert(index, priority)
+        self.releases.insert(index, utime.ticks_add(utime.ticks_us(), phase))
+        self.slots.insert(index, -1 if self.stats is None else self.stats.probe(self.names[index]))
+        return index
+
+    def run(self):
+        ''' @brief  Runs every task whose release time has arrived
+            @return The number of tasks dispatched
+        '''
+        now = utime.ticks_us()
+        releases = self.releases
+        calls = self.calls
+        stats = self.stats
+        dispatched = 0
+        for i in range(len(self.tasks)):
+            late = utime.ticks_diff(now, releases[i])
+            if late >= 0:
+                period = self.periods[i]
+                if stats is None:
+                    calls[i]()
+                else:
+                    start = utime.ticks_us()
+                    calls[i]()
+                    duration = utime.ticks_diff(utime.ticks_us(), start)
+                    jitter = utime.ticks_diff(start, releases[i])
+                    stats.record(self.slots[i], duration, jitter,
+                                 period > 0 and (jitter >= period or duration > period))
+                dispatched += 1
+                if period == 0:
+                    releases[i] = now
+                else:
+                    releases[i] = utime.ticks_add(releases[i], period*(late//period + 1))
+        return dispatched
+
+    def run_forever(self):
+        ''' @brief  Dispatches tasks until a KeyboardInterrupt is received
+        '''
+        while True:
+            try:
+                self.run()
+            except KeyboardInterrupt:
+                break
+
+
+class TimerLoop:
+    ''' @brief      Runs a chain of tasks at a fixed rate from a hardware timer.
+        @details    Every update of the timer releases the chain once. The
+                    interrupt handler records the release time and schedules
+                    the chain with micropython.schedule(), using a bound method
+                    created in the constructor so that the handler does not
+                    allocate. A task added with a divider of n runs on every
+                    n-th release. If the previous chain is still pending when
+                    the timer fires, the release is dropped and counted as an
+                    overrun rather than queued.
+    '''
+
+    def __init__(self, timer, freq, stats=None):
+        ''' @brief          Constructs an idle timer loop
+            @param timer    The pyb.Timer object that releases the chain
+            @param freq     The release rate in Hz
+            @param stats    Optional TaskStats object to record run times in
+        '''
+        ## @brief     The timer that releases the chain
+        self.timer = timer
+        ## @brief     The release rate in Hz
+        self.freq = freq
+        ## @brief     The time between releases in microseconds
+        self.period = 1000000//freq
+        ## @brief     Run time counters, or None
+        #  @details   Each task occupies a slot; a release that starts a whole
+        #             period late or a chain that takes longer than a period
+        #             is counted as a miss
+        self.stats = stats
+        ## @brief     The bound run() method of each task, in chain order
+        self.calls = []
+        ## @brief     The number of releases between runs of each task
+        self.dividers = array.array('H')
+        ## @brief     Releases left before each task runs again
+        self.countdowns = array.array('H')
+        ## @brief     The TaskStats slot of each task
+        self.slots = []
+        ## @brief     Number of releases dropped because the chain was still pending
+        self.overruns = 0
+        ## @brief     Number of times the chain has run
+        self.releases = 0
+        ## @brief     The utime.ticks_us() value of the latest release
+        self._release_time = 0
+        ## @brief     Whether a run of the chain is scheduled but not yet finished
+        self._pending = False
+        ## @brief     Bound reference to _run, created once so scheduling does not allocate
+        self._run_ref = self._run
+        ## @brief     Bound reference to _tick, created once so it can be passed to the timer
+        self._tick_ref = self._tick
+
+    def add(self, task, divider=1, name=None):
+        ''' @brief              Appends a task to the chain
+            @param task         An object with a run() method, or a function
+                                taking no arguments
+            @param divider      The task runs on every divider-th release
+            @param name         Optional name used in diagnostics
+        '''
+        self.calls.append(getattr(task, 'run', task))
+        self.dividers.append(divider)
+        self.countdowns.append(1)
+        self.slots.append(-1 if self.stats is None else self.stats.probe(name or type(task).__name__))
+
+    def start(self):
+        ''' @brief  Starts releasing the chain from the timer interrupt
+        '''
+        self._pending = False
+        self.timer.init(freq=self.freq, callback=self._tick_ref)
+
+    def stop(self):
+        ''' @brief  Stops the timer interrupt; a chain already scheduled still runs
+        '''
+        self.timer.callback(None)
+
+    def _tick(self, timer):
+        ''' @brief          Timer interrupt handler
+            @details        Runs in hard interrupt context and must not allocate
+            @param timer    The timer that fired
+        '''
+        if self._pending:
+            self.overruns += 1
+            return
+        self._release_time = utime.ticks_us()
+        self._pending = True
+        try:
+            micropython.schedule(self._run_ref, 0)
+        except RuntimeError:
+            #The schedule queue is full; drop this release
+            self._pending = False
+            self.overruns += 1
+
+    def _run(self, arg):
+        ''' @brief          Runs every task of the chain that is due
+            @param arg      Unused argument passed by micropython.schedule()
+        '''
+        release = self._release_time
+        calls = self.calls
+        countdowns = self.countdowns
+        stats = self.stats
+        period = self.period
+        try:
+            for i in range(len(calls)):
+                countdowns[i] -= 1
+                if countdowns[i] == 0:
+                    countdowns[i] = self.dividers[i]
+                    if stats is None:
+                        calls[i]()
+                    else:
+                        start = utime.ticks_us()
+                        calls[i]()
+                        end = utime.ticks_us()
+                        jitter = utime.ticks_diff(start, release)
+                        stats.record(self.slots[i], utime.ticks_diff(end, start), jitter,
+                                     jitter >= period or utime.ticks_diff(end, release) > period)
+            self.releases += 1
+        finally:
+            #Cleared even when a task raises, or every later release would count as an overrun
+            self._pending = False
@@ -1,9 +1,23 @@
 ''' @file       shares.py
-    @brief      Task sharing library implementing both shares and queues.
+    @brief      Task sharing library implementing shares, state vectors and queues.
     @details    Implements a very simple interface for sharing data between
                 multiple tasks.
 '''
 
+import array
+
+## @brief      Queue overflow policy that discards the oldest item
+DROP_OLDEST = 0
+## @brief      Queue overflow policy that discards the item being added
+DROP_NEWEST = 1
+## @brief      Queue overflow policy that raises QueueFull
+RAISE = 2
+
+## @brief      The exception raised by put() on a full queue with the RAISE policy
+#  @details    Allocated once here so raising it from an interrupt callback
+#              does not allocate
+QueueFull = IndexError('Queue full')
+
 class Share:
     ''' @brief      A standard shared variable.
         @details    Values can be accessed with read() or changed with write()
@@ -27,31 +41,191 @@ class Share:
         '''
         return self._buffer
 
+class StateVector:
+    ''' @brief      A shared vector of floats published atomically.
+        @details    The values live in a single preallocated array.array. Writers
+                    update one or two elements at a time with write() or
+                    write_pair(), each of which bumps a sequence counter before
+                    and after the update. A reader that may run in between the
+                    steps of a writer, such as a scheduled interrupt callback,
+                    takes a copy-free snapshot by reading the values attribute
+                    between read_begin() and read_retry() and repeating while
+                    read_retry() returns True.
+    '''
+    def __init__(self, size=4):
+        ''' @brief      Constructs a shared vector of zeros
+            @param size The number of elements in the vector
+        '''
+        ## @brief      The elements of the vector
+        #  @details    Read directly for copy-free access; never assign to it
+        self.values = array.array('f', size*[0])
+        ## @brief      The sequence counter
+        #  @details    Odd while a write is in progress. Incremented twice per
+        #              write and wrapped so it always stays a small integer.
+        self.seq = 0
+    
+    def write(self, index, value):
+        ''' @brief       Updates one element of the vector
+            @param index The element to update
+            @param value The new value of the element
+        '''
+        self.seq = (self.seq + 1) & 0x3FFFFFFF
+        self.values[index] = value
+        self.seq = (self.seq + 1) & 0x3FFFFFFF
+    
+    def write_pair(self, index_1, value_1, index_2, value_2):
+        ''' @brief         Updates two elements of the vector as one publication
+            @details       Used by sensor tasks that measure a quantity and its
+                           rate together, so a reader never sees one without the
+                           other.
+            @param index_1 The first element to update
+            @param value_1 The new value of the first element
+            @param index_2 The second element to update
+            @param value_2 The new value of the second element
+        '''
+        self.seq = (self.seq + 1) & 0x3FFFFFFF
+        self.values[index_1] = value_1
+        self.values[index_2] = value_2
+        self.seq = (self.seq + 1) & 0x3FFFFFFF
+    
+    def read(self, index):
+        ''' @brief       Access one element of the vector
+            @param index The element to read
+            @return      The value of the element
+        '''
+        return self.values[index]
+    
+    def read_begin(self):
+        ''' @brief      Starts a consistent read of the values attribute
+            @return     The sequence number to pass to read_retry()
+        '''
+        return self.seq
+    
+    def read_retry(self, seq):
+        ''' @brief      Checks whether a read started with read_begin() was torn
+            @param seq  The value returned by read_begin()
+            @return     True if a write was in progress or completed since
+                        read_begin(), in which case the read must be repeated
+        '''
+        return (seq & 1) or seq != self.seq
+    
+    def snapshot(self, out):
+        ''' @brief      Copies a consistent view of the vector into out
+            @param out  A preallocated sequence at least as long as the vector
+            @return     out
+        '''
+        values = self.values
+        while True:
+            seq = self.seq
+            for i in range(len(values)):
+                out[i] = values[i]
+            if not ((seq & 1) or seq != self.seq):
+                return out
+
 class Queue:
     ''' @brief      A queue of shared data.
         @details    Values can be accessed with placed into queue with put() or
                     removed from the queue with get(). Check if there are
                     items in the queue with num_in() before using get().
+                    
+                    The queue is a fixed-capacity ring buffer allocated when it
+                    is constructed, so put() and get() take constant time and
+                    never allocate. Numeric items can be stored in an
+                    array.array by giving a typecode. put() only writes the
+                    tail index and get() only writes the head index, so one
+                    interrupt callback may put() while one task calls get().
+                    The default DROP_NEWEST policy keeps this true when the
+                    queue is full; DROP_OLDEST also moves the head, so it must
+                    only be used when put() and get() run in the same context.
     '''
-    def __init__(self):
+    def __init__(self, size=32, typecode=None, overflow=DROP_NEWEST):
         ''' @brief              Constructs an empty queue of shared values
+            @param size         The maximum number of items held by the queue
+            @param typecode     An array.array typecode for numeric items, or
+                                None to hold any Python object
+            @param overflow     What put() does when the queue is full: one of
+                                DROP_OLDEST, DROP_NEWEST or RAISE
         '''
-        self._buffer = []
+        # One slot is always left empty to tell a full queue from an empty one
+        if typecode is None:
+            self._buffer = (size + 1)*[None]
+        else:
+            self._buffer = array.array(typecode, (size + 1)*[0])
+        self._objects = typecode is None
+        self._len = size + 1
+        self._head = 0
+        self._tail = 0
+        ## @brief      The overflow policy used by put()
+        self.overflow = overflow
+        ## @brief      The largest number of items the queue has held
+        self.high_water = 0
+        ## @brief      The number of items discarded because the queue was full
+        self.dropped = 0
     
     def put(self, item):
         ''' @brief      Adds an item to the end of the queue.
+            @details    If the queue is full the overflow policy decides
+                        whether the oldest item is discarded, the new item is
+                        discarded or QueueFull is raised. Safe to call from an
+                        interrupt callback unless the policy is DROP_OLDEST.
             @param item The new item to append to the queue.
+            @return     False if the new item was discarded, otherwise True
         '''
-        self._buffer.append(item)
+        tail = self._tail
+        nxt = tail + 1
+        if nxt == self._len:
+            nxt = 0
+        if nxt == self._head:
+            if self.overflow == DROP_NEWEST:
+                self.dropped += 1
+                return False
+            elif self.overflow == RAISE:
+                raise QueueFull
+            head = self._head + 1
+            self._head = 0 if head == self._len else head
+            self.dropped += 1
+        self._buffer[tail] = item
+        self._tail = nxt
+        count = nxt - self._head
+        if count < 0:
+            count += self._len
+        if count > self.high_water:
+            self.high_water = count
+        return True
         
     def get(self):
         ''' @brief      Remove the first item from the front of the queue
+            @details    Object slots are cleared as they are vacated so the
+                        queue does not keep removed items alive.
             @return     The value of the item removed
         '''
-        return self._buffer.pop(0)
+        head = self._head
+        if head == self._tail:
+            raise IndexError('Queue empty')
+        item = self._buffer[head]
+        if self._objects:
+            self._buffer[head] = None
+        head += 1
+        self._head = 0 if head == self._len else head
+        return item
     
     def num_in(self):
         ''' @brief      Find the number of items in the queue. Call before get().
             @return     The number of items in the queue
         '''
-        return len(self._buffer)
\ No newline at end of file
+        count = self._tail - self._head
+        if count < 0:
+            count += self._len
+        return count
+    
+    def capacity(self):
+        ''' @brief      Find the maximum number of items the queue can hold.
+            @return     The capacity given when the queue was constructed
+        '''
+        return self._len - 1
+    
+    def clear(self):
+        ''' @brief      Discards every item in the queue.
+        '''
+        while self._head != self._tail:
+            self.get()
@@ -0,0 +1,85 @@
+'''@file        __init__.py
+   @brief       Host-side simulation of the Nucleo hardware used in Lab 0x0FF.
+   @details     Provides drop-in replacements for the pyb, utime, micropython
+                and ulab modules so the unmodified firmware in this directory
+                can be imported and run under CPython. Call install() before
+                importing any firmware module; sensor values are then scripted
+                through ::board.
+
+                Firmware modules are stored here with a LabFF_ prefix but are
+                copied to the board without it, so LabFF_main.py imports
+                task_motor rather than LabFF_task_motor. install() adds an
+                import hook that resolves the board names to the prefixed
+                files, which means the firmware runs exactly as flashed.
+
+                Example:
+                @code
+                import sim
+                sim.install()
+                panel = sim.board.add_touch_panel('A7', 'A1', 'A6', 'A0')
+                import touch_pan
+                @endcode
+   @author      Faith Chau
+   @author      Luisa Chiu
+   @date        October 18, 2026
+'''
+
+import importlib.abc
+import importlib.util
+import os
+import sys
+
+from sim.board import board
+
+## @brief     Directory holding the firmware sources
+#  @details   The parent directory of this package
+FIRMWARE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+## @brief     Prefix of firmware file names that is dropped on the board
+PREFIX = 'LabFF_'
+
+
+class _FirmwareFinder(importlib.abc.MetaPathFinder):
+    ''' @brief      Resolves board module names to LabFF_ prefixed sources
+    '''
+
+    def __init__(self, firmware_dir):
+        self.firmware_dir = firmware_dir
+
+    def find_spec(self, name, path=None, target=None):
+        if '.' in name:
+            return None
+        filename = os.path.join(self.firmware_dir, PREFIX + name + '.py')
+        if not os.path.exists(filename):
+            return None
+        return importlib.util.spec_from_file_location(name, filename)
+
+
+def install(firmware_dir=FIRMWARE_DIR):
+    ''' @brief              Makes the stand-ins and firmware modules importable
+        @details            Safe to call more than once.
+        @param firmware_dir Directory holding the firmware sources
+    '''
+    from sim import pyb, utime, micropython, ulab
+    sys.modules['pyb'] = pyb
+    sys.modules['utime'] = utime
+    sys.modules['micropython'] = micropython
+    sys.modules['ulab'] = ulab
+    sys.modules['ulab.numpy'] = ulab.numpy
+    if firmware_dir not in sys.path:
+        sys.path.insert(0, firmware_dir)
+    if not any(isinstance(f, _FirmwareFinder) for f in sys.meta_path):
+        sys.meta_path.insert(0, _FirmwareFinder(firmware_dir))
+
+
+def reset(virtual=None):
+    ''' @brief          Resets the simulated board and forgets firmware modules
+        @details        Firmware modules are re-imported on next use so module
+                        level state starts fresh.
+        @param virtual  Optionally switches between a real and virtual clock
+    '''
+    board.reset(virtual)
+    for name in list(sys.modules):
+        module = sys.modules[name]
+        filename = getattr(module, '__file__', None) or ''
+        if os.path.dirname(os.path.abspath(filename)) == FIRMWARE_DIR:
+            del sys.modules[name]
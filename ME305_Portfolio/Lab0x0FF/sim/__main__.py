@@ -0,0 +1,51 @@
+'''@file        __main__.py
+   @brief       Runs LabFF_main.main() on the simulated board.
+   @details     Usage: python -m sim [--seconds N] [--keys KEYS] [--virtual US] [--usb-out FILE]
+
+                The touch panel and IMU are attached with the pin and bus
+                assignments used by LabFF_main, KEYS are typed into the serial
+                port at start-up and the program is stopped with a simulated
+                Ctrl-C after N seconds. Bytes written to the serial port, such
+                as binary telemetry, can be saved to FILE.
+   @author      Faith Chau
+   @author      Luisa Chiu
+   @date        October 18, 2026
+'''
+
+import argparse
+
+import sim
+
+
+def main(argv=None):
+    ''' @brief Parses the command line and runs the firmware main program
+    '''
+    parser = argparse.ArgumentParser(prog='python -m sim', description='Run LabFF_main on the simulated board.')
+    parser.add_argument('--seconds', type=float, default=2.0, help='simulated run time')
+    parser.add_argument('--keys', default='', help='characters typed into the serial port')
+    parser.add_argument('--virtual', type=int, metavar='US', help='use a virtual clock advancing US per clock read')
+    parser.add_argument('--touch', type=float, nargs=2, metavar=('X', 'Y'), help='ball position in mm')
+    parser.add_argument('--usb-out', metavar='FILE', help='file the bytes written to the serial port are saved to')
+    args = parser.parse_args(argv)
+
+    sim.install()
+    sim.reset(args.virtual is not None)
+    sim.board.clock.step_us = args.virtual or 0
+    panel = sim.board.add_touch_panel('A7', 'A1', 'A6', 'A0')
+    if args.touch:
+        panel.touch(*args.touch)
+    sim.board.add_bno055()
+    sim.board.usb_feed(args.keys)
+    sim.board.interrupt_after(int(args.seconds*1000000))
+
+    import main as firmware_main
+    try:
+        firmware_main.main()
+    finally:
+        if args.usb_out:
+            with open(args.usb_out, 'wb') as f:
+                f.write(sim.board.usb_out)
+
+
+if __name__ == '__main__':
+    main()
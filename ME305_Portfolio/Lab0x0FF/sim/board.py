@@ -0,0 +1,451 @@
+'''@file        board.py
+   @brief       Scriptable state of the simulated Nucleo board.
+   @details     Holds everything the hardware stand-ins in pyb.py, utime.py and
+                micropython.py read from or write to: the microsecond clock,
+                pin levels and modes, ADC sources, I2C devices, the USB virtual
+                comm port and any pending timer or external interrupts. Tests
+                and benchmarks script sensor values through the module level
+                ::board object.
+   @author      Faith Chau
+   @author      Luisa Chiu
+   @date        October 18, 2026
+'''
+
+import random
+import time
+
+## @brief     Period of the MicroPython ticks counters
+#  @details   ticks_us() and ticks_ms() wrap around at 2**30 on the board.
+TICKS_PERIOD = 1 << 30
+## @brief     Mask used to wrap ticks values
+#  @details   Equal to TICKS_PERIOD - 1.
+TICKS_MAX = TICKS_PERIOD - 1
+## @brief     Half of the ticks period
+#  @details   Used by ticks_diff() to produce signed differences.
+TICKS_HALF = TICKS_PERIOD >> 1
+## @brief     Full scale value of the 12-bit ADC
+#  @details   ADC.read() returns values between 0 and ADC_MAX.
+ADC_MAX = 4095
+## @brief     Maximum number of functions waiting in the schedule queue
+#  @details   Matches MICROPY_SCHEDULER_DEPTH on the STM32 port.
+SCHEDULE_DEPTH = 8
+
+
+class Clock:
+    ''' @brief      Microsecond clock behind utime and pyb.
+        @details    In real mode the clock follows time.perf_counter_ns() so
+                    per-tick costs can be measured. In virtual mode time only
+                    moves when advance() or one of the sleep functions is
+                    called, which makes runs fully deterministic.
+    '''
+
+    def __init__(self, virtual=False):
+        ''' @brief              Constructs a clock
+            @param virtual      True to start in virtual (manually advanced) mode
+        '''
+        ## @brief     True when the clock is advanced manually
+        #  @details   Real clocks follow the host performance counter
+        self.virtual = virtual
+        ## @brief     Elapsed microseconds in virtual mode
+        #  @details   Also used as the offset applied to the real clock
+        self._now_us = 0
+        ## @brief     Host counter value corresponding to time zero
+        #  @details   Only used in real mode
+        self._origin_ns = time.perf_counter_ns()
+        ## @brief     Microseconds a virtual clock advances on every read
+        #  @details   Stands in for the cost of the code between two reads so
+        #             free-running loops make progress; zero by default
+        self.step_us = 0
+
+    def now(self):
+        ''' @brief  Returns the unwrapped number of microseconds since reset
+        '''
+        if self.virtual:
+            self._now_us += self.step_us
+            return self._now_us
+        return self._now_us + (time.perf_counter_ns() - self._origin_ns)//1000
+
+    def advance(self, us):
+        ''' @brief      Moves the clock forward
+            @details    In real mode the offset is increased so sleeps still
+                        return immediately while the reported time moves on.
+            @param us   Number of microseconds to advance by
+        '''
+        if us > 0:
+            self._now_us += int(us)
+
+    def reset(self, virtual=None):
+        ''' @brief          Returns the clock to time zero
+            @param virtual  Optionally switches between real and virtual mode
+        '''
+        if virtual is not None:
+            self.virtual = virtual
+        self._now_us = 0
+        self._origin_ns = time.perf_counter_ns()
+
+
+class PinState:
+    ''' @brief      Electrical state of one simulated GPIO pin.
+    '''
+
+    def __init__(self, name):
+        ''' @brief          Constructs the state for a pin
+            @param name     The CPU name of the pin, for example 'A7'
+        '''
+        ## @brief     CPU name of the pin
+        #  @details   Used as the key in Board.pins
+        self.name = name
+        ## @brief     Current pin mode
+        #  @details   One of the pyb.Pin mode constants, -1 before init
+        self.mode = -1
+        ## @brief     Current pull configuration
+        #  @details   One of the pyb.Pin pull constants
+        self.pull = 0
+        ## @brief     Output level of the pin
+        #  @details   Also returned by value() for input pins unless scripted
+        self.value = 0
+
+
+class I2CDevice:
+    ''' @brief      A simulated I2C device exposing a 256 byte register map.
+        @details    Subclasses override on_write() to react to register writes.
+    '''
+
+    def __init__(self, addr):
+        ''' @brief          Constructs a device
+            @param addr     The 7-bit bus address of the device
+        '''
+        ## @brief     The 7-bit bus address of the device
+        #  @details   Used by pyb.I2C to route transactions
+        self.addr = addr
+        ## @brief     Register map of the device
+        #  @details   Memory reads and writes index into this buffer
+        self.regs = bytearray(256)
+        ## @brief     Number of bus transactions served
+        #  @details   Counts both reads and writes
+        self.transactions = 0
+
+    def read(self, memaddr, buf):
+        ''' @brief          Copies registers starting at memaddr into buf
+            @param memaddr  The first register to read
+            @param buf      A writable byte-wise memoryview to fill
+        '''
+        self.transactions += 1
+        n = len(buf)
+        buf[:] = self.regs[memaddr:memaddr + n]
+
+    def write(self, memaddr, data):
+        ''' @brief          Stores data starting at register memaddr
+            @param memaddr  The first register to write
+            @param data     The bytes to write
+        '''
+        self.transactions += 1
+        self.regs[memaddr:memaddr + len(data)] = data
+        self.on_write(memaddr, data)
+
+    def on_write(self, memaddr, data):
+        ''' @brief Hook called after every register write
+        '''
+        pass
+
+
+class BNO055Model(I2CDevice):
+    ''' @brief      Register level model of the BNO055 orientation sensor.
+        @details    Euler angles and gyro rates are set in the units the
+                    firmware driver reports (degrees and radians per second)
+                    and encoded into the data registers. Calibration profile
+                    registers only accept writes in CONFIG mode, as on the part.
+    '''
+
+    ## @brief     Operating mode register
+    OPR_MODE = 0x3D
+    ## @brief     First gyro data register
+    GYR_DATA = 0x14
+    ## @brief     First Euler angle data register
+    EUL_DATA = 0x1A
+    ## @brief     Calibration status register
+    CALIB_STAT = 0x35
+    ## @brief     First calibration profile register
+    CALIB_DATA = 0x55
+
+    def __init__(self, addr=0x28):
+        ''' @brief          Constructs a BNO055 model
+            @param addr     The bus address, 0x28 by default
+        '''
+        super().__init__(addr)
+        self.regs[0x00] = 0xA0
+        ## @brief     Number of OPR_MODE writes seen
+        #  @details   Lets benchmarks count redundant mode switches
+        self.mode_writes = 0
+
+    def write(self, memaddr, data):
+        ''' @brief      Stores data, dropping profile writes outside CONFIG mode
+        '''
+        end = memaddr + len(data)
+        if self.regs[self.OPR_MODE] != 0 and memaddr < self.CALIB_DATA + 22 and end > self.CALIB_DATA:
+            data = bytearray(data)
+            for reg in range(max(memaddr, self.CALIB_DATA), min(end, self.CALIB_DATA + 22)):
+                data[reg - memaddr] = self.regs[reg]
+        super().write(memaddr, data)
+
+    def on_write(self, memaddr, data):
+        ''' @brief Tracks operating mode changes
+        '''
+        if memaddr <= self.OPR_MODE < memaddr + len(data):
+            self.mode_writes += 1
+
+    def _put(self, reg, values, scale):
+        for i, v in enumerate(values):
+            raw = int(round(v*scale))
+            raw = max(-32768, min(32767, raw)) & 0xFFFF
+            self.regs[reg + 2*i] = raw & 0xFF
+            self.regs[reg + 2*i + 1] = raw >> 8
+
+    def set_euler(self, heading, roll, pitch):
+        ''' @brief          Sets the Euler angle registers
+            @param heading  Heading angle in degrees
+            @param roll     Roll angle in degrees
+            @param pitch    Pitch angle in degrees
+        '''
+        self._put(self.EUL_DATA, (heading, roll, pitch), 16)
+
+    def set_gyro(self, x, y, z):
+        ''' @brief      Sets the gyro rate registers
+            @param x    Rate about x in radians per second
+            @param y    Rate about y in radians per second
+            @param z    Rate about z in radians per second
+        '''
+        self._put(self.GYR_DATA, (x, y, z), 900)
+
+    def set_calib_status(self, sys_, gyr, acc, mag):
+        ''' @brief Sets the four 2-bit calibration status fields
+        '''
+        self.regs[self.CALIB_STAT] = (sys_ << 6) | (gyr << 4) | (acc << 2) | mag
+
+
+class TouchPanel:
+    ''' @brief      Model of a four-wire resistive touch panel.
+        @details    Produces the ADC readings the driver sees for the current
+                    drive configuration of the four panel pins. A position of
+                    None means nothing is touching the panel.
+    '''
+
+    def __init__(self, x_p, x_m, y_p, y_m, width=176, length=100):
+        ''' @brief          Constructs a panel model and attaches it to the pins
+            @param x_p      Name of the pin on the x+ electrode
+            @param x_m      Name of the pin on the x- electrode
+            @param y_p      Name of the pin on the y+ electrode
+            @param y_m      Name of the pin on the y- electrode
+            @param width    Width of the panel in millimetres
+            @param length   Length of the panel in millimetres
+        '''
+        ## @brief     Pin names of the four electrodes
+        #  @details   Ordered x+, x-, y+, y-
+        self.pins = (str(x_p), str(x_m), str(y_p), str(y_m))
+        ## @brief     Width of the panel in millimetres
+        self.width = width
+        ## @brief     Length of the panel in millimetres
+        self.length = length
+        ## @brief     Current contact point in millimetres from the centre
+        #  @details   None while nothing touches the panel
+        self.position = None
+        ## @brief     ADC reading at the middle of the z scan
+        #  @details   Returned when the panel is touched
+        self.z_level = 2000
+
+    def touch(self, x, y):
+        ''' @brief      Places the contact point
+            @param x    Position in millimetres from the centre along x
+            @param y    Position in millimetres from the centre along y
+        '''
+        self.position = (x, y)
+
+    def release(self):
+        ''' @brief Removes the contact point
+        '''
+        self.position = None
+
+    def adc(self, pin, pins):
+        ''' @brief          Returns the ADC value seen on pin, or None
+            @param pin      Name of the pin being converted
+            @param pins     The Board.pins dictionary
+        '''
+        x_p, x_m, y_p, y_m = (pins.get(p) for p in self.pins)
+        if pin not in self.pins or None in (x_p, x_m, y_p, y_m):
+            return None
+        if self.position is None:
+            return 0
+        x, y = self.position
+        if pin == self.pins[3] and x_p.value and not x_m.value:
+            return int(ADC_MAX*(0.5 + x/self.width))
+        if pin == self.pins[0] and y_p.value and not y_m.value:
+            if x_m.mode == 1:
+                return self.z_level
+            return int(ADC_MAX*(0.5 + y/self.length))
+        return 0
+
+
+class Board:
+    ''' @brief      Complete state of the simulated board.
+    '''
+
+    def __init__(self):
+        ''' @brief      Constructs an idle board with a real-time clock
+        '''
+        ## @brief     The microsecond clock
+        #  @details   Shared by utime and pyb
+        self.clock = Clock()
+        self.reset()
+
+    def reset(self, virtual=None):
+        ''' @brief          Returns the board to its power-up state
+            @param virtual  Optionally switches the clock mode
+        '''
+        self.clock.reset(virtual)
+        ## @brief     Pin states keyed by CPU pin name
+        self.pins = {}
+        ## @brief     Scripted ADC sources keyed by CPU pin name
+        #  @details   Values are ints or callables taking the pin name
+        self.adc_sources = {}
+        ## @brief     Standard deviation, in counts, of noise added to ADC reads
+        #  @details   Zero for exact readings
+        self.adc_noise = 0
+        ## @brief     Random number generator used for sensor noise
+        #  @details   Reseed it to make noisy runs repeatable
+        self.rng = random.Random(0)
+        ## @brief     Models that compute ADC readings from pin state
+        #  @details   Consulted before adc_sources
+        self.analog_models = []
+        ## @brief     Simulated I2C devices keyed by (bus, address)
+        self.i2c_devices = {}
+        ## @brief     Bytes waiting to be read from the USB virtual comm port
+        self.usb_in = bytearray()
+        ## @brief     Bytes written to the USB virtual comm port
+        self.usb_out = bytearray()
+        ## @brief     Timers with an active callback
+        self.timers = []
+        ## @brief     Registered external interrupts keyed by pin name
+        self.extints = {}
+        ## @brief     Functions queued with micropython.schedule()
+        self.scheduled = []
+        ## @brief     Total number of PWM compare register writes
+        #  @details   Incremented by every TimerChannel write
+        self.pwm_writes = 0
+        ## @brief     Clock value at which KeyboardInterrupt is raised
+        #  @details   None to run forever
+        self.deadline_us = None
+        self._servicing = False
+
+    # --- pins and ADC -----------------------------------------------------
+
+    def pin(self, name):
+        ''' @brief          Returns the state of pin name, creating it if needed
+            @param name     The CPU name of the pin
+        '''
+        state = self.pins.get(name)
+        if state is None:
+            state = self.pins[name] = PinState(name)
+        return state
+
+    def set_adc(self, pin, source):
+        ''' @brief          Scripts the value returned by ADC reads on a pin
+            @param pin      The CPU name of the pin
+            @param source   An int, or a callable taking the pin name
+        '''
+        self.adc_sources[str(pin)] = source
+
+    def adc_read(self, pin):
+        ''' @brief          Returns the ADC reading for a pin
+            @param pin      The CPU name of the pin
+        '''
+        for model in self.analog_models:
+            value = model.adc(pin, self.pins)
+            if value is not None:
+                break
+        else:
+            value = self.adc_sources.get(pin, 0)
+            if callable(value):
+                value = value(pin)
+        if self.adc_noise:
+            value += self.rng.gauss(0, self.adc_noise)
+        return max(0, min(ADC_MAX, int(value)))
+
+    def add_touch_panel(self, x_p, x_m, y_p, y_m, **kwargs):
+        ''' @brief      Attaches a TouchPanel model to the four given pins
+            @return     The new TouchPanel object
+        '''
+        panel = TouchPanel(x_p, x_m, y_p, y_m, **kwargs)
+        self.analog_models.append(panel)
+        return panel
+
+    # --- I2C ----------------------------------------------------------------
+
+    def add_i2c_device(self, bus, device):
+        ''' @brief          Connects a device to an I2C bus
+            @param bus      The bus number
+            @param device   An I2CDevice object
+            @return         The device
+        '''
+        self.i2c_devices[(bus, device.addr)] = device
+        return device
+
+    def add_bno055(self, bus=1, addr=0x28):
+        ''' @brief      Connects a BNO055Model to an I2C bus
+            @return     The new BNO055Model object
+        '''
+        return self.add_i2c_device(bus, BNO055Model(addr))
+
+    # --- USB ------------------------------------------------------------------
+
+    def usb_feed(self, data):
+        ''' @brief          Queues bytes as if typed into the serial terminal
+            @param data     A str or bytes object
+        '''
+        if isinstance(data, str):
+            data = data.encode()
+        self.usb_in.extend(data)
+
+    # --- interrupts -------------------------------------------------------------
+
+    def trigger_extint(self, pin):
+        ''' @brief          Fires the external interrupt attached to a pin
+            @param pin      The CPU name of the pin
+        '''
+        extint = self.extints.get(str(pin))
+        if extint is not None:
+            extint.swint()
+
+    def interrupt_after(self, us):
+        ''' @brief      Raises KeyboardInterrupt once us microseconds pass
+            @details    Emulates pressing Ctrl-C in the REPL, which is how
+                        LabFF_main.main() is normally stopped.
+            @param us   Microseconds from now, or None to cancel
+        '''
+        self.deadline_us = None if us is None else self.clock.now() + us
+
+    def service(self):
+        ''' @brief      Delivers pending timer interrupts and scheduled calls
+            @details    Called by every utime and pyb time function, which is
+                        the closest host equivalent of the board checking for
+                        interrupts between bytecodes.
+        '''
+        if self._servicing:
+            return
+        self._servicing = True
+        try:
+            now = self.clock.now()
+            for tim in self.timers:
+                tim._service(now)
+            while self.scheduled:
+                func, arg = self.scheduled.pop(0)
+                func(arg)
+            if self.deadline_us is not None and now >= self.deadline_us:
+                self.deadline_us = None
+                raise KeyboardInterrupt
+        finally:
+            self._servicing = False
+
+
+## @brief     The simulated board used by all stand-in modules
+#  @details   Scripts and tests modify this object to drive the firmware
+board = Board()
@@ -0,0 +1,54 @@
+'''@file        micropython.py
+   @brief       Host stand-in for the MicroPython micropython module.
+   @details     Code emitter decorators are identities and the heap functions
+                do nothing. schedule() queues a call that Board.service()
+                runs, and raises RuntimeError when the queue is full, matching
+                the behaviour of the STM32 port.
+   @author      Faith Chau
+   @author      Luisa Chiu
+   @date        October 18, 2026
+'''
+
+from sim.board import board, SCHEDULE_DEPTH
+
+
+def const(value):
+    ''' @brief Declares a compile-time constant
+    '''
+    return value
+
+
+def schedule(func, arg):
+    ''' @brief Queues func(arg) to run outside of interrupt context
+    '''
+    if len(board.scheduled) >= SCHEDULE_DEPTH:
+        raise RuntimeError('schedule queue full')
+    board.scheduled.append((func, arg))
+
+
+def native(func):
+    return func
+
+
+def viper(func):
+    return func
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def heap_lock():
+    return 0
+
+
+def heap_unlock():
+    return 0
+
+
+def mem_info(verbose=None):
+    pass
+
+
+def opt_level(level=None):
+    return 0
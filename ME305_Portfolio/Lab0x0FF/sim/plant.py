@@ -0,0 +1,504 @@
+'''@file        plant.py
+   @brief       Batched ball-on-plate plant model for closed loop benchmarks.
+   @details     Simulates many independent scenarios of the platform at once
+                with NumPy, so controllers can be evaluated far faster than
+                real time without the hardware. Each scenario has two
+                decoupled axes with the state [x, th, xd, thd] in SI units:
+                ball position (m), plate angle (rad) and their rates.
+
+                Per axis the ball rolls without slipping on a plate pivoting
+                about its centre, and the plate is driven by a motor through
+                a lever arm of length r_m and a push rod acting l_P from the
+                pivot:
+
+                (1 + I_B/(m_B r_B^2)) xdd = x thd^2 + g sin(th)
+
+                (I_P + m_B x^2) thdd = (l_P/r_m) T_m - b thd - 2 m_B x xd thd
+                                       + m_B g x cos(th) + m_P g r_G sin(th)
+
+                where a positive angle lowers the +x side of the plate. The
+                motor torque follows from the PWM duty cycle with the same
+                motor constant R/(Kt*Vdc) = 13.345 used by
+                closedloop.DUTY_PER_TORQUE, less the back EMF of the motor:
+
+                T_m = gain*(Kt/R)*(Vdc*duty/100 - Kt*(l_P/r_m)*thd)
+
+                Measurements are returned in the firmware units, [mm, deg,
+                mm/s, rad/s], in the order of the shared state vectors and
+                with the signs the sensors read on the rig, and duty cycles
+                act on the model with the signs of the motors, so the folded
+                gains of a closedloop.ClosedLoopPair, or the real run()
+                method, can be applied directly. The plate rates come from
+                the BNO055 gyro in rad/s while the angles come from its Euler
+                angles in degrees.
+
+                The model is experimental. Its sensor and motor signs are
+                guessed and its parameters are nominal values that were
+                never identified on the rig. check() compares it with a
+                recorded run of the rig, by default RIG_RUN, and
+                tools.identify fits the signs, lever arm and plate inertia
+                to such a run. Until check() passes, gains tuned or
+                benchmarked on the model carry no weight on the hardware,
+                and the tools refuse to write them.
+   @author      Faith Chau
+   @author      Luisa Chiu
+   @date        October 18, 2026
+'''
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+## @brief     Motor constant R/(Kt*Vdc) in ohm/(N*m/A*V), as in closedloop.DUTY_PER_TORQUE
+MOTOR_CONSTANT = 13.345
+## @brief     Gravitational acceleration in m/s^2
+G = 9.81
+## @brief     Scale from SI states [m, rad, m/s, rad/s] to firmware units [mm, deg, mm/s, rad/s]
+TO_FIRMWARE = np.array([1000.0, 180/np.pi, 1000.0, 1.0])
+## @brief     Guessed signs of the measured states relative to the model, per axis
+#  @details   Rows are the x and y state vectors and columns the ball position and velocity
+#             from the touch panel, the Euler angle and the gyro rate, in state vector order.
+#             Not measured: they were inferred from the gains in config.DEFAULTS, assuming
+#             those balance the rig, which RIG_RUN contradicts. The rate of the x row is read
+#             from gyr_z by task_IMU, which is only the plate rate if the BNO055 is mounted on
+#             its side, and the rate gains are too small for RIG_RUN to tell their sign.
+SENSOR_SIGNS = np.array([[1.0, 1.0, 1.0, -1.0],
+                         [1.0, 1.0, 1.0, -1.0]])
+## @brief     Guessed signs of the plate torque produced by a positive duty cycle, per axis
+#  @details   Not measured; inferred from the opposite signs of the two gain rows in
+#             config.DEFAULTS.
+MOTOR_SIGNS = np.array([-1.0, 1.0])
+## @brief     The recorded run of the rig check() compares the model with
+#  @details   The only rig data available: the ball positions of the run plotted in the
+#             Lab 0x0FF report (LabFF_Plot_xpos.png and LabFF_Plot_ypos.png), read back from
+#             the plots to within about 2 mm and 10 ms. The run used the gains in
+#             config.DEFAULTS, which lost the ball about 1.2 s after it was placed.
+RIG_RUN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rig_run.csv')
+
+## @brief     Default physical parameters of the platform, in SI units
+#  @details   Masses in kg, lengths in m, inertia in kg*m^2, damping in N*m*s/rad,
+#             Kt in N*m/A and R in ohm. gain scales the motor torque.
+DEFAULT_PARAMS = {'m_B': 0.030, 'r_B': 0.0105, 'm_P': 0.400, 'I_P': 1.88e-3, 'r_G': 0.042,
+                  'r_m': 0.060, 'l_P': 0.110, 'b': 0.010, 'Kt': 0.0138, 'R': 2.21, 'gain': 1.0}
+
+
+class BallPlate:
+    ''' @brief      A batch of independent two axis ball-on-plate scenarios.
+        @details    Parameters may be scalars or arrays with one value per
+                    scenario, which is how randomised scenarios are built.
+    '''
+
+    def __init__(self, n, sensor_signs=SENSOR_SIGNS, motor_signs=MOTOR_SIGNS, **params):
+        ''' @brief              Constructs n scenarios at rest with the ball in the centre
+            @param n            Number of scenarios
+            @param sensor_signs Signs of the measured states, shape (2, 4), or (n, 2, 4) for
+                                signs that differ between scenarios
+            @param motor_signs  Signs of the motor torques, shape (2,) or (n, 2)
+            @param params       Overrides of DEFAULT_PARAMS
+        '''
+        unknown = set(params) - set(DEFAULT_PARAMS)
+        if unknown:
+            raise ValueError('Unknown plant parameters: ' + ', '.join(sorted(unknown)))
+        ## @brief     Number of scenarios
+        self.n = n
+        ## @brief     Parameters by name, each an array of shape (n, 1)
+        self.params = {}
+        for name, default in DEFAULT_PARAMS.items():
+            value = np.asarray(params.get(name, default), dtype=float)
+            self.params[name] = np.broadcast_to(value.reshape(-1, 1), (n, 1)).copy()
+        ## @brief     Scale from the model states to the measured states, shape (2, 4) or (n, 2, 4)
+        self.sensor_scale = TO_FIRMWARE*np.asarray(sensor_signs, dtype=float)
+        ## @brief     Signs of the motor torques, shape (2,) or (n, 2)
+        self.motor_signs = np.asarray(motor_signs, dtype=float)
+        ## @brief     States of every scenario, shape (n, 2, 4) in SI units
+        #  @details   Axis 0 is [x, th_y, xd, th_yd] and axis 1 is [y, th_x, yd, th_xd]
+        self.q = np.zeros((n, 2, 4))
+        self._precompute()
+
+    def _precompute(self):
+        p = self.params
+        ## @brief     Ratio of plate torque to motor torque
+        self._lever = p['l_P']/p['r_m']
+        ## @brief     Supply voltage implied by MOTOR_CONSTANT, Kt and R
+        vdc = p['R']/(p['Kt']*MOTOR_CONSTANT)
+        ## @brief     Motor torque per percent duty cycle
+        self._torque_per_duty = p['gain']*p['Kt']/p['R']*vdc/100
+        ## @brief     Motor torque per plate angular velocity from back EMF
+        self._torque_per_rate = p['gain']*p['Kt']**2/p['R']*self._lever
+        ## @brief     Inverse of the effective rolling mass factor of the ball
+        self._roll = 1/(1 + 0.4)
+
+    def reset(self, q0=0.0):
+        ''' @brief      Sets the states of every scenario
+            @param q0   States in SI units, broadcastable to (n, 2, 4)
+        '''
+        self.q[...] = q0
+
+    def derivatives(self, q, duty):
+        ''' @brief      Evaluates the equations of motion
+            @param q    States, shape (n, 2, 4)
+            @param duty Duty cycles in percent as applied by the firmware, shape (n, 2)
+            @return     The state derivatives, shape (n, 2, 4)
+        '''
+        p = self.params
+        x, th, xd, thd = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+        torque = self._torque_per_duty*self.motor_signs*duty - self._torque_per_rate*thd
+        sin_th = np.sin(th)
+        xdd = self._roll*(x*thd*thd + G*sin_th)
+        thdd = (self._lever*torque - p['b']*thd - 2*p['m_B']*x*xd*thd
+                + p['m_B']*G*x*np.cos(th) + p['m_P']*G*p['r_G']*sin_th)/(p['I_P'] + p['m_B']*x*x)
+        return np.stack((xd, thd, xdd, thdd), axis=-1)
+
+    def step(self, duty, dt, substeps=1):
+        ''' @brief          Advances every scenario with the duty cycles held constant
+            @param duty     Duty cycles in percent, shape (n, 2)
+            @param dt       Time step in seconds
+            @param substeps Number of fourth order Runge-Kutta steps taken within dt
+        '''
+        h = dt/substeps
+        q = self.q
+        for _ in range(substeps):
+            k1 = self.derivatives(q, duty)
+            k2 = self.derivatives(q + 0.5*h*k1, duty)
+            k3 = self.derivatives(q + 0.5*h*k2, duty)
+            k4 = self.derivatives(q + h*k3, duty)
+            q = q + h/6*(k1 + 2*k2 + 2*k3 + k4)
+        self.q = q
+
+    def measure(self):
+        ''' @brief      Returns the states as the firmware measures them
+            @return     An array of shape (n, 2, 4) in [mm, deg, mm/s, rad/s]
+        '''
+        return self.q*self.sensor_scale
+
+
+class BatchController:
+    ''' @brief      Applies a firmware controller to a batch of measurements.
+        @details    Uses the duty gains and saturation limits folded by the
+                    controller itself, so anything set_gain() does is taken
+                    into account. Accepts a closedloop.ClosedLoopPair or a pair
+                    of closedloop.ClosedLoop objects, one per axis.
+    '''
+
+    def __init__(self, controller):
+        ''' @brief              Reads the folded gains of a controller
+            @param controller   A ClosedLoopPair, or a (ClosedLoop, ClosedLoop) tuple
+        '''
+        if isinstance(controller, (tuple, list)):
+            gains = [list(c.duty_gain) for c in controller]
+            sat = controller[0]
+        else:
+            gains = np.reshape(list(controller.duty_gain), (2, 4))
+            sat = controller
+        ## @brief     Duty cycle per measured state, shape (2, 4)
+        self.duty_gain = np.array(gains, dtype=float)
+        ## @brief     Upper saturation limit in percent
+        self.sat_max = sat.sat_max
+        ## @brief     Lower saturation limit in percent
+        self.sat_min = sat.sat_min
+
+    def __call__(self, measured):
+        ''' @brief          Computes the saturated duty cycles
+            @param measured Measurements in firmware units, shape (n, 2, 4)
+            @return         Duty cycles in percent, shape (n, 2)
+        '''
+        duty = np.einsum('aj,naj->na', self.duty_gain, measured)
+        return np.clip(duty, self.sat_min, self.sat_max)
+
+
+class FirmwareController:
+    ''' @brief      Runs the controller's own run() method once per scenario.
+        @details    Slow, but executes exactly the code flashed on the board,
+                    including the reads of the shared state vectors. Used to
+                    check BatchController on small batches.
+    '''
+
+    def __init__(self, controller):
+        ''' @brief              Wraps a controller
+            @param controller   A ClosedLoopPair, or a (ClosedLoop, ClosedLoop) tuple
+        '''
+        ## @brief     The wrapped controller or controllers
+        self.controller = controller
+        first = controller[0] if isinstance(controller, (tuple, list)) else controller
+        ## @brief     Upper saturation limit in percent
+        self.sat_max = first.sat_max
+        ## @brief     Lower saturation limit in percent
+        self.sat_min = first.sat_min
+
+    def __call__(self, measured):
+        ''' @brief          Computes the saturated duty cycles
+            @param measured Measurements in firmware units, shape (n, 2, 4)
+            @return         Duty cycles in percent, shape (n, 2)
+        '''
+        c = self.controller
+        pair = not isinstance(c, (tuple, list))
+        vectors = (c.state_vect_x, c.state_vect_y) if pair else (c[0].state_vect, c[1].state_vect)
+        duty = np.empty(measured.shape[:2])
+        for i in range(len(measured)):
+            for axis in range(2):
+                for j in range(4):
+                    vectors[axis].write(j, float(measured[i, axis, j]))
+            if pair:
+                c.run()
+                duty[i] = c.duty_1, c.duty_2
+            else:
+                c[0].run()
+                c[1].run()
+                duty[i] = c[0].L.read(), c[1].L.read()
+        return duty
+
+
+class Episode:
+    ''' @brief      The result of simulate(), with scoring metrics per scenario
+    '''
+
+    def __init__(self, t, positions, duty, sat, tol_mm, diverged):
+        ## @brief     Control instants in seconds
+        self.t = t
+        ## @brief     Ball position magnitude on each axis in mm, shape (steps, n, 2)
+        self.positions = positions
+        ## @brief     Duty cycles applied, shape (steps, n, 2)
+        self.duty = duty
+        ## @brief     True for scenarios where the ball left the plate or the plate hit its stops
+        self.diverged = diverged
+        dt = t[1] - t[0] if len(t) > 1 else 0.0
+        outside = np.abs(positions).max(axis=2) > tol_mm
+        # Settling time: the instant after the last sample outside the tolerance
+        last_out = len(t) - 1 - np.argmax(outside[::-1], axis=0)
+        ## @brief     Time until the ball stays within tol_mm of the centre, in seconds
+        #  @details   Infinite for scenarios that never settle or diverged
+        self.settling_time = np.where(outside.any(axis=0), (last_out + 1)*dt, 0.0)
+        self.settling_time[outside[-1] | diverged] = np.inf
+        start = positions[0]
+        crossed = -positions*np.sign(start)
+        ## @brief     Largest excursion past the centre, as a fraction of the initial offset
+        self.overshoot = (np.clip(crossed, 0, None).max(axis=0)/np.maximum(np.abs(start), 1e-9)).max(axis=1)
+        ## @brief     Time spent with either duty cycle at a saturation limit, in seconds
+        self.saturation_time = (np.abs(duty) >= sat).any(axis=2).sum(axis=0)*dt
+
+    def score(self, settle_weight=1.0, overshoot_weight=1.0, saturation_weight=1.0, diverged_penalty=100.0):
+        ''' @brief      Combines the metrics into one cost per scenario; lower is better
+            @return     An array of shape (n,)
+        '''
+        settle = np.where(np.isfinite(self.settling_time), self.settling_time, self.t[-1] if len(self.t) else 0.0)
+        return (settle_weight*settle + overshoot_weight*self.overshoot
+                + saturation_weight*self.saturation_time + diverged_penalty*self.diverged)
+
+
+def simulate(controller, plant, seconds=2.0, period=0.0005, substeps=1, delay=0, noise=None, rng=None,
+             tol_mm=5.0, limits=(0.1, np.radians(15))):
+    ''' @brief              Runs every scenario of a plant in closed loop
+        @param controller   A callable mapping measurements (n, 2, 4) to duty cycles (n, 2),
+                            such as a BatchController or FirmwareController
+        @param plant        A BallPlate, already reset to the initial states
+        @param seconds      Simulated time in seconds
+        @param period       Control period in seconds; the duty cycle is held in between
+        @param substeps     Runge-Kutta steps per control period
+        @param delay        Measurement latency in control periods, broadcastable to (n, 4)
+                            so it may differ per scenario and per state
+        @param noise        Standard deviation of the measurement noise in firmware units,
+                            broadcastable to (n, 2, 4), or None
+        @param rng          A numpy Generator used for the noise
+        @param tol_mm       Settling tolerance on the ball position in mm
+        @param limits       Ball position in m and plate angle in rad beyond which a scenario
+                            counts as diverged and is frozen
+        @return             An Episode
+    '''
+    n = plant.n
+    steps = int(round(seconds/period))
+    delay = np.asarray(delay, dtype=int)
+    delay = np.broadcast_to(delay.reshape(-1, 1) if delay.ndim == 1 else delay, (n, 4))[:, None, :]
+    depth = int(delay.max()) + 1
+    rng = np.random.default_rng() if rng is None else rng
+    history = np.repeat(plant.measure()[None], depth, axis=0)
+    index = np.ix_(np.arange(n), np.arange(2), np.arange(4))
+    positions = np.empty((steps, n, 2))
+    duties = np.empty((steps, n, 2))
+    diverged = np.zeros(n, dtype=bool)
+    for k in range(steps):
+        measured = plant.measure()
+        if noise is not None:
+            measured = measured + rng.standard_normal(measured.shape)*noise
+        history[k % depth] = measured
+        duty = controller(history[((k - delay) % depth,) + index])
+        duty[diverged] = 0.0
+        positions[k] = plant.q[..., 0]*1000
+        duties[k] = duty
+        frozen = plant.q[diverged]
+        plant.step(duty, period, substeps)
+        plant.q[diverged] = frozen
+        q = plant.q
+        diverged |= ((np.abs(q[..., 0]) > limits[0]) | (np.abs(q[..., 1]) > limits[1])).any(axis=1)
+        diverged |= ~np.isfinite(q).all(axis=(1, 2))
+    sat = min(abs(controller.sat_max), abs(controller.sat_min))
+    return Episode(np.arange(steps)*period, positions, duties, sat, tol_mm, diverged)
+
+
+def make_controller(gains, saturation=80):
+    ''' @brief              Builds a firmware ClosedLoopPair with its own shares
+        @param gains        A 2x4 gain matrix, as in the configuration file
+        @param saturation   Duty cycle limit in percent
+        @return             A closedloop.ClosedLoopPair
+    '''
+    import sim
+    sim.install()
+    import closedloop
+    import shares
+    return closedloop.ClosedLoopPair(saturation, -saturation, shares.Share(0), shares.Share(0),
+                                     shares.StateVector(4), shares.StateVector(4), gains)
+
+
+def load_run(path=RIG_RUN):
+    ''' @brief      Reads a recorded run of the rig
+        @details    A CSV file whose header names at least the time_s, x_mm and y_mm columns,
+                    such as the CSV written by tools.decode_telemetry. An axis reading nan has
+                    no reading in that row, as when the ball has lost contact.
+        @param path The file to read
+        @return     A tuple (t, positions) of the times in seconds from the first row and the
+                    ball positions in mm, shape (rows, 2)
+    '''
+    data = np.genfromtxt(path, delimiter=',', names=True)
+    t = data['time_s'] - data['time_s'][0]
+    return t, np.stack((data['x_mm'], data['y_mm']), axis=1)
+
+
+def run_errors(model, t, positions, gains=None, period=0.0005):
+    ''' @brief          Simulates a recorded run and measures how far the model is from it
+        @details        Every scenario starts from its current state at the first row of the run
+                        and is driven by the gains the run was recorded with. Scenarios are not
+                        frozen when the ball leaves the plate, so a model that loses the ball too
+                        early keeps a large error.
+        @param model    A BallPlate, already reset to the initial states
+        @param t        The times of the run, as from load_run()
+        @param positions The ball positions of the run in mm, as from load_run()
+        @param gains    A 2x4 gain matrix, or None for the gains in config.DEFAULTS
+        @param period   Control period in seconds
+        @return         The RMS error over the readings of each axis in mm, shape (n, 2)
+    '''
+    import sim
+    sim.install()
+    import config
+    if gains is None:
+        gains = config.DEFAULTS['gains']
+    controller = BatchController(make_controller(gains, config.DEFAULTS['saturation']))
+    with np.errstate(all='ignore'):
+        episode = simulate(controller, model, t[-1] + period, period, limits=(np.inf, np.inf))
+    errors = np.empty((model.n, 2))
+    for axis in range(2):
+        read = np.isfinite(positions[:, axis])
+        simulated = episode.positions[np.minimum(np.round(t[read]/period).astype(int), len(episode.t) - 1), :, axis]
+        errors[:, axis] = np.sqrt(np.mean((simulated - positions[read, axis, None])**2, axis=0))
+    return np.where(np.isfinite(errors), errors, np.inf)
+
+
+def random_states(n, positions, rng, speed=50.0, angle=2.0):
+    ''' @brief          Draws initial states for fitting a run whose initial state is unknown
+        @details        Positions are drawn within 3 mm of the first reading of each axis, or of
+                        the centre before the first reading, velocities within speed and plate
+                        angles within angle; the plate starts at rest.
+        @param n        Number of states
+        @param positions The ball positions of the run in mm, as from load_run()
+        @param rng      A numpy Generator
+        @param speed    Largest initial ball speed in mm/s
+        @param angle    Largest initial plate angle in degrees
+        @return         States in SI units, shape (n, 2, 4)
+    '''
+    start = np.where(np.isfinite(positions[0]), positions[0], 0.0)
+    q0 = np.zeros((n, 2, 4))
+    q0[..., 0] = (start + rng.uniform(-3, 3, (n, 2)))/1000
+    q0[..., 1] = np.radians(rng.uniform(-angle, angle, (n, 2)))
+    q0[..., 2] = rng.uniform(-speed, speed, (n, 2))/1000
+    return q0
+
+
+def check(gains=None, run=RIG_RUN, n=1000, tolerance=10.0, seed=0):
+    ''' @brief          Checks that the nominal model reproduces a recorded run of the rig
+        @details        The initial state of the run is unknown, so n random initial states are
+                        tried and the one closest to the run counts, separately for each axis.
+                        The run does not tell the signs of the small rate gains apart, so each
+                        state is tried with both gyro signs and the worse one counts.
+        @param gains    The 2x4 gain matrix the run was recorded with, or None for the gains in
+                        config.DEFAULTS
+        @param run      The CSV file of the run, see load_run()
+        @param n        Number of initial states tried
+        @param tolerance Largest RMS error in mm on either axis for the check to pass
+        @param seed     Random seed of the initial states
+        @return         A dictionary with the run, the RMS error of each axis in mm, the tolerance
+                        and whether the check passed
+    '''
+    t, positions = load_run(run)
+    q0 = random_states(n, positions, np.random.default_rng(seed))
+    flipped = SENSOR_SIGNS.copy()
+    flipped[:, 3] *= -1
+    model = BallPlate(2*n, sensor_signs=np.repeat(np.stack((SENSOR_SIGNS, flipped)), n, axis=0))
+    model.reset(np.concatenate((q0, q0)))
+    errors = run_errors(model, t, positions, gains)
+    best = np.maximum(errors[:n], errors[n:]).min(axis=0)
+    return {'run': os.path.basename(run), 'rms_mm': [round(float(e), 1) for e in best],
+            'tolerance_mm': tolerance, 'passed': bool((best <= tolerance).all())}
+
+
+def check_warning(result=None):
+    ''' @brief          Runs check() and describes a failure
+        @param result   A result of check() to describe instead of running it again
+        @return         A warning to print, or None if the check passed
+    '''
+    result = result or check()
+    if result['passed']:
+        return None
+    return ('Warning: the plant model is experimental. It does not reproduce the rig run {:} '
+            '(RMS error {:} mm on x and {:} mm on y, tolerance {:} mm), so gains found with it '
+            'are not known to work on the hardware.'.format(result['run'], result['rms_mm'][0],
+                                                            result['rms_mm'][1], result['tolerance_mm']))
+
+
+def main(argv=None):
+    ''' @brief Benchmarks the configured gains on a batch of random initial positions
+    '''
+    parser = argparse.ArgumentParser(prog='python -m sim.plant', description='Benchmark ClosedLoopPair on the plant model.')
+    parser.add_argument('--n', type=int, default=1000, help='number of scenarios')
+    parser.add_argument('--seconds', type=float, default=2.0, help='simulated time per scenario')
+    parser.add_argument('--period', type=float, default=500, help='control period in microseconds')
+    parser.add_argument('--offset', type=float, default=30, help='largest initial ball offset in mm')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--gains', help='JSON 2x4 gain matrix, by default the gains in config.DEFAULTS')
+    parser.add_argument('--check', action='store_true',
+                        help='only check that the model reproduces the recorded rig run')
+    args = parser.parse_args(argv)
+
+    if args.check:
+        result = check()
+        print('Rig run {:}: RMS error {:} mm on x and {:} mm on y, tolerance {:} mm'.format(
+              result['run'], result['rms_mm'][0], result['rms_mm'][1], result['tolerance_mm']))
+        if not result['passed']:
+            raise SystemExit('Check failed: the plant model does not reproduce the rig')
+        print('Check passed')
+        return
+
+    import sim
+    sim.install()
+    import config
+    gains = json.loads(args.gains) if args.gains else config.DEFAULTS['gains']
+    controller = make_controller(gains, config.DEFAULTS['saturation'])
+    rng = np.random.default_rng(args.seed)
+    plant = BallPlate(args.n)
+    q0 = np.zeros((args.n, 2, 4))
+    q0[..., 0] = rng.uniform(-args.offset, args.offset, (args.n, 2))/1000
+    plant.reset(q0)
+    start = time.perf_counter()
+    episode = simulate(BatchController(controller), plant, args.seconds, args.period*1e-6)
+    elapsed = time.perf_counter() - start
+    settled = np.isfinite(episode.settling_time)
+    print('{:} scenarios of {:} s in {:.2f} s ({:.0f}x real time)'.format(
+          args.n, args.seconds, elapsed, args.n*args.seconds/elapsed))
+    print('settled {:}, diverged {:}, median settling time {:} s, mean overshoot {:.2f}, mean saturation {:.3f} s'.format(
+          settled.sum(), episode.diverged.sum(),
+          '{:.3f}'.format(np.median(episode.settling_time[settled])) if settled.any() else '-',
+          episode.overshoot.mean(), episode.saturation_time.mean()))
+
+
+if __name__ == '__main__':
+    main()
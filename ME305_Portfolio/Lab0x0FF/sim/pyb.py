@@ -0,0 +1,433 @@
+'''@file        pyb.py
+   @brief       Host stand-in for the MicroPython pyb module.
+   @details     Implements the subset of Pin, ADC, Timer, ExtInt, I2C and
+                USB_VCP used by the Lab 0x0FF firmware on top of the scriptable
+                state in board.py.
+   @author      Faith Chau
+   @author      Luisa Chiu
+   @date        October 18, 2026
+'''
+
+from sim.board import board, TICKS_MAX
+
+
+class _PinNamespace:
+    ''' @brief      Implements Pin.cpu and Pin.board attribute lookups
+    '''
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return Pin(name)
+
+
+class Pin:
+    ''' @brief      A GPIO pin.
+        @details    Pin objects are singletons per CPU pin name, just like on
+                    the board, so constructing Pin(Pin.cpu.A7, Pin.IN) returns
+                    the same object as Pin.cpu.A7 after reconfiguring it.
+    '''
+    IN = 0
+    OUT_PP = 1
+    AF_PP = 2
+    ANALOG = 3
+    OUT_OD = 17
+    AF_OD = 18
+    PULL_NONE = 0
+    PULL_UP = 1
+    PULL_DOWN = 2
+    cpu = _PinNamespace()
+    board = cpu
+
+    _instances = {}
+
+    def __new__(cls, id, mode=-1, pull=-1, af=-1, value=None):
+        if isinstance(id, Pin):
+            name = id._state.name
+        else:
+            name = str(id)
+        self = cls._instances.get(name)
+        if self is None or self._state is not board.pins.get(name):
+            self = object.__new__(cls)
+            self._state = board.pin(name)
+            cls._instances[name] = self
+        if mode != -1:
+            self.init(mode, pull, af, value)
+        return self
+
+    def init(self, mode=-1, pull=-1, af=-1, value=None):
+        ''' @brief Reconfigures the pin in place
+        '''
+        if mode != -1:
+            self._state.mode = mode
+        if pull != -1:
+            self._state.pull = pull
+        if value is not None:
+            self._state.value = 1 if value else 0
+
+    def high(self):
+        self._state.value = 1
+
+    def low(self):
+        self._state.value = 0
+
+    on = high
+    off = low
+
+    def value(self, v=None):
+        if v is None:
+            return self._state.value
+        self._state.value = 1 if v else 0
+
+    def name(self):
+        return self._state.name
+
+    def mode(self):
+        return self._state.mode
+
+    def pull(self):
+        return self._state.pull
+
+    def __str__(self):
+        return self._state.name
+
+    def __repr__(self):
+        return 'Pin(Pin.cpu.{:})'.format(self._state.name)
+
+
+class ADC:
+    ''' @brief      A 12-bit analog to digital converter channel
+    '''
+
+    def __init__(self, pin):
+        ## @brief     The pin being converted
+        self.pin = Pin(pin)
+        self.pin.init(Pin.ANALOG)
+
+    def read(self):
+        ''' @brief Returns the current reading of the channel
+        '''
+        return board.adc_read(self.pin._state.name)
+
+    def read_timed(self, buf, timer):
+        ''' @brief      Fills buf with readings paced by timer
+            @details    Blocks for len(buf) timer periods, like the board does.
+        '''
+        name = self.pin._state.name
+        interval = 1000000/timer.freq()
+        for i in range(len(buf)):
+            buf[i] = board.adc_read(name)
+            if board.clock.virtual:
+                board.clock.advance(interval)
+        board.service()
+
+
+class TimerChannel:
+    ''' @brief      One output compare or PWM channel of a Timer
+    '''
+
+    def __init__(self, timer, channel, mode, pin):
+        self.timer = timer
+        self.channel_num = channel
+        self.mode = mode
+        self.pin = None if pin is None else Pin(pin, Pin.AF_PP)
+        self._percent = 0
+        ## @brief     Number of compare register writes on this channel
+        self.writes = 0
+
+    def pulse_width_percent(self, value=None):
+        ''' @brief Gets or sets the PWM duty cycle as a percentage
+        '''
+        if value is None:
+            return self._percent
+        self._percent = max(0, min(100, value))
+        self.writes += 1
+        board.pwm_writes += 1
+
+    def pulse_width(self, value=None):
+        ''' @brief Gets or sets the PWM pulse width in timer counts
+        '''
+        if value is None:
+            return int(self._percent*self.timer._period/100)
+        self.pulse_width_percent(100*value/self.timer._period)
+
+    def callback(self, fun):
+        self._callback = fun
+
+
+class Timer:
+    ''' @brief      A hardware timer.
+        @details    Timers with a callback fire from Board.service() whenever
+                    the simulated clock passes the next update event.
+    '''
+    UP = 0
+    DOWN = 16
+    CENTER = 32
+    PWM = 0
+    PWM_INVERTED = 1
+    OC_TIMING = 2
+    OC_ACTIVE = 3
+    OC_INACTIVE = 4
+    OC_TOGGLE = 5
+    OC_FORCED_ACTIVE = 6
+    OC_FORCED_INACTIVE = 7
+    IC = 8
+    ENC_A = 9
+    ENC_B = 10
+    ENC_AB = 11
+    HIGH = 0
+    LOW = 2
+    RISING = 0
+    FALLING = 2
+    BOTH = 10
+
+    _instances = {}
+
+    def __new__(cls, num, *args, **kwargs):
+        self = cls._instances.get(num)
+        if self is None or self._timers is not board.timers:
+            self = object.__new__(cls)
+            self._num = num
+            self._timers = board.timers
+            self._freq = 0
+            self._period = TICKS_MAX
+            self._callback = None
+            self._channels = {}
+            self._next_us = None
+            cls._instances[num] = self
+        return self
+
+    def __init__(self, num, freq=None, prescaler=None, period=None, callback=None, **kwargs):
+        if freq is not None or period is not None:
+            self.init(freq=freq, prescaler=prescaler, period=period, callback=callback)
+
+    def init(self, freq=None, prescaler=None, period=None, callback=None, **kwargs):
+        ''' @brief Configures the update rate, either by freq or prescaler and period
+        '''
+        if freq is not None:
+            self._freq = freq
+            self._period = 0xFFFF
+        elif period is not None:
+            self._period = period
+            self._freq = 84000000/((prescaler or 0) + 1)/(period + 1)
+        if callback is not None:
+            self.callback(callback)
+
+    def deinit(self):
+        self.callback(None)
+        self._freq = 0
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self.init(freq=value)
+
+    def period(self):
+        return self._period
+
+    def counter(self):
+        if not self._freq:
+            return 0
+        return int(board.clock.now()*self._freq/1000000) % (self._period + 1)
+
+    def channel(self, channel, mode=None, pin=None, pulse_width_percent=None, **kwargs):
+        ''' @brief Returns a TimerChannel, configuring it when a mode is given
+        '''
+        if mode is None:
+            return self._channels.get(channel)
+        ch = TimerChannel(self, channel, mode, pin)
+        self._channels[channel] = ch
+        if pulse_width_percent is not None:
+            ch.pulse_width_percent(pulse_width_percent)
+        return ch
+
+    def callback(self, fun):
+        ''' @brief Sets the function called on each update event
+        '''
+        self._callback = fun
+        if fun is None:
+            if self in board.timers:
+                board.timers.remove(self)
+            self._next_us = None
+        else:
+            if self not in board.timers:
+                board.timers.append(self)
+            self._next_us = board.clock.now() + self._interval_us()
+
+    def _interval_us(self):
+        return 1000000/self._freq if self._freq else float('inf')
+
+    def _service(self, now):
+        # A virtual clock delivers every update event that was skipped over;
+        # in real time overruns coalesce into one call, as on the board
+        while self._callback is not None and self._next_us <= now:
+            self._next_us += self._interval_us()
+            if not board.clock.virtual and self._next_us <= now:
+                self._next_us = now + self._interval_us()
+            self._callback(self)
+
+
+class ExtInt:
+    ''' @brief      An external interrupt line attached to a pin
+    '''
+    IRQ_RISING = 0x10110000
+    IRQ_FALLING = 0x10210000
+    IRQ_RISING_FALLING = 0x10310000
+    EVT_RISING = 0x10120000
+    EVT_FALLING = 0x10220000
+    EVT_RISING_FALLING = 0x10320000
+
+    def __init__(self, pin, mode, pull, callback):
+        self.pin = Pin(pin, Pin.IN, pull)
+        self._mode = mode
+        self._callback = callback
+        self._enabled = True
+        board.extints[self.pin.name()] = self
+
+    def enable(self):
+        self._enabled = True
+
+    def disable(self):
+        self._enabled = False
+
+    def line(self):
+        return int(''.join(c for c in self.pin.name() if c.isdigit()) or 0)
+
+    def swint(self):
+        ''' @brief Triggers the callback as if an edge was seen on the pin
+        '''
+        if self._enabled and self._callback is not None:
+            self._callback(self.line())
+
+
+class I2C:
+    ''' @brief      An I2C bus in controller mode
+    '''
+    MASTER = 0
+    CONTROLLER = 0
+    SLAVE = 1
+    PERIPHERAL = 1
+
+    def __init__(self, bus, mode=None, addr=0x12, baudrate=400000, **kwargs):
+        self.bus = bus
+        self.mode = mode
+        self.baudrate = baudrate
+
+    def init(self, mode, addr=0x12, baudrate=400000, **kwargs):
+        self.mode = mode
+        self.baudrate = baudrate
+
+    def _device(self, addr):
+        device = board.i2c_devices.get((self.bus, addr))
+        if device is None:
+            raise OSError(5)
+        return device
+
+    def scan(self):
+        return sorted(addr for (bus, addr) in board.i2c_devices if bus == self.bus)
+
+    def is_ready(self, addr):
+        return (self.bus, addr) in board.i2c_devices
+
+    def mem_read(self, data, addr, memaddr, timeout=5000, addr_size=8):
+        ''' @brief          Reads device memory
+            @param data     Number of bytes to read, or a buffer to fill
+            @return         A new bytes object, or data when a buffer was given
+        '''
+        device = self._device(addr)
+        if isinstance(data, int):
+            buf = bytearray(data)
+            device.read(memaddr, memoryview(buf))
+            return bytes(buf)
+        device.read(memaddr, memoryview(data).cast('B'))
+        return data
+
+    def mem_write(self, data, addr, memaddr, timeout=5000, addr_size=8):
+        ''' @brief          Writes device memory
+            @param data     A single byte value or a buffer of bytes
+        '''
+        device = self._device(addr)
+        if isinstance(data, int):
+            data = bytes((data & 0xFF,))
+        device.write(memaddr, bytes(memoryview(data).cast('B')))
+
+
+class USB_VCP:
+    ''' @brief      The USB virtual comm port
+    '''
+
+    def __init__(self, id=0):
+        self.id = id
+
+    def isconnected(self):
+        return True
+
+    def any(self):
+        return len(board.usb_in) > 0
+
+    def read(self, nbytes=None):
+        if not board.usb_in:
+            return None
+        if nbytes is None:
+            nbytes = len(board.usb_in)
+        data = bytes(board.usb_in[:nbytes])
+        del board.usb_in[:nbytes]
+        return data
+
+    def readinto(self, buf, maxlen=None):
+        n = len(buf) if maxlen is None else min(maxlen, len(buf))
+        data = self.read(n)
+        if data is None:
+            return None
+        buf[:len(data)] = data
+        return len(data)
+
+    def readline(self):
+        end = board.usb_in.find(b'\n')
+        return self.read(None if end < 0 else end + 1)
+
+    def write(self, buf):
+        if isinstance(buf, str):
+            buf = buf.encode()
+        board.usb_out.extend(buf)
+        return len(buf)
+
+
+def millis():
+    board.service()
+    return (board.clock.now()//1000) & TICKS_MAX
+
+
+def micros():
+    board.service()
+    return board.clock.now() & TICKS_MAX
+
+
+def elapsed_millis(start):
+    return (millis() - start) & TICKS_MAX
+
+
+def elapsed_micros(start):
+    return (micros() - start) & TICKS_MAX
+
+
+def delay(ms):
+    udelay(ms*1000)
+
+
+def udelay(us):
+    if board.clock.virtual:
+        board.clock.advance(us)
+    else:
+        end = board.clock.now() + us
+        while board.clock.now() < end:
+            pass
+    board.service()
+
+
+def disable_irq():
+    return True
+
+
+def enable_irq(state=True):
+    pass
@@ -0,0 +1,10 @@
+'''@file        ulab.py
+   @brief       Host stand-in for the ulab module.
+   @details     ulab.numpy implements a subset of NumPy, so the host NumPy
+                package is used as ulab.numpy directly.
+   @author      Faith Chau
+   @author      Luisa Chiu
+   @date        October 18, 2026
+'''
+
+import numpy
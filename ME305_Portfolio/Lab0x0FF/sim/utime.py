@@ -0,0 +1,73 @@
+'''@file        utime.py
+   @brief       Host stand-in for the MicroPython utime module.
+   @details     Tick counters wrap at 2**30 exactly as on the board, so
+                firmware that forgets ticks_diff() breaks here too. Every call
+                also services pending simulated interrupts.
+   @author      Faith Chau
+   @author      Luisa Chiu
+   @date        October 18, 2026
+'''
+
+from sim.board import board, TICKS_MAX, TICKS_HALF
+
+
+def ticks_us():
+    ''' @brief Returns the wrapped microsecond counter
+    '''
+    board.service()
+    return board.clock.now() & TICKS_MAX
+
+
+def ticks_ms():
+    ''' @brief Returns the wrapped millisecond counter
+    '''
+    board.service()
+    return (board.clock.now()//1000) & TICKS_MAX
+
+
+def ticks_cpu():
+    ''' @brief Returns the highest resolution counter available
+    '''
+    return ticks_us()
+
+
+def ticks_add(ticks, delta):
+    ''' @brief Offsets a ticks value, wrapping around the ticks period
+    '''
+    return (ticks + delta) & TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    ''' @brief Returns the signed difference ticks1 - ticks2 across a wrap
+    '''
+    return ((ticks1 - ticks2 + TICKS_HALF) & TICKS_MAX) - TICKS_HALF
+
+
+def sleep_us(us):
+    ''' @brief Blocks for a number of microseconds
+    '''
+    if board.clock.virtual:
+        board.clock.advance(us)
+    else:
+        end = board.clock.now() + us
+        while board.clock.now() < end:
+            pass
+    board.service()
+
+
+def sleep_ms(ms):
+    ''' @brief Blocks for a number of milliseconds
+    '''
+    sleep_us(int(ms*1000))
+
+
+def sleep(seconds):
+    ''' @brief Blocks for a number of seconds
+    '''
+    sleep_us(int(seconds*1000000))
+
+
+def time():
+    ''' @brief Returns the number of seconds since the simulated reset
+    '''
+    return board.clock.now()//1000000
@@ -0,0 +1,288 @@
+''' @file       telemetry.py
+    @brief      Framed binary telemetry protocol.
+    @details    Packets are sent over the USB serial port as
+
+                    sync (2 bytes) | type (B) | seq (H) | length (H) | payload | crc (I)
+
+                packed little endian, where seq counts packets modulo 2**16
+                and crc is the CRC-32 of everything from type to the end of
+                the payload. The sync bytes and CRC let the host find packets
+                among the text the board also prints on the same port, and
+                gaps in seq show packets that were lost.
+
+                Payloads by type:
+                - TYPE_STATE: one or more logger frames (logger.FRAME_FORMAT)
+                - TYPE_NAMES: the TaskStats slot names, separated by newlines
+                - TYPE_TIMING: SLOT_FORMAT for every TaskStats slot in use
+                - TYPE_RAW: the next bytes of a sensor recording (recorder.py)
+
+                Telemetry packs and sends packets on the board. Decoder
+                finds and checks packets in a byte stream on the host; the
+                module only needs struct and binascii so it runs in both places.
+    @author     Faith Chau
+    @author     Luisa Chiu
+    @date       October 18, 2026
+'''
+
+import struct
+import binascii
+
+## @brief     Bytes that start every packet
+SYNC = b'\xa5\x5a'
+## @brief     struct format of the packet header
+HEADER_FORMAT = '<2sBHH'
+## @brief     Size of the packet header in bytes
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+## @brief     Size of the CRC that ends every packet in bytes
+CRC_SIZE = 4
+## @brief     Largest payload the decoder accepts
+#  @details   A longer length field can only come from a corrupted header. The payload buffer
+#             of a Telemetry object may not be larger.
+MAX_PAYLOAD = 32768
+
+## @brief     Packet type holding logger frames
+TYPE_STATE = 1
+## @brief     Packet type holding the TaskStats slot names
+TYPE_NAMES = 2
+## @brief     Packet type holding the TaskStats counters
+TYPE_TIMING = 3
+## @brief     Packet type holding part of a sensor recording
+#  @details   The payloads, joined in order, form the recording file
+TYPE_RAW = 4
+
+## @brief     struct format of the counters of one TaskStats slot
+#  @details   count, t_min, t_max, t_sum, jit_max, jit_sum, misses
+SLOT_FORMAT = '<7I'
+## @brief     Size of the counters of one TaskStats slot in bytes
+SLOT_SIZE = struct.calcsize(SLOT_FORMAT)
+
+
+class Telemetry:
+    ''' @brief      Sends telemetry packets to a serial port.
+        @details    Each packet is packed into one preallocated buffer and
+                    written from there, so a packet is never interleaved with
+                    another one and sending only writes to the port. When the
+                    port accepts part of a packet, the rest stays in flight and
+                    is written by pump() or before the next packet is started;
+                    a packet that cannot be started then is dropped and
+                    counted. A Telemetry object can be used as the sink of a
+                    logger.Logger, which then streams its frames as TYPE_STATE
+                    packets.
+    '''
+
+    def __init__(self, port, slots=16, max_payload=4096, unit=1):
+        ''' @brief              Constructs a telemetry sender
+            @param port         An object with a write() method, such as pyb.USB_VCP()
+            @param slots        The largest number of TaskStats slots sent in a timing packet
+            @param max_payload  The size of the payload buffer, at most MAX_PAYLOAD bytes
+            @param unit         write() splits data only at multiples of this many bytes,
+                                such as logger.FRAME_SIZE
+        '''
+        if max_payload > MAX_PAYLOAD:
+            raise ValueError('max_payload may not exceed {:}'.format(MAX_PAYLOAD))
+        ## @brief     The port packets are written to
+        self.port = port
+        ## @brief     Sequence number of the next packet
+        self.seq = 0
+        ## @brief     Number of packets started
+        self.sent = 0
+        ## @brief     Number of packets dropped because the last one was still in flight
+        self.dropped = 0
+        ## @brief     Largest payload of one packet
+        self.max_payload = max_payload
+        ## @brief     Largest payload write() sends in one packet, a multiple of unit
+        self._write_max = max_payload - max_payload % unit
+        ## @brief     Buffer each packet is packed into
+        self._packet = bytearray(HEADER_SIZE + max_payload + CRC_SIZE)
+        ## @brief     A view of the packet buffer, sliced without copying
+        self._packet_view = memoryview(self._packet)
+        ## @brief     Offset of the first byte of the packet in flight not yet written
+        self._pos = 0
+        ## @brief     End of the packet in flight
+        self._end = 0
+        ## @brief     Buffer the TaskStats counters are packed into
+        self._timing = bytearray(slots*SLOT_SIZE)
+        ## @brief     A view of the timing buffer, sliced without copying
+        self._timing_view = memoryview(self._timing)
+
+    def pump(self):
+        ''' @brief          Writes as much of the packet in flight as the port accepts
+            @details        Retries the remainder until the port accepts nothing more,
+                            which pyb.USB_VCP reports by returning 0 or None.
+            @return         True once no packet is in flight
+        '''
+        pos = self._pos
+        end = self._end
+        while pos < end:
+            n = self.port.write(self._packet_view[pos:end])
+            if not n:
+                break
+            pos += n
+        self._pos = pos
+        return pos >= end
+
+    def send(self, kind, payload):
+        ''' @brief          Sends one packet
+            @param kind     The packet type
+            @param payload  A bytes-like object of at most max_payload bytes
+            @return         False if the packet was dropped because the last one could not be
+                            finished, otherwise True
+        '''
+        if not self.pump():
+            self.dropped += 1
+            return False
+        length = len(payload)
+        packet = self._packet
+        struct.pack_into(HEADER_FORMAT, packet, 0, SYNC, kind, self.seq, length)
+        end = HEADER_SIZE + length
+        packet[HEADER_SIZE:end] = payload
+        crc = binascii.crc32(self._packet_view[len(SYNC):end])
+        struct.pack_into('<I', packet, end, crc & 0xFFFFFFFF)
+        self._pos = 0
+        self._end = end + CRC_SIZE
+        self.seq = (self.seq + 1) & 0xFFFF
+        self.sent += 1
+        self.pump()
+        return True
+
+    def write(self, data):
+        ''' @brief          Sends logger frames as one TYPE_STATE packet
+            @details        Data longer than the payload buffer is cut at a multiple of unit
+                            bytes and the rest is left to the caller, like a short write.
+            @param data     A bytes-like object holding whole logger frames
+            @return         The number of bytes sent, 0 if the packet was dropped
+        '''
+        n = len(data)
+        if n > self._write_max:
+            n = self._write_max
+            data = memoryview(data)[:n]
+        if not self.send(TYPE_STATE, data):
+            return 0
+        return n
+
+    def send_names(self, stats):
+        ''' @brief          Sends the names of the TaskStats slots
+            @param stats    A scheduler.TaskStats object
+        '''
+        self.send(TYPE_NAMES, '\n'.join(stats.names).encode())
+
+    def send_timing(self, stats):
+        ''' @brief          Sends the counters of every TaskStats slot in use
+            @param stats    A scheduler.TaskStats object
+        '''
+        slots = min(len(stats.names), len(self._timing)//SLOT_SIZE)
+        for slot in range(slots):
+            struct.pack_into(SLOT_FORMAT, self._timing, slot*SLOT_SIZE, stats.count[slot],
+                             stats.t_min[slot] & 0xFFFFFFFF, stats.t_max[slot], stats.t_sum[slot],
+                             stats.jit_max[slot], stats.jit_sum[slot], stats.misses[slot])
+        self.send(TYPE_TIMING, self._timing_view[:slots*SLOT_SIZE])
+
+
+class PacketSink:
+    ''' @brief      Sends everything written to it as packets of one type.
+        @details    Lets a writer that expects a file, such as a
+                    recorder.Recorder, stream through a Telemetry object.
+    '''
+
+    def __init__(self, telemetry, kind):
+        ''' @brief              Constructs a sink
+            @param telemetry    The Telemetry object packets are sent with
+            @param kind         The packet type
+        '''
+        ## @brief     The Telemetry object packets are sent with
+        self.telemetry = telemetry
+        ## @brief     The packet type
+        self.kind = kind
+
+    def write(self, data):
+        ''' @brief          Sends data as one packet
+            @details        Data longer than the payload buffer is cut and the rest is left
+                            to the caller, like a short write.
+            @param data     A bytes-like object
+            @return         The number of bytes sent, 0 if the packet was dropped
+        '''
+        telemetry = self.telemetry
+        n = len(data)
+        if n > telemetry.max_payload:
+            n = telemetry.max_payload
+            data = memoryview(data)[:n]
+        if not telemetry.send(self.kind, data):
+            return 0
+        return n
+
+
+class Decoder:
+    ''' @brief      Extracts telemetry packets from a byte stream.
+        @details    Bytes are added with feed() in pieces of any size. Bytes
+                    that are not part of a packet with a valid CRC, such as
+                    printed text, are skipped and counted.
+    '''
+
+    def __init__(self):
+        ''' @brief  Constructs a decoder with an empty buffer
+        '''
+        ## @brief     Bytes received but not yet decoded
+        self.buf = bytearray()
+        ## @brief     Number of packets decoded
+        self.packets = 0
+        ## @brief     Number of packets with a bad CRC or length
+        self.crc_errors = 0
+        ## @brief     Number of packets missing from the sequence numbers
+        self.lost = 0
+        ## @brief     Number of bytes skipped outside packets
+        self.skipped = 0
+        ## @brief     Sequence number expected next, or None before the first packet
+        self._next_seq = None
+
+    def feed(self, data):
+        ''' @brief      Adds received bytes and decodes every complete packet
+            @param data A bytes-like object
+            @return     A list of (type, seq, payload) tuples
+        '''
+        buf = self.buf
+        buf.extend(data)
+        packets = []
+        start = 0
+        while True:
+            sync = buf.find(SYNC, start)
+            if sync < 0:
+                #Keeps a last byte that may be the start of a sync word
+                keep = max(start, len(buf) - len(SYNC) + 1)
+                self.skipped += keep - start
+                start = keep
+                break
+            self.skipped += sync - start
+            start = sync
+            if len(buf) - start < HEADER_SIZE:
+                break
+            _, kind, seq, length = struct.unpack_from(HEADER_FORMAT, buf, start)
+            if length > MAX_PAYLOAD:
+                self.crc_errors += 1
+                start += 1
+                continue
+            end = start + HEADER_SIZE + length + CRC_SIZE
+            if len(buf) < end:
+                break
+            body = bytes(buf[start + len(SYNC):end - CRC_SIZE])
+            crc, = struct.unpack_from('<I', buf, end - CRC_SIZE)
+            if binascii.crc32(body) & 0xFFFFFFFF != crc:
+                self.crc_errors += 1
+                start += 1
+                continue
+            if self._next_seq is not None:
+                self.lost += (seq - self._next_seq) & 0xFFFF
+            self._next_seq = (seq + 1) & 0xFFFF
+            self.packets += 1
+            packets.append((kind, seq, body[HEADER_SIZE - len(SYNC):]))
+            start = end
+        del buf[:start]
+        return packets
+
+
+def unpack_timing(payload):
+    ''' @brief          Unpacks a TYPE_TIMING payload
+        @param payload  The packet payload
+        @return         A list of (count, t_min, t_max, t_sum, jit_max, jit_sum, misses) tuples
+    '''
+    return [struct.unpack_from(SLOT_FORMAT, payload, offset)
+            for offset in range(0, len(payload) - SLOT_SIZE + 1, SLOT_SIZE)]
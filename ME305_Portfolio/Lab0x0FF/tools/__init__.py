@@ -0,0 +1,14 @@
+'''@file        __init__.py
+   @brief       Host-side tools for Lab 0x0FF.
+   @details     Each tool is run from the Lab0x0FF directory as a module, for
+                example python -m tools.decode_telemetry. Importing the package
+                installs the stand-ins from ::sim so the tools can reuse the
+                firmware modules, such as logger and telemetry, unchanged.
+   @author      Faith Chau
+   @author      Luisa Chiu
+   @date        October 18, 2026
+'''
+
+import sim
+
+sim.install()
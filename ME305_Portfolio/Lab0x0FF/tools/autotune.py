@@ -0,0 +1,362 @@
+'''@file        autotune.py
+   @brief       Searches the controller gains on the simulated plant.
+   @details     Usage:
+                python -m tools.autotune [--method grid|random|cma] [--evaluations N]
+                                         [--checkpoint FILE] [--output config.json] [--write]
+
+                Each candidate 2x4 gain matrix is loaded into a real
+                closedloop.ClosedLoopPair and run against a fixed set of
+                initial ball offsets on the batched plant in ::sim.plant.
+                Its cost is the mean of sim.plant.Episode.score(), which
+                adds the settling time, the overshoot and the time spent at
+                the saturation limits, plus a large penalty for a ball that
+                leaves the plate. Candidates are evaluated in parallel across
+                a process pool.
+
+                The search works on gains divided by SCALE, so every
+                coordinate is of order one whatever the units of its state.
+                The methods are:
+                - grid: every combination of --levels values in [start - span, start + span]
+                - random: uniform samples from the same box
+                - cma: an evolution strategy adapting the mean, step size and
+                  covariance of its samples, in the manner of CMA-ES
+
+                Progress is written to the checkpoint file after every batch
+                of evaluations. Running the same command again resumes from
+                it, and draws the same candidates it would have without the
+                interruption. With --write, the best gains are written to the
+                gains section of the configuration file read by LabFF_main.py
+                at boot, which is created if needed and otherwise keeps its
+                other sections. They are only written if they settle every
+                scenario without diverging, and only if the plant model
+                reproduces the rig run in sim.plant.check(). The model is
+                experimental and fails that check, so --write is refused
+                before the search starts until the model has been fitted with
+                tools.identify.
+   @author      Faith Chau
+   @author      Luisa Chiu
+   @date        October 18, 2026
+'''
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+
+import numpy as np
+
+import config
+from closedloop import DUTY_PER_TORQUE
+from sim import plant
+
+## @brief     Typical deviation of each measured state, in mm, deg, mm/s and rad/s
+STATE_RANGE = np.array([10.0, 1.0, 100.0, 0.2])
+## @brief     Gain per unit of the search coordinates, one row per motor
+#  @details   A coordinate of one gives a 10% duty cycle at the typical deviation of its state
+SCALE = np.tile(10/(DUTY_PER_TORQUE*STATE_RANGE), (2, 1))
+
+## @brief     Search settings stored in the checkpoint; a resumed search must use the same values
+SETTINGS = ('method', 'start', 'span', 'levels', 'population', 'scenarios', 'offset', 'seconds',
+            'period', 'delay', 'noise', 'saturation', 'seed', 'weights')
+
+
+def gains_to_coords(gains):
+    ''' @brief          Converts a 2x4 gain matrix to search coordinates
+        @return         An array of 8 coordinates
+    '''
+    return (np.asarray(gains, dtype=float)/SCALE).ravel()
+
+
+def coords_to_gains(coords):
+    ''' @brief          Converts search coordinates to a 2x4 gain matrix
+        @return         A list of two lists of four gains, as in the configuration file
+    '''
+    return (np.reshape(coords, (2, 4))*SCALE).tolist()
+
+
+def read_gains(filename):
+    ''' @brief          Reads the gain matrix the board would use with a configuration file
+        @param filename The JSON configuration file
+        @return         Its gains section, or those in config.DEFAULTS if it has none or does not exist
+    '''
+    if os.path.exists(filename):
+        with open(filename) as f:
+            return json.load(f).get('gains', config.DEFAULTS['gains'])
+    return config.DEFAULTS['gains']
+
+
+def write_gains(filename, gains):
+    ''' @brief          Stores a gain matrix in a configuration file
+        @details        Other sections of an existing file are kept. The file is replaced
+                        atomically, so an interrupted write leaves the previous gains.
+        @param filename The JSON configuration file
+        @param gains    A 2x4 gain matrix
+    '''
+    cfg = {}
+    if os.path.exists(filename):
+        with open(filename) as f:
+            cfg = json.load(f)
+    cfg['gains'] = [[float(g) for g in row] for row in gains]
+    config.check(dict(config.DEFAULTS, **cfg))
+    with open(filename + '.tmp', 'w') as f:
+        json.dump(cfg, f, indent=1)
+    os.replace(filename + '.tmp', filename)
+
+
+class Evaluator:
+    ''' @brief      Scores gain matrices on a fixed set of simulated scenarios
+        @details    Picklable, so a copy runs in every worker of the pool.
+    '''
+
+    def __init__(self, scenarios=32, offset=30.0, seconds=1.5, period=500, delay=0, noise=0.0,
+                 saturation=80, seed=0, weights=(1.0, 1.0, 1.0, 100.0)):
+        ''' @brief              Draws the initial states of the scenarios
+            @param scenarios    Number of scenarios per candidate
+            @param offset       Largest initial ball offset in mm
+            @param seconds      Simulated time per scenario
+            @param period       Control period in microseconds
+            @param delay        Measurement latency in control periods
+            @param noise        Standard deviation of the ball position noise in mm
+            @param saturation   Duty cycle limit in percent
+            @param seed         Seed of the initial states and noise
+            @param weights      Weights of settling time, overshoot, saturation time and divergence
+        '''
+        rng = np.random.default_rng(seed)
+        ## @brief     Initial states of the scenarios in SI units
+        self.q0 = np.zeros((scenarios, 2, 4))
+        self.q0[..., 0] = rng.uniform(-offset, offset, (scenarios, 2))/1000
+        ## @brief     Simulated time per scenario
+        self.seconds = seconds
+        ## @brief     Control period in seconds
+        self.period = period*1e-6
+        ## @brief     Measurement latency in control periods
+        self.delay = delay
+        ## @brief     Standard deviation of the measurement noise in firmware units
+        self.noise = np.array([noise, 0.0, 0.0, 0.0]) if noise else None
+        ## @brief     Duty cycle limit in percent
+        self.saturation = saturation
+        ## @brief     Seed of the measurement noise
+        self.seed = seed
+        ## @brief     Weights passed to sim.plant.Episode.score()
+        self.weights = weights
+
+    def episode(self, coords):
+        ''' @brief          Simulates one candidate on every scenario
+            @param coords   Search coordinates of the candidate
+            @return         The sim.plant.Episode
+        '''
+        controller = plant.make_controller(coords_to_gains(coords), self.saturation)
+        model = plant.BallPlate(len(self.q0))
+        model.reset(self.q0)
+        return plant.simulate(plant.BatchController(controller), model, self.seconds, self.period,
+                              delay=self.delay, noise=self.noise, rng=np.random.default_rng(self.seed))
+
+    def __call__(self, coords):
+        ''' @brief          Scores one candidate
+            @param coords   Search coordinates of the candidate
+            @return         The mean cost over the scenarios; lower is better
+        '''
+        return float(self.episode(coords).score(*self.weights).mean())
+
+
+class Search:
+    ''' @brief      Proposes candidates and keeps the results of a search.
+        @details    The whole state is a JSON-compatible dictionary, so it can be
+                    checkpointed and resumed. Candidates of batch k are drawn from
+                    a generator seeded with (seed, k), which makes a resumed
+                    search identical to an uninterrupted one.
+    '''
+
+    def __init__(self, settings, state=None):
+        ''' @brief          Starts a search or resumes one
+            @param settings Dictionary of the values named in SETTINGS
+            @param state    The state saved by a previous run, or None
+        '''
+        ## @brief     The search settings
+        self.settings = settings
+        if state is None:
+            start = gains_to_coords(settings['start'])
+            state = {'batch': 0, 'evaluations': 0, 'best_cost': None, 'best': None,
+                     'mean': start.tolist(), 'sigma': 0.3*settings['span'],
+                     'cov': np.eye(8).tolist(), 'path_sigma': [0.0]*8, 'path_cov': [0.0]*8}
+        ## @brief     The search state, updated after every batch
+        self.state = state
+        ## @brief     Centre of the grid and random search box
+        self._start = gains_to_coords(settings['start'])
+
+    def done(self, evaluations):
+        ''' @brief      Tells whether the search has used its budget
+        '''
+        if self.settings['method'] == 'grid':
+            return self.state['evaluations'] >= min(evaluations, self.settings['levels']**8)
+        return self.state['evaluations'] >= evaluations
+
+    def propose(self, evaluations):
+        ''' @brief              Draws the next batch of candidates
+            @param evaluations  Total budget of the search
+            @return             An array with one row of coordinates per candidate
+        '''
+        s = self.settings
+        done = self.state['evaluations']
+        count = min(s['population'], evaluations - done)
+        if s['method'] == 'grid':
+            values = np.linspace(-s['span'], s['span'], s['levels']) if s['levels'] > 1 else np.zeros(1)
+            points = itertools.islice(itertools.product(range(s['levels']), repeat=8), done, done + count)
+            return np.array([self._start + values[list(p)] for p in points]).reshape(-1, 8)
+        rng = np.random.default_rng([s['seed'], self.state['batch']])
+        if s['method'] == 'random':
+            return self._start + rng.uniform(-s['span'], s['span'], (count, 8))
+        mean = np.array(self.state['mean'])
+        root = np.linalg.cholesky(np.array(self.state['cov']))
+        z = rng.standard_normal((s['population'], 8))
+        return (mean + self.state['sigma']*z @ root.T)[:count]
+
+    def update(self, candidates, costs):
+        ''' @brief              Records the costs of a batch
+            @param candidates   The candidates returned by propose()
+            @param costs        Their costs, in the same order
+        '''
+        state = self.state
+        best = int(np.argmin(costs))
+        if state['best_cost'] is None or costs[best] < state['best_cost']:
+            state['best_cost'] = float(costs[best])
+            state['best'] = candidates[best].tolist()
+        state['evaluations'] += len(candidates)
+        state['batch'] += 1
+        if self.settings['method'] == 'cma' and len(candidates) == self.settings['population']:
+            self._adapt(candidates, np.asarray(costs))
+
+    def _adapt(self, candidates, costs):
+        ''' @brief  Updates the mean, step size and covariance from the ranked batch
+        '''
+        state = self.state
+        n = 8
+        lam = len(candidates)
+        mu = lam//2
+        weights = np.log(mu + 0.5) - np.log(np.arange(1, mu + 1))
+        weights /= weights.sum()
+        mu_eff = 1/np.sum(weights**2)
+        c_sigma = (mu_eff + 2)/(n + mu_eff + 5)
+        d_sigma = 1 + 2*max(0.0, np.sqrt((mu_eff - 1)/(n + 1)) - 1) + c_sigma
+        c_c = (4 + mu_eff/n)/(n + 4 + 2*mu_eff/n)
+        c_1 = 2/((n + 1.3)**2 + mu_eff)
+        c_mu = min(1 - c_1, 2*(mu_eff - 2 + 1/mu_eff)/((n + 2)**2 + mu_eff))
+        chi_n = np.sqrt(n)*(1 - 1/(4*n) + 1/(21*n*n))
+
+        order = np.argsort(costs)[:mu]
+        sigma = state['sigma']
+        mean = np.array(state['mean'])
+        cov = np.array(state['cov'])
+        steps = (candidates[order] - mean)/sigma
+        step = weights @ steps
+        new_mean = mean + sigma*step
+
+        root = np.linalg.cholesky(cov)
+        p_sigma = (1 - c_sigma)*np.array(state['path_sigma']) + \
+            np.sqrt(c_sigma*(2 - c_sigma)*mu_eff)*np.linalg.solve(root, step)
+        norm = np.linalg.norm(p_sigma)
+        h_sigma = norm/np.sqrt(1 - (1 - c_sigma)**(2*(state['batch']))) < (1.4 + 2/(n + 1))*chi_n
+        p_c = (1 - c_c)*np.array(state['path_cov']) + h_sigma*np.sqrt(c_c*(2 - c_c)*mu_eff)*step
+        cov = (1 - c_1 - c_mu)*cov + c_1*(np.outer(p_c, p_c) + (not h_sigma)*c_c*(2 - c_c)*cov) + \
+            c_mu*(steps.T*weights) @ steps
+        cov = (cov + cov.T)/2
+        state['mean'] = new_mean.tolist()
+        state['cov'] = cov.tolist()
+        state['path_sigma'] = p_sigma.tolist()
+        state['path_cov'] = p_c.tolist()
+        state['sigma'] = float(sigma*np.exp(c_sigma/d_sigma*(norm/chi_n - 1)))
+
+
+def load_checkpoint(filename, settings):
+    ''' @brief          Reads a checkpoint written by save_checkpoint()
+        @return         The saved search state, or None if the file does not exist
+    '''
+    if not filename or not os.path.exists(filename):
+        return None
+    with open(filename) as f:
+        saved = json.load(f)
+    if saved['settings'] != settings:
+        raise ValueError('Checkpoint {:} was written with different settings'.format(filename))
+    return saved['state']
+
+
+def save_checkpoint(filename, search):
+    ''' @brief          Writes the settings and state of a search, replacing the file atomically
+    '''
+    with open(filename + '.tmp', 'w') as f:
+        json.dump({'settings': search.settings, 'state': search.state}, f, indent=1)
+    os.replace(filename + '.tmp', filename)
+
+
+def main(argv=None):
+    ''' @brief Parses the command line and runs or resumes a search
+    '''
+    parser = argparse.ArgumentParser(prog='python -m tools.autotune',
+                                     description='Tune the ClosedLoopPair gains on the simulated plant.')
+    parser.add_argument('--method', choices=('grid', 'random', 'cma'), default='cma')
+    parser.add_argument('--evaluations', type=int, default=2000, help='largest number of candidates scored')
+    parser.add_argument('--start', help='JSON 2x4 gains at the centre of the search, by default those in --output')
+    parser.add_argument('--span', type=float, default=2.0, help='half width of the search box in scaled units')
+    parser.add_argument('--levels', type=int, default=3, help='grid values per gain')
+    parser.add_argument('--population', type=int, default=16, help='candidates per batch')
+    parser.add_argument('--scenarios', type=int, default=32, help='initial offsets per candidate')
+    parser.add_argument('--offset', type=float, default=30.0, help='largest initial ball offset in mm')
+    parser.add_argument('--seconds', type=float, default=1.5, help='simulated time per scenario')
+    parser.add_argument('--period', type=float, default=500, help='control period in microseconds')
+    parser.add_argument('--delay', type=int, default=0, help='measurement latency in control periods')
+    parser.add_argument('--noise', type=float, default=0.0, help='ball position noise in mm')
+    parser.add_argument('--saturation', type=float, default=config.DEFAULTS['saturation'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--weights', type=float, nargs=4, default=[1.0, 1.0, 1.0, 100.0],
+                        metavar=('SETTLE', 'OVERSHOOT', 'SATURATION', 'DIVERGED'))
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes in the pool')
+    parser.add_argument('--checkpoint', default='autotune.json', help='progress file, resumed if it exists')
+    parser.add_argument('--output', default=config.CONFIG_FILE, help='configuration file the best gains are written to')
+    parser.add_argument('--write', action='store_true', help='write the best gains to --output')
+    args = parser.parse_args(argv)
+    warning = plant.check_warning()
+    if warning:
+        print(warning)
+        if args.write:
+            raise SystemExit('Not written: the plant model has not been validated against the rig')
+
+    start = json.loads(args.start) if args.start else read_gains(args.output)
+    values = dict(vars(args), start=start, weights=list(args.weights))
+    settings = {name: values[name] for name in SETTINGS}
+
+    search = Search(settings, load_checkpoint(args.checkpoint, settings))
+    if search.state['evaluations']:
+        print('Resuming after {:} evaluations, best cost {:.4f}'.format(
+              search.state['evaluations'], search.state['best_cost']))
+    evaluator = Evaluator(args.scenarios, args.offset, args.seconds, args.period, args.delay, args.noise,
+                          args.saturation, args.seed, tuple(args.weights))
+    with multiprocessing.Pool(args.workers) as pool:
+        while not search.done(args.evaluations):
+            candidates = search.propose(args.evaluations)
+            costs = pool.map(evaluator, list(candidates))
+            search.update(candidates, costs)
+            if args.checkpoint:
+                save_checkpoint(args.checkpoint, search)
+            print('{:>6} evaluations  batch best {:.4f}  best {:.4f}'.format(
+                  search.state['evaluations'], min(costs), search.state['best_cost']))
+
+    gains = coords_to_gains(search.state['best'])
+    print('Best cost {:.4f} with gains'.format(search.state['best_cost']))
+    for row in gains:
+        print('  [' + ', '.join('{:.6g}'.format(g) for g in row) + ']')
+    if not args.write:
+        return
+    episode = evaluator.episode(search.state['best'])
+    if episode.diverged.any() or search.state['best_cost'] >= args.weights[3]:
+        raise SystemExit('Not written: the best gains diverge in {:} of {:} scenarios'.format(
+                         episode.diverged.sum(), len(episode.diverged)))
+    if not np.isfinite(episode.settling_time).all():
+        raise SystemExit('Not written: the best gains do not settle {:} of {:} scenarios'.format(
+                         (~np.isfinite(episode.settling_time)).sum(), len(episode.settling_time)))
+    write_gains(args.output, gains)
+    print('Gains written to ' + args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+'''@file        decode_telemetry.py
+   @brief       Decodes the binary telemetry streamed by the 't' key.
+   @details     Usage: python -m tools.decode_telemetry (--port DEV | FILE) [--csv OUT] [--start]
+
+                Reads telemetry packets from a serial port or from a capture
+                file, writes the state frames to a CSV file and prints the
+                task timing table whenever one arrives. Text printed by the
+                board on the same port is skipped. Reading a serial port
+                needs the pyserial package.
+   @author      Faith Chau
+   @author      Luisa Chiu
+   @date        October 18, 2026
+'''
+
+import argparse
+import csv
+import sys
+
+import logger
+import telemetry
+
+## @brief     Column names of the CSV file
+CSV_HEADER = ['time_s', 'x_mm', 'theta_y_deg', 'x_vel_mm_s', 'theta_y_vel_rad_s',
+              'y_mm', 'theta_x_deg', 'y_vel_mm_s', 'theta_x_vel_rad_s', 'L_1', 'L_2']
+
+
+class StateWriter:
+    ''' @brief      Converts logger frames to rows with time in seconds
+        @details    The board timestamps wrap at 2**30 microseconds, so the time
+                    is accumulated from the differences between frames.
+    '''
+
+    def __init__(self, writer):
+        ## @brief     A csv.writer, or None to only count frames
+        self.writer = writer
+        ## @brief     Number of frames written
+        self.frames = 0
+        ## @brief     Timestamp of the last frame
+        self._tick = None
+        ## @brief     Time of the last frame in seconds
+        self._time = 0.0
+
+    def add(self, payload):
+        ''' @brief          Writes every frame of a TYPE_STATE payload
+            @param payload  The packet payload
+        '''
+        for frame in logger.read_frames(payload):
+            if self._tick is not None:
+                self._time += ((frame[0] - self._tick) & 0x3FFFFFFF)/1e6
+            self._tick = frame[0]
+            if self.writer is not None:
+                self.writer.writerow(['{:.6f}'.format(self._time)] + ['{:.6g}'.format(v) for v in frame[1:]])
+            self.frames += 1
+
+
+def print_timing(names, payload, out=sys.stdout):
+    ''' @brief          Prints a TYPE_TIMING payload like TaskStats.print_table()
+        @param names    The slot names from the last TYPE_NAMES packet
+        @param payload  The packet payload
+        @param out      The stream printed to
+    '''
+    print('{:<14}{:>9}{:>8}{:>8}{:>8}{:>9}{:>9}{:>8}'.format(
+          'Task', 'Runs', 'Min', 'Mean', 'Max', 'Jit avg', 'Jit max', 'Missed'), file=out)
+    for slot, (count, t_min, t_max, t_sum, jit_max, jit_sum, misses) in enumerate(telemetry.unpack_timing(payload)):
+        name = names[slot] if slot < len(names) else 'slot {:}'.format(slot)
+        if count == 0:
+            print('{:<14}{:>9}'.format(name, 0), file=out)
+            continue
+        print('{:<14}{:>9}{:>8}{:>8}{:>8}{:>9}{:>9}{:>8}'.format(
+              name, count, t_min, t_sum//count, t_max, jit_sum//count, jit_max, misses), file=out)
+
+
+def decode(chunks, csv_file=None, out=sys.stdout):
+    ''' @brief          Decodes a stream of byte chunks
+        @param chunks   An iterable of bytes objects
+        @param csv_file An open text file the state frames are written to, or None
+        @param out      The stream timing tables and the summary are printed to
+        @return         The telemetry.Decoder, holding the packet and error counts
+    '''
+    decoder = telemetry.Decoder()
+    states = StateWriter(None if csv_file is None else csv.writer(csv_file))
+    if csv_file is not None:
+        states.writer.writerow(CSV_HEADER)
+    names = []
+    for chunk in chunks:
+        for kind, seq, payload in decoder.feed(chunk):
+            if kind == telemetry.TYPE_STATE:
+                states.add(payload)
+            elif kind == telemetry.TYPE_NAMES:
+                names = payload.decode().split('\n')
+            elif kind == telemetry.TYPE_TIMING:
+                print_timing(names, payload, out)
+    print('{:} packets, {:} state frames, {:} lost, {:} CRC errors, {:} bytes skipped'.format(
+          decoder.packets, states.frames, decoder.lost, decoder.crc_errors, decoder.skipped), file=out)
+    return decoder
+
+
+def read_file(path, size=65536):
+    ''' @brief          Reads a capture file in chunks
+        @param path     The file name
+        @param size     Largest number of bytes in one chunk
+        @return         A generator of bytes objects
+    '''
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(size)
+            if not data:
+                return
+            yield data
+
+
+def read_port(port, start):
+    ''' @brief          Reads a serial port in chunks until interrupted with Ctrl-C
+        @param port     The serial port device, such as /dev/ttyACM0 or COM3
+        @param start    Whether to send 't' to start streaming, and 's' to stop it on exit
+        @return         A generator of bytes objects
+    '''
+    try:
+        import serial
+    except ImportError:
+        raise SystemExit('Reading a serial port needs pyserial: pip install pyserial')
+    with serial.Serial(port, timeout=0.1) as ser:
+        if start:
+            ser.write(b't')
+        try:
+            while True:
+                data = ser.read(4096)
+                if data:
+                    yield data
+        except KeyboardInterrupt:
+            if start:
+                ser.write(b's')
+
+
+def main(argv=None):
+    ''' @brief Parses the command line and decodes the telemetry
+    '''
+    parser = argparse.ArgumentParser(prog='python -m tools.decode_telemetry',
+                                     description='Decode Lab 0x0FF binary telemetry.')
+    parser.add_argument('file', nargs='?', help='capture file to decode')
+    parser.add_argument('--port', help='serial port to read until Ctrl-C')
+    parser.add_argument('--start', action='store_true', help="send 't' to start streaming and 's' to stop")
+    parser.add_argument('--csv', help='CSV file the state frames are written to')
+    args = parser.parse_args(argv)
+    if (args.file is None) == (args.port is None):
+        parser.error('give either a capture file or --port')
+
+    chunks = read_file(args.file) if args.file else read_port(args.port, args.start)
+    if args.csv:
+        with open(args.csv, 'w', newline='') as csv_file:
+            decode(chunks, csv_file)
+    else:
+        decode(chunks)
+
+
+if __name__ == '__main__':
+    main()
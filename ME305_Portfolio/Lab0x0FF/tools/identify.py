@@ -0,0 +1,101 @@
+'''@file        identify.py
+   @brief       Fits the plant model's signs, lever arm and plate inertia to a rig run.
+   @details     Usage:
+                python -m tools.identify [--run run.csv] [--gains JSON] [--n N] [--seed S]
+                                         [--tolerance MM]
+
+                Simulates the recorded run, sim.plant.RIG_RUN by default or a
+                CSV from tools.decode_telemetry, with the gains it was recorded
+                with for random draws of
+                - the motor sign and the Euler angle sign of each axis
+                - the motor lever arm r_m and the plate inertia I_P, drawn
+                  log-uniformly over a factor of about 5 around the nominal
+                  values either way
+                - the unknown initial state, as in sim.plant.check()
+                and prints the draws closest to the run for every sign
+                combination. The best draw is a fit only if it is within the
+                tolerance on both axes; its values can then replace the
+                guesses in sim.plant, after which sim.plant.check() passes.
+                The rate gains are too small for a run to tell the gyro signs
+                apart, so they are left as they are.
+   @author      Faith Chau
+   @author      Luisa Chiu
+   @date        October 18, 2026
+'''
+
+import argparse
+import itertools
+import json
+
+import numpy as np
+
+from sim import plant
+
+## @brief     Range of the motor lever arm r_m drawn, in m
+R_M_RANGE = (0.015, 0.3)
+## @brief     Range of the plate inertia I_P drawn, in kg*m^2
+I_P_RANGE = (4e-4, 1e-2)
+
+
+def identify(run=plant.RIG_RUN, gains=None, n=8000, chunk=2000, seed=0):
+    ''' @brief          Draws plant models and measures how close each one comes to a run
+        @param run      The CSV file of the run, see sim.plant.load_run()
+        @param gains    The 2x4 gain matrix the run was recorded with, or None for the gains in
+                        config.DEFAULTS
+        @param n        Number of draws for each of the 16 sign combinations
+        @param chunk    Draws simulated together
+        @param seed     Random seed
+        @return         A list of (motor_signs, angle_signs, r_m, I_P, errors) tuples, one per draw,
+                        where errors holds the RMS error of each axis in mm
+    '''
+    t, positions = plant.load_run(run)
+    rng = np.random.default_rng(seed)
+    combos = list(itertools.product((1.0, -1.0), repeat=4))
+    draws = []
+    for start in range(0, n*len(combos), chunk):
+        size = min(chunk, n*len(combos) - start)
+        picks = np.arange(start, start + size) % len(combos)
+        signs = np.array([combos[k] for k in picks])
+        motor_signs = signs[:, :2]
+        sensor_signs = np.repeat(plant.SENSOR_SIGNS[None], size, axis=0)
+        sensor_signs[:, :, 1] = signs[:, 2:]
+        r_m = np.exp(rng.uniform(*np.log(R_M_RANGE), size))
+        I_P = np.exp(rng.uniform(*np.log(I_P_RANGE), size))
+        model = plant.BallPlate(size, sensor_signs=sensor_signs, motor_signs=motor_signs, r_m=r_m, I_P=I_P)
+        model.reset(plant.random_states(size, positions, rng))
+        errors = plant.run_errors(model, t, positions, gains)
+        draws += [(tuple(motor_signs[i]), tuple(signs[i, 2:]), r_m[i], I_P[i], errors[i]) for i in range(size)]
+    return draws
+
+
+def main(argv=None):
+    ''' @brief Parses the command line and prints the closest draws
+    '''
+    parser = argparse.ArgumentParser(prog='python -m tools.identify',
+                                     description='Fit the plant model to a recorded run of the rig.')
+    parser.add_argument('--run', default=plant.RIG_RUN, help='CSV file of the run')
+    parser.add_argument('--gains', help='JSON 2x4 gain matrix the run was recorded with, by default config.DEFAULTS')
+    parser.add_argument('--n', type=int, default=2000, help='draws per sign combination')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tolerance', type=float, default=10.0, help='largest RMS error of a fit in mm')
+    args = parser.parse_args(argv)
+
+    draws = identify(args.run, json.loads(args.gains) if args.gains else None, args.n, seed=args.seed)
+    print('motor signs  angle signs     r_m (m)   I_P (kg*m^2)   RMS x (mm)  RMS y (mm)')
+    best = {}
+    for draw in draws:
+        key = draw[:2]
+        if key not in best or draw[4].max() < best[key][4].max():
+            best[key] = draw
+    for motor_signs, angle_signs, r_m, I_P, errors in sorted(best.values(), key=lambda d: d[4].max()):
+        print('{:>5.0f}{:>5.0f}  {:>6.0f}{:>5.0f}  {:>10.3f}  {:>13.2e}  {:>11.1f} {:>11.1f}'.format(
+              *motor_signs, *angle_signs, r_m, I_P, *errors))
+    fit = min(draws, key=lambda d: d[4].max())
+    if fit[4].max() > args.tolerance:
+        raise SystemExit('No fit: no draw reproduces the run within {:} mm on both axes'.format(args.tolerance))
+    print('Fit: MOTOR_SIGNS {:}, angle signs {:}, r_m {:.3f} m, I_P {:.2e} kg*m^2'.format(
+          list(fit[0]), list(fit[1]), fit[2], fit[3]))
+
+
+if __name__ == '__main__':
+    main()
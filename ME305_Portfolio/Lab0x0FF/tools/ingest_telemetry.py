@@ -0,0 +1,269 @@
+'''@file        ingest_telemetry.py
+   @brief       Stores telemetry in memory-mapped NumPy arrays, one file per channel.
+   @details     Usage:
+                python -m tools.ingest_telemetry STORE (--port DEV | FILE) [--name NAME] [--start]
+                python -m tools.ingest_telemetry STORE --list
+
+                A store is a directory holding one raw little-endian file per
+                channel, named after CHANNELS, and an index.json file listing
+                the sessions with their first row and row count. Frames are
+                decoded in batches of at most --batch frames and appended to
+                the channel files, so memory use does not grow with the length
+                of a run. Each TYPE_NAMES packet, sent when streaming starts on
+                the board, begins a new session.
+
+                Sessions are read back with load_session(), which returns
+                numpy.memmap views, so only the pages used are read from disk.
+   @author      Faith Chau
+   @author      Luisa Chiu
+   @date        October 18, 2026
+'''
+
+import argparse
+import datetime
+import json
+import os
+
+import numpy as np
+
+import logger
+import telemetry
+from tools.decode_telemetry import read_file, read_port
+
+## @brief     Data type of one logger frame as sent by the board
+FRAME_DTYPE = np.dtype([('tick', '<u4'),
+                        ('x', '<f4'), ('theta_y', '<f4'), ('x_vel', '<f4'), ('theta_y_vel', '<f4'),
+                        ('y', '<f4'), ('theta_x', '<f4'), ('y_vel', '<f4'), ('theta_x_vel', '<f4'),
+                        ('L_1', '<f4'), ('L_2', '<f4')])
+assert FRAME_DTYPE.itemsize == logger.FRAME_SIZE
+
+## @brief     Channels stored, with their file data types
+#  @details   time is in seconds from the start of the session; the others are the
+#             frame fields in the units used by the firmware
+CHANNELS = dict([('time', '<f8')] + [(name, FRAME_DTYPE[name].str) for name in FRAME_DTYPE.names])
+
+## @brief     Name of the session index file in a store
+INDEX_FILE = 'index.json'
+
+
+class Store:
+    ''' @brief      A directory of per-channel arrays and a session index
+    '''
+
+    def __init__(self, path):
+        ''' @brief      Opens a store, creating it if needed
+            @param path The store directory
+        '''
+        ## @brief     The store directory
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        index = os.path.join(path, INDEX_FILE)
+        if os.path.exists(index):
+            with open(index) as f:
+                ## @brief     The session index
+                #  @details   A dictionary with channels, rows and sessions
+                self.index = json.load(f)
+            if self.index['channels'] != CHANNELS:
+                raise ValueError('Store {:} uses different channels'.format(path))
+        else:
+            self.index = {'channels': CHANNELS, 'rows': 0, 'sessions': []}
+
+    def channel_file(self, name):
+        ''' @brief      Returns the path of a channel file
+        '''
+        return os.path.join(self.path, name + '.bin')
+
+    def save_index(self):
+        ''' @brief      Writes the session index, replacing it atomically
+        '''
+        index = os.path.join(self.path, INDEX_FILE)
+        with open(index + '.tmp', 'w') as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(index + '.tmp', index)
+
+    def truncate(self):
+        ''' @brief      Cuts the channel files back to the rows listed in the index
+            @details    Removes rows written by an ingest that stopped before it could
+                        update the index, so new rows line up in every channel.
+        '''
+        for channel, dtype in CHANNELS.items():
+            path = self.channel_file(channel)
+            size = self.index['rows']*np.dtype(dtype).itemsize
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+
+    def sessions(self):
+        ''' @brief      Returns the list of session entries
+        '''
+        return self.index['sessions']
+
+    def load_session(self, name):
+        ''' @brief      Maps the arrays of a session
+            @param name The session name
+            @return     A dictionary of numpy.memmap arrays by channel name
+        '''
+        for session in self.index['sessions']:
+            if session['name'] == name:
+                break
+        else:
+            raise KeyError(name)
+        arrays = {}
+        for channel, dtype in CHANNELS.items():
+            if session['rows'] == 0:
+                arrays[channel] = np.zeros(0, dtype)
+                continue
+            arrays[channel] = np.memmap(self.channel_file(channel), dtype=dtype, mode='r',
+                                        offset=session['start']*np.dtype(dtype).itemsize, shape=(session['rows'],))
+        return arrays
+
+
+class Ingester:
+    ''' @brief      Appends decoded telemetry to a Store in bounded batches
+    '''
+
+    def __init__(self, store, name, source='', batch=65536):
+        ''' @brief          Starts the first session of an ingest
+            @param store    The Store appended to
+            @param name     Base name of the sessions; later sessions get a numeric suffix
+            @param source   Description of where the data came from
+            @param batch    Largest number of frames held in memory before they are written
+        '''
+        ## @brief     The Store appended to
+        self.store = store
+        ## @brief     Base name of the sessions
+        self.name = name
+        ## @brief     Description of where the data came from
+        self.source = source
+        ## @brief     The telemetry decoder
+        self.decoder = telemetry.Decoder()
+        ## @brief     Preallocated buffer of frames waiting to be written
+        self._frames = np.empty(batch, FRAME_DTYPE)
+        ## @brief     Number of frames in the buffer
+        self._count = 0
+        store.truncate()
+        ## @brief     The open channel files
+        self._files = {channel: open(store.channel_file(channel), 'ab') for channel in CHANNELS}
+        ## @brief     The session entry being appended to
+        self.session = None
+        ## @brief     Tick of the last frame of the session, or None
+        self._tick = None
+        ## @brief     Time of the last frame of the session in seconds
+        self._time = 0.0
+        ## @brief     Slot names from the last TYPE_NAMES packet
+        self._names = []
+        self.new_session()
+
+    def new_session(self):
+        ''' @brief      Closes the current session, unless empty, and starts another
+        '''
+        if self.session is not None:
+            if self.session['rows'] == 0 and self._count == 0:
+                return
+            self.flush()
+        sessions = self.store.index['sessions']
+        taken = set(s['name'] for s in sessions)
+        name = self.name
+        number = 1
+        while name in taken:
+            number += 1
+            name = '{:}-{:}'.format(self.name, number)
+        self.session = {'name': name, 'start': self.store.index['rows'], 'rows': 0,
+                        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                        'source': self.source, 'timing': None}
+        sessions.append(self.session)
+        self._tick = None
+        self._time = 0.0
+
+    def feed(self, data):
+        ''' @brief      Decodes received bytes and buffers their frames
+            @param data A bytes-like object
+        '''
+        for kind, seq, payload in self.decoder.feed(data):
+            if kind == telemetry.TYPE_STATE:
+                frames = np.frombuffer(payload, FRAME_DTYPE, len(payload)//FRAME_DTYPE.itemsize)
+                while len(frames):
+                    n = min(len(frames), len(self._frames) - self._count)
+                    self._frames[self._count:self._count + n] = frames[:n]
+                    self._count += n
+                    frames = frames[n:]
+                    if self._count == len(self._frames):
+                        self.flush()
+            elif kind == telemetry.TYPE_NAMES:
+                self.new_session()
+                self._names = payload.decode().split('\n')
+            elif kind == telemetry.TYPE_TIMING:
+                self.session['timing'] = {name: list(counts) for name, counts in
+                                          zip(self._names, telemetry.unpack_timing(payload))}
+
+    def flush(self):
+        ''' @brief      Appends the buffered frames to the channel files and updates the index
+        '''
+        frames = self._frames[:self._count]
+        if len(frames):
+            ticks = frames['tick'].astype(np.int64)
+            steps = np.empty(len(frames))
+            steps[0] = 0.0 if self._tick is None else ((ticks[0] - self._tick) & 0x3FFFFFFF)/1e6
+            steps[1:] = (np.diff(ticks) & 0x3FFFFFFF)/1e6
+            time = self._time + np.cumsum(steps)
+            self._tick = int(ticks[-1])
+            self._time = float(time[-1])
+            for channel, dtype in CHANNELS.items():
+                data = time if channel == 'time' else frames[channel]
+                self._files[channel].write(np.ascontiguousarray(data, dtype).tobytes())
+                self._files[channel].flush()
+            self.session['rows'] += len(frames)
+            self.store.index['rows'] += len(frames)
+            self._count = 0
+        self.session['lost'] = self.decoder.lost
+        self.session['crc_errors'] = self.decoder.crc_errors
+        self.store.save_index()
+
+    def close(self):
+        ''' @brief      Writes the remaining frames and closes the channel files
+        '''
+        self.flush()
+        if self.session['rows'] == 0 and self.session['timing'] is None:
+            self.store.index['sessions'].remove(self.session)
+            self.store.save_index()
+        for f in self._files.values():
+            f.close()
+
+
+def main(argv=None):
+    ''' @brief Parses the command line and ingests or lists sessions
+    '''
+    parser = argparse.ArgumentParser(prog='python -m tools.ingest_telemetry',
+                                     description='Store Lab 0x0FF telemetry in memory-mapped arrays.')
+    parser.add_argument('store', help='store directory')
+    parser.add_argument('file', nargs='?', help='capture file to ingest')
+    parser.add_argument('--port', help='serial port to read until Ctrl-C')
+    parser.add_argument('--start', action='store_true', help="send 't' to start streaming and 's' to stop")
+    parser.add_argument('--name', help='session name, by default the current date and time')
+    parser.add_argument('--batch', type=int, default=65536, help='frames held in memory before writing')
+    parser.add_argument('--list', action='store_true', help='list the sessions in the store')
+    args = parser.parse_args(argv)
+
+    store = Store(args.store)
+    if args.list:
+        for session in store.sessions():
+            print('{:<24}{:>10} rows  {:}  {:}'.format(session['name'], session['rows'],
+                                                      session['created'], session['source']))
+        return
+    if (args.file is None) == (args.port is None):
+        parser.error('give either a capture file or --port')
+
+    name = args.name or datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    chunks = read_file(args.file) if args.file else read_port(args.port, args.start)
+    ingester = Ingester(store, name, args.file or args.port, args.batch)
+    try:
+        for chunk in chunks:
+            ingester.feed(chunk)
+    finally:
+        ingester.close()
+    decoder = ingester.decoder
+    print('{:} packets, {:} lost, {:} CRC errors; store holds {:} rows in {:} sessions'.format(
+          decoder.packets, decoder.lost, decoder.crc_errors, store.index['rows'], len(store.sessions())))
+
+
+if __name__ == '__main__':
+    main()
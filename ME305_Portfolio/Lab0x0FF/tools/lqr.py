@@ -0,0 +1,197 @@
+'''@file        lqr.py
+   @brief       Computes LQR gains for ClosedLoop from the plant model.
+   @details     Usage:
+                python -m tools.lqr [--period US] [--max-state X TH XD THD] [--max-duty D]
+                                    [--param NAME=VALUE ...] [--output config.json]
+
+                Linearizes one axis of the ball-on-plate model in ::sim.plant
+                about the level plate, discretizes it with a zero order hold
+                over the control period, solves the discrete-time algebraic
+                Riccati equation and converts the optimal state feedback to
+                the gains ClosedLoop expects. Each axis is solved with its
+                own sensor and motor signs, and its row is ordered like its
+                state vector, [x, th_y, xd, th_yd] or [y, th_x, yd, th_xd],
+                in the units ClosedLoop multiplies by DUTY_PER_TORQUE.
+
+                The printed gains are then loaded into a real
+                closedloop.ClosedLoopPair and the eigenvalues of the
+                continuous closed loop they form with the linearized model
+                are reported, so a mistake in the unit or sign conversion
+                shows up as an unstable pole. They describe the hardware only
+                once the model passes sim.plant.check(); until then they are
+                printed with its warning. The gains are only printed unless
+                --output names a configuration file to write them to, which
+                is refused while the model fails the check.
+
+                The weights follow Bryson's rule: each state is weighted by
+                one over the square of its largest acceptable deviation, and
+                the duty cycle by one over the square of --max-duty. Only
+                NumPy is needed, and a solve takes a few milliseconds, so the
+                gains can be recomputed for every control rate tried.
+   @author      Faith Chau
+   @author      Luisa Chiu
+   @date        October 18, 2026
+'''
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from closedloop import DUTY_PER_TORQUE
+from sim import plant
+from tools.autotune import write_gains
+
+
+def linearize(model, axis=0, eps=1e-6):
+    ''' @brief          Linearizes one axis of a plant about the level plate at rest
+        @param model    A sim.plant.BallPlate; its first scenario is used
+        @param axis     0 for the x axis, driven by motor 1, or 1 for the y axis
+        @param eps      Step of the central differences
+        @return         A tuple (A, B) with dq/dt = A q + B duty, q in SI units and duty in percent
+                        as applied by the firmware
+    '''
+    q = np.zeros((1, 2, 4))
+    duty = np.zeros((1, 2))
+    A = np.empty((4, 4))
+    for j in range(4):
+        dq = np.zeros_like(q)
+        dq[0, axis, j] = eps
+        A[:, j] = (model.derivatives(q + dq, duty) - model.derivatives(q - dq, duty))[0, axis]/(2*eps)
+    du = np.zeros_like(duty)
+    du[0, axis] = eps
+    B = ((model.derivatives(q, duty + du) - model.derivatives(q, duty - du))[0, axis]/(2*eps)).reshape(4, 1)
+    return A, B
+
+
+def discretize(A, B, dt):
+    ''' @brief      Discretizes a continuous model with a zero order hold
+        @details    Uses the matrix exponential of the augmented matrix [[A, B], [0, 0]],
+                    computed by scaling and squaring a Taylor series.
+        @param dt   The sampling period in seconds
+        @return     A tuple (Ad, Bd)
+    '''
+    n, m = B.shape
+    M = np.zeros((n + m, n + m))
+    M[:n, :n] = A
+    M[:n, n:] = B
+    M *= dt
+    squarings = max(0, int(np.ceil(np.log2(max(np.abs(M).sum(axis=1).max(), 1e-300)))) + 1)
+    M /= 2**squarings
+    E = np.eye(n + m)
+    term = np.eye(n + m)
+    for k in range(1, 20):
+        term = term @ M/k
+        E += term
+    for _ in range(squarings):
+        E = E @ E
+    return E[:n, :n], E[:n, n:]
+
+
+def solve_dare(A, B, Q, R, tol=1e-12, iterations=100):
+    ''' @brief      Solves the discrete-time algebraic Riccati equation
+        @details    Uses the structure preserving doubling algorithm, which converges
+                    quadratically, so a few tens of iterations are enough.
+        @return     The stabilizing solution P
+    '''
+    n = len(A)
+    G = B @ np.linalg.solve(R, B.T)
+    H = Q.copy()
+    for _ in range(iterations):
+        W = np.linalg.inv(np.eye(n) + G @ H)
+        A_next = A @ W @ A
+        G = G + A @ W @ G @ A.T
+        H_next = H + A.T @ H @ W @ A
+        A = A_next
+        converged = np.linalg.norm(H_next - H) <= tol*np.linalg.norm(H_next)
+        H = (H_next + H_next.T)/2
+        if converged:
+            return H
+    raise ArithmeticError('Riccati iteration did not converge')
+
+
+def lqr_gains(period=500, max_state=(5.0, 3.0, 100.0, 1.0), max_duty=40.0, params=None, axis=0):
+    ''' @brief              Computes the ClosedLoop gains for one axis
+        @param period       Control period in microseconds
+        @param max_state    Largest acceptable deviations in mm, deg, mm/s and rad/s
+        @param max_duty     Largest acceptable duty cycle in percent
+        @param params       Overrides of sim.plant.DEFAULT_PARAMS, or None
+        @param axis         0 for the x axis, driven by motor 1, or 1 for the y axis
+        @return             A tuple (gains, poles): the four gains ordered like the state vector
+                            of the axis and the closed loop poles of the discrete model
+    '''
+    model = plant.BallPlate(1, **(params or {}))
+    A, B = linearize(model, axis)
+    Ad, Bd = discretize(A, B, period*1e-6)
+    Q = np.diag((plant.TO_FIRMWARE/np.asarray(max_state, dtype=float))**2)
+    R = np.array([[1/max_duty**2]])
+    P = solve_dare(Ad, Bd, Q, R)
+    K = np.linalg.solve(R + Bd.T @ P @ Bd, Bd.T @ P @ Ad)
+    poles = np.linalg.eigvals(Ad - Bd @ K)
+    # duty = -K q and ClosedLoop applies duty = -gain*DUTY_PER_TORQUE*measured,
+    # where measured = sensor_scale*q carries the units and signs of the axis
+    return K[0]/(DUTY_PER_TORQUE*model.sensor_scale[axis]), poles
+
+
+def closed_loop_eigenvalues(gains, params=None):
+    ''' @brief              Eigenvalues of the continuous closed loop of each axis
+        @details            The gains go through closedloop.ClosedLoopPair, as on the board, and
+                            the loop is closed around the model linearized by linearize(),
+                            ignoring the sampling and the saturation.
+        @param gains        A 2x4 gain matrix
+        @param params       Overrides of sim.plant.DEFAULT_PARAMS, or None
+        @return             A list with the four eigenvalues of each axis in 1/s
+    '''
+    model = plant.BallPlate(1, **(params or {}))
+    controller = plant.BatchController(plant.make_controller(gains))
+    eigenvalues = []
+    for axis, row in enumerate(controller.duty_gain):
+        A, B = linearize(model, axis)
+        K = (row*model.sensor_scale[axis]).reshape(1, 4)
+        eigenvalues.append(np.linalg.eigvals(A + B @ K))
+    return eigenvalues
+
+
+def main(argv=None):
+    ''' @brief Parses the command line and prints or writes the gains
+    '''
+    parser = argparse.ArgumentParser(prog='python -m tools.lqr', description='Compute LQR gains for ClosedLoop.')
+    parser.add_argument('--period', type=float, default=500, help='control period in microseconds')
+    parser.add_argument('--max-state', type=float, nargs=4, default=[5.0, 3.0, 100.0, 1.0],
+                        metavar=('X', 'TH', 'XD', 'THD'), help='acceptable deviations in mm, deg, mm/s, rad/s')
+    parser.add_argument('--max-duty', type=float, default=40.0, help='acceptable duty cycle in percent')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUE',
+                        help='plant parameter override, see sim.plant.DEFAULT_PARAMS')
+    parser.add_argument('--output', help='configuration file the gains are written to')
+    args = parser.parse_args(argv)
+
+    params = {}
+    for item in args.param:
+        name, _, value = item.partition('=')
+        params[name] = float(value)
+    start = time.perf_counter()
+    results = [lqr_gains(args.period, args.max_state, args.max_duty, params, axis) for axis in range(2)]
+    elapsed = time.perf_counter() - start
+    gains = [[float('{:.6g}'.format(g)) for g in row] for row, poles in results]
+    names = ('[x, th_y, xd, th_yd]', '[y, th_x, yd, th_xd]')
+    print('Gains for a {:g} us period, solved in {:.1f} ms:'.format(args.period, elapsed*1000))
+    for name, row, (_, poles) in zip(names, gains, results):
+        print('  {:}  {:}  largest discrete pole magnitude {:.6f}'.format(name, json.dumps(row), np.abs(poles).max()))
+    warning = plant.check_warning()
+    print('Closed loop eigenvalues with the ClosedLoopPair gains, in 1/s{:}:'.format(
+          ' (experimental model)' if warning else ''))
+    for name, eigenvalues in zip(names, closed_loop_eigenvalues(gains, params)):
+        eigenvalues = eigenvalues[np.argsort(eigenvalues.real)]
+        print('  {:}  {:}  {:}'.format(name, '  '.join('{:.4g}'.format(e) for e in eigenvalues),
+                                       'stable' if (eigenvalues.real < 0).all() else 'UNSTABLE'))
+    if warning:
+        print(warning)
+    if args.output:
+        if warning:
+            raise SystemExit('Not written: the plant model has not been validated against the rig')
+        write_gains(args.output, gains)
+        print('Gains written to ' + args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+'''@file        replay.py
+   @brief       Replays a raw sensor recording through the firmware on the host.
+   @details     Usage:
+                python -m tools.replay RECORDING [--csv OUT] [--gains JSON | --config FILE]
+                                                 [--compare CSV] [--extract FILE]
+
+                RECORDING is a file written by the 'r' key, or a telemetry
+                capture holding TYPE_RAW packets when record.sink is 'usb'.
+                The recorded ADC conversions and BNO055 register bytes are
+                fed back through unmodified touch_pan.Touch_Pan and
+                BNO055.BNO055 drivers, Task_Panel, Task_IMU and a
+                ClosedLoopPair on the simulated board, with the clock set to
+                the recorded time stamps. Every sensor task run is followed by
+                one controller run, and its state vectors and duty cycles are
+                written to the CSV file in the columns used by
+                tools.decode_telemetry.
+
+                Replays are deterministic, so two CSV files made from the same
+                recording can be compared with --compare to bisect changes to
+                the drivers, the filters or the gains. A driver change that
+                reads the sensors differently from the recording stops the
+                replay with ReplayError at the first mismatch.
+   @author      Faith Chau
+   @author      Luisa Chiu
+   @date        October 18, 2026
+'''
+
+import argparse
+import csv
+import json
+import sys
+import time
+
+import numpy as np
+
+import recorder
+import sim
+import telemetry
+from sim.board import TICKS_MAX
+from tools.autotune import read_gains
+from tools.decode_telemetry import CSV_HEADER, read_file
+
+
+class ReplayError(Exception):
+    ''' @brief  The drivers read the sensors differently from the recording
+    '''
+
+
+class ReplayGap(Exception):
+    ''' @brief  The next records were dropped on the board
+    '''
+
+
+class Stream:
+    ''' @brief      The records of a recording, with their time stamps unwrapped
+    '''
+
+    def __init__(self, records):
+        ''' @brief          Wraps a generator of records
+            @param records  A generator of (ticks_us, kind, channel, payload) tuples
+        '''
+        ## @brief     The remaining records
+        self._records = iter(records)
+        ## @brief     The next record, or None when all have been taken
+        self._next = None
+        ## @brief     The last raw time stamp, for unwrapping
+        self._tick = None
+        ## @brief     Unwrapped time of the next record in microseconds
+        self.time_us = 0
+        ## @brief     Number of records taken
+        self.taken = 0
+        self._fetch()
+
+    def _fetch(self):
+        record = next(self._records, None)
+        if record is not None:
+            tick = record[0]
+            if self._tick is None:
+                self.time_us = tick
+            else:
+                self.time_us += (tick - self._tick) & TICKS_MAX
+            self._tick = tick
+        self._next = record
+
+    def peek(self):
+        ''' @brief  Returns the next record without taking it, or None at the end
+        '''
+        return self._next
+
+    def skip(self):
+        ''' @brief  Drops the next record
+        '''
+        self.taken += 1
+        self._fetch()
+
+    def take(self, kind, channel, length=None):
+        ''' @brief          Takes the next record, which must match what a driver reads
+            @param kind     The expected record kind
+            @param channel  The expected channel, or first register
+            @param length   The expected payload length in bytes, or None for any
+            @return         The payload
+        '''
+        record = self._next
+        if record is None:
+            raise EOFError
+        if record[1] == recorder.KIND_GAP:
+            raise ReplayGap
+        if record[1] != kind or record[2] != channel or (length is not None and len(record[3]) != length):
+            raise ReplayError('Record {:} is kind {:} channel {:} with {:} bytes; the driver read kind {:} '
+                              'channel {:} with {:} bytes'.format(self.taken, record[1], record[2], len(record[3]),
+                                                                 kind, channel, length))
+        self.skip()
+        return record[3]
+
+
+class ReplayADC:
+    ''' @brief      Stands in for a pyb.ADC object, returning recorded conversions
+    '''
+
+    def __init__(self, stream, channel):
+        ## @brief     The Stream records are taken from
+        self.stream = stream
+        ## @brief     recorder.ADC_XP or recorder.ADC_YM
+        self.channel = channel
+
+    def read(self):
+        ''' @brief  Returns the next recorded conversion
+        '''
+        return int.from_bytes(self.stream.take(recorder.KIND_ADC, self.channel, 2), 'little')
+
+    def read_timed(self, buf, timer):
+        ''' @brief  Fills buf with the next recorded conversions
+        '''
+        payload = self.stream.take(recorder.KIND_ADC, self.channel, 2*len(buf))
+        buf[:] = type(buf)(buf.typecode, payload)
+
+
+class ReplayI2C:
+    ''' @brief      Stands in for a pyb.I2C object, returning recorded register bytes
+    '''
+
+    def __init__(self, stream):
+        ## @brief     The Stream records are taken from
+        self.stream = stream
+
+    def mem_read(self, data, addr, memaddr):
+        ''' @brief  Returns, or fills data with, the next recorded register read
+        '''
+        if isinstance(data, int):
+            return self.stream.take(recorder.KIND_I2C, memaddr, data)
+        view = memoryview(data).cast('B')
+        view[:] = self.stream.take(recorder.KIND_I2C, memaddr, len(view))
+        return data
+
+    def mem_write(self, data, addr, memaddr):
+        ''' @brief  Ignores register writes, which did not change the recorded readings
+        '''
+
+
+class Replay:
+    ''' @brief      The firmware sensor and controller chain fed from a recording
+    '''
+
+    def __init__(self, description, records, gains=None):
+        ''' @brief              Builds the drivers, tasks and controller on a fresh virtual board
+            @param description  The description dictionary of the recording
+            @param records      A generator of records, as from recorder.read_recording()
+            @param gains        A 2x4 gain matrix, or None to use the recorded gains
+        '''
+        sim.reset(virtual=True)
+        import pyb
+        import shares
+        import touch_pan
+        import BNO055
+        import task_panel
+        import task_IMU
+        import closedloop
+        import config
+
+        ## @brief     The records being replayed
+        self.stream = Stream(records)
+        periods = description.get('periods', {task['name']: task['period'] for task in config.DEFAULTS['tasks']})
+        pan = description.get('panel', {})
+        ## @brief     Settling delay before each panel scan, in microseconds
+        self.settle_us = pan.get('settle_us', 0)
+
+        ## @brief     Shared state vector x
+        self.state_vect_x = shares.StateVector(4)
+        ## @brief     Shared state vector y
+        self.state_vect_y = shares.StateVector(4)
+        flag = shares.Share(0)
+        ## @brief     The touch panel driver
+        self.panel = touch_pan.Touch_Pan(*description.get('panel_pins', config.DEFAULTS['panel']['pins']))
+        samples = pan.get('samples', 1)
+        self.panel.set_oversampling(samples, pyb.Timer(config.DEFAULTS['panel']['timer'],
+                                                       freq=config.DEFAULTS['panel']['sample_freq']) if samples > 1 else None,
+                                    settle_us=self.settle_us, method=pan.get('method', touch_pan.MEDIAN))
+        if pan.get('calibrated'):
+            for i, value in enumerate(pan['beta']):
+                self.panel.beta[i] = value
+            self.panel.calibrate_flag = 1
+        self.panel.wrap_adcs(lambda adc, channel: ReplayADC(self.stream, channel))
+        ## @brief     The orientation sensor driver
+        self.imu = BNO055.BNO055(ReplayI2C(self.stream), flag)
+        # The drivers sleep while they start up, so the clock is aligned with the first
+        # record only once they are built and before any task reads it
+        sim.board.clock.reset()
+        sim.board.clock.advance(self.stream.time_us)
+        ## @brief     The touch panel task
+        self.task_panel = task_panel.Task_Panel(periods['panel'], self.panel, self.state_vect_x, self.state_vect_y, flag)
+        ## @brief     The IMU task
+        self.task_imu = task_IMU.Task_IMU(periods['imu'], self.imu, self.state_vect_x, flag, self.state_vect_y)
+        gains = description.get('gains', config.DEFAULTS['gains']) if gains is None else gains
+        saturation = description.get('saturation', config.DEFAULTS['saturation'])
+        ## @brief     The controller computing the duty cycles
+        self.controller = closedloop.ClosedLoopPair(saturation, -saturation, shares.Share(0), shares.Share(0),
+                                                    self.state_vect_x, self.state_vect_y, np.array(gains))
+        ## @brief     Number of panel task runs
+        self.panel_runs = 0
+        ## @brief     Number of IMU task runs
+        self.imu_runs = 0
+        ## @brief     Records outside a sensor task run, such as IMU calibration reads
+        self.skipped = 0
+        ## @brief     Number of gaps where the board dropped records
+        self.gaps = 0
+
+    def step(self):
+        ''' @brief      Runs the sensor task that took the next records, then the controller
+            @return     True if a task ran, False if the next record was skipped, None at the end
+        '''
+        stream = self.stream
+        record = stream.peek()
+        if record is None:
+            return None
+        kind, channel, payload = record[1:]
+        clock = sim.board.clock
+        if kind == recorder.KIND_ADC and channel == recorder.ADC_XP and len(payload) == 2:
+            # The z conversion is taken after one settling delay
+            clock.advance(stream.time_us - self.settle_us - clock.now())
+            task = self.task_panel
+            self.panel_runs += 1
+        elif kind == recorder.KIND_I2C and channel == 0x14:
+            clock.advance(stream.time_us - clock.now())
+            task = self.task_imu
+            self.imu_runs += 1
+        else:
+            if kind == recorder.KIND_GAP:
+                self.gaps += 1
+            else:
+                self.skipped += 1
+            stream.skip()
+            return False
+        try:
+            task.run()
+        except ReplayGap:
+            return False
+        except EOFError:
+            return None
+        self.controller.run()
+        return True
+
+    def row(self):
+        ''' @brief  Returns the time in seconds, both state vectors and both duty cycles
+        '''
+        return ([sim.board.clock.now()/1e6] + list(self.state_vect_x.values) + list(self.state_vect_y.values)
+                + [self.controller.duty_1, self.controller.duty_2])
+
+
+def load(path):
+    ''' @brief      Reads a recording file or extracts one from a telemetry capture
+        @details    Records are not aligned with telemetry packets, so the records after a
+                    lost packet cannot be parsed. The recording is cut at the first packet
+                    missing from the sequence numbers after it started.
+        @param path The file to read
+        @return     A tuple of the recording bytes and whether it was cut short by a lost packet
+    '''
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data.startswith(recorder.MAGIC):
+        return data, False
+    decoder = telemetry.Decoder()
+    parts = []
+    next_seq = None
+    for chunk in read_file(path):
+        for kind, seq, payload in decoder.feed(chunk):
+            if parts and seq != next_seq:
+                return b''.join(parts), True
+            next_seq = (seq + 1) & 0xFFFF
+            if kind == telemetry.TYPE_RAW:
+                parts.append(payload)
+    return b''.join(parts), False
+
+
+def compare(path_a, path_b, tol=1e-6):
+    ''' @brief          Compares two replay CSV files
+        @return         A description of the first difference, or None if they agree
+    '''
+    a = np.loadtxt(path_a, delimiter=',', skiprows=1, ndmin=2)
+    b = np.loadtxt(path_b, delimiter=',', skiprows=1, ndmin=2)
+    rows = min(len(a), len(b))
+    diff = np.abs(a[:rows] - b[:rows]) > tol*np.maximum(1, np.abs(a[:rows]))
+    if diff.any():
+        row, col = np.argwhere(diff)[0]
+        return 'row {:} ({:.6f} s), {:}: {:.6g} != {:.6g}'.format(row + 1, a[row, 0], CSV_HEADER[col],
+                                                                  a[row, col], b[row, col])
+    if len(a) != len(b):
+        return 'lengths differ: {:} and {:} rows'.format(len(a), len(b))
+    return None
+
+
+def main(argv=None):
+    ''' @brief Parses the command line and replays a recording
+    '''
+    parser = argparse.ArgumentParser(prog='python -m tools.replay',
+                                     description='Replay a raw sensor recording through the Lab 0x0FF firmware.')
+    parser.add_argument('recording', help='recording file or telemetry capture')
+    parser.add_argument('--csv', help='CSV file the state vectors and duty cycles are written to')
+    parser.add_argument('--gains', help='JSON 2x4 gain matrix replacing the recorded gains')
+    parser.add_argument('--config', help='configuration file whose gains replace the recorded gains')
+    parser.add_argument('--compare', metavar='CSV', help='CSV file from an earlier replay to compare --csv with')
+    parser.add_argument('--extract', metavar='FILE', help='file a recording found in a telemetry capture is saved to')
+    args = parser.parse_args(argv)
+    if args.compare and not args.csv:
+        parser.error('--compare needs --csv')
+
+    data, cut = load(args.recording)
+    if cut:
+        print('Warning: telemetry packets were lost during the recording; it is replayed up to the first one lost')
+    if args.extract:
+        with open(args.extract, 'wb') as f:
+            f.write(data)
+    description, records = recorder.read_recording(data)
+    gains = json.loads(args.gains) if args.gains else read_gains(args.config) if args.config else None
+    replay = Replay(description, records, gains)
+
+    csv_file = open(args.csv, 'w', newline='') if args.csv else None
+    writer = csv.writer(csv_file) if csv_file else None
+    if writer:
+        writer.writerow(CSV_HEADER)
+    start = time.perf_counter()
+    start_us = replay.stream.time_us
+    try:
+        while True:
+            ran = replay.step()
+            if ran is None:
+                break
+            if ran and writer:
+                writer.writerow(['{:.6f}'.format(v) if i == 0 else '{:.6g}'.format(v) for i, v in enumerate(replay.row())])
+    except ReplayError as e:
+        print('Replay stopped: {:}'.format(e))
+    finally:
+        if csv_file:
+            csv_file.close()
+    elapsed = time.perf_counter() - start
+    duration = (sim.board.clock.now() - start_us)/1e6
+    print('Replayed {:.1f} s in {:.2f} s: {:} panel runs, {:} IMU runs, {:} records skipped, {:} gaps'.format(
+          duration, elapsed, replay.panel_runs, replay.imu_runs, replay.skipped, replay.gaps))
+    if args.compare:
+        difference = compare(args.compare, args.csv)
+        print('Matches ' + args.compare if difference is None else 'First difference at ' + difference)
+        if difference is not None:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+'''@file        robustness.py
+   @brief       Monte Carlo robustness benchmark of the controller gains.
+   @details     Usage:
+                python -m tools.robustness [--gains JSON | --config config.json] [--draws N]
+                                           [--configurations FILE] [--report robustness.json]
+
+                Runs the gains in a real closedloop.ClosedLoopPair against
+                the batched plant in ::sim.plant for many random draws of
+                - touch panel noise: the ball position is measured with normal
+                  noise of a standard deviation drawn up to panel_noise mm
+                - IMU latency: plate angles and rates arrive a number of
+                  control periods late, drawn up to imu_latency
+                - motor gain: the motor torque is scaled by a factor drawn within
+                  1 +/- motor_gain
+                - ball mass: scaled by a factor drawn within 1 +/- ball_mass
+                and random initial offsets. Each set of these four ranges is a
+                configuration; CONFIGURATIONS is used unless a JSON file with a
+                list of them is given.
+
+                A draw succeeds when the ball settles within the tolerance
+                and never leaves the plate. The report gives, per
+                configuration, the success rate with a 95% Wilson interval and
+                statistics of the settling time, overshoot and saturation
+                time, plus the gain and delay margins of the linearized loop.
+                It also records the result of sim.plant.check(), which
+                compares the experimental plant model with a rig run, and the
+                git commit the report was made from, with whether the working
+                tree had uncommitted changes. Until the check passes the
+                results say nothing about the hardware.
+
+                Draws are simulated in fixed chunks spread over a process
+                pool, and every chunk has its own seed derived from --seed, so
+                the report depends only on the gains, the plant and the
+                command line, not on the number of workers. It holds no time
+                stamps and can be compared directly between revisions.
+   @author      Faith Chau
+   @author      Luisa Chiu
+   @date        October 18, 2026
+'''
+
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+
+import numpy as np
+
+import config
+from sim import plant
+from tools.autotune import read_gains
+from tools.lqr import discretize, linearize
+
+## @brief     Version of the report layout
+REPORT_VERSION = 2
+## @brief     Directory of the firmware package, where git is run
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+## @brief     Configurations benchmarked by default
+#  @details   panel_noise is in mm, imu_latency in control periods, and motor_gain and
+#             ball_mass are relative spreads. The IMU task runs every 10 ms, so its
+#             readings are up to 20 periods of 500 us old.
+CONFIGURATIONS = [
+    {'name': 'nominal', 'panel_noise': 0.0, 'imu_latency': 0,  'motor_gain': 0.0, 'ball_mass': 0.0},
+    {'name': 'bench',   'panel_noise': 0.5, 'imu_latency': 20, 'motor_gain': 0.2, 'ball_mass': 0.3},
+    {'name': 'stress',  'panel_noise': 2.0, 'imu_latency': 40, 'motor_gain': 0.4, 'ball_mass': 0.6},
+    ]
+
+
+def run_chunk(task):
+    ''' @brief      Simulates one chunk of draws of a configuration
+        @param task A tuple (configuration, draws, seed sequence, settings)
+        @return     A dictionary of per-draw arrays
+    '''
+    cfg, draws, seed, settings = task
+    rng = np.random.default_rng(seed)
+    motor_gain = rng.uniform(1 - cfg['motor_gain'], 1 + cfg['motor_gain'], draws)
+    ball_mass = plant.DEFAULT_PARAMS['m_B']*rng.uniform(1 - cfg['ball_mass'], 1 + cfg['ball_mass'], draws)
+    noise_mm = rng.uniform(0, cfg['panel_noise'], draws)
+    latency = rng.integers(0, cfg['imu_latency'] + 1, draws)
+    model = plant.BallPlate(draws, gain=motor_gain, m_B=ball_mass)
+    q0 = np.zeros((draws, 2, 4))
+    q0[..., 0] = rng.uniform(-settings['offset'], settings['offset'], (draws, 2))/1000
+    model.reset(q0)
+    delay = np.zeros((draws, 4), dtype=int)
+    delay[:, 1] = delay[:, 3] = latency
+    noise = np.zeros((draws, 1, 4))
+    noise[:, 0, 0] = noise_mm
+    controller = plant.make_controller(settings['gains'], settings['saturation'])
+    episode = plant.simulate(plant.BatchController(controller), model, settings['seconds'],
+                             settings['period']*1e-6, delay=delay, noise=noise, rng=rng,
+                             tol_mm=settings['tolerance'])
+    return {'success': np.isfinite(episode.settling_time) & ~episode.diverged,
+            'diverged': episode.diverged, 'settling_time': episode.settling_time,
+            'overshoot': episode.overshoot, 'saturation_time': episode.saturation_time,
+            'motor_gain': motor_gain, 'ball_mass': ball_mass, 'panel_noise': noise_mm, 'imu_latency': latency}
+
+
+def linear_margins(gains, period, max_delay=400):
+    ''' @brief          Stability margins of the linearized loop of each motor
+        @param gains    A 2x4 gain matrix
+        @param period   Control period in microseconds
+        @param max_delay Largest delay searched, in control periods
+        @return         A list with one dictionary per motor holding the range of motor gain
+                        factors that stay stable and the largest stable measurement delay,
+                        or None values if the nominal loop is unstable
+    '''
+    model = plant.BallPlate(1)
+    controller = plant.BatchController(plant.make_controller(gains))
+    margins = []
+    for axis, row in enumerate(controller.duty_gain):
+        A, B = linearize(model, axis)
+        Ad, Bd = discretize(A, B, period*1e-6)
+        K = (row*model.sensor_scale[axis]).reshape(1, 4)
+
+        def stable(factor, delay=0):
+            n = 4*(delay + 1)
+            M = np.zeros((n, n))
+            M[:4, :4] = Ad
+            M[:4, n - 4:] += factor*Bd @ K
+            M[4:, :n - 4] = np.eye(n - 4)
+            return np.abs(np.linalg.eigvals(M)).max() < 1
+
+        if not stable(1.0):
+            margins.append({'gain_min': None, 'gain_max': None, 'delay_periods': None, 'delay_ms': None})
+            continue
+        bounds = []
+        for limit in (1e-3, 1e3):
+            inside, outside = 1.0, 1.0
+            while stable(outside) and abs(np.log(outside)) < abs(np.log(limit)):
+                inside, outside = outside, outside*(2 if limit > 1 else 0.5)
+            if stable(outside):
+                bounds.append(None)
+                continue
+            for _ in range(40):
+                middle = np.sqrt(inside*outside)
+                inside, outside = (middle, outside) if stable(middle) else (inside, middle)
+            bounds.append(inside)
+        delay = 0
+        while delay < max_delay and stable(1.0, delay + 1):
+            delay += 1
+        margins.append({'gain_min': bounds[0], 'gain_max': bounds[1],
+                        'delay_periods': delay, 'delay_ms': delay*period/1000})
+    return margins
+
+
+def summarize(cfg, results):
+    ''' @brief          Combines the chunks of one configuration into its report entry
+    '''
+    data = {key: np.concatenate([r[key] for r in results]) for key in results[0]}
+    n = len(data['success'])
+    k = int(data['success'].sum())
+    # Wilson score interval at 95% confidence
+    z = 1.96
+    centre = (k + z*z/2)/(n + z*z)
+    half = z*np.sqrt(k*(n - k)/n + z*z/4)/(n + z*z)
+    settled = data['settling_time'][data['success']]
+    failed = ~data['success']
+    entry = dict(cfg, draws=n, successes=k, success_rate=k/n, success_interval=[centre - half, centre + half],
+                 diverged=int(data['diverged'].sum()),
+                 settling_time={'median': float(np.median(settled)) if k else None,
+                                'p95': float(np.percentile(settled, 95)) if k else None},
+                 overshoot={'mean': float(data['overshoot'].mean()),
+                            'p95': float(np.percentile(data['overshoot'], 95))},
+                 saturation_time={'mean': float(data['saturation_time'].mean()),
+                                  'p95': float(np.percentile(data['saturation_time'], 95))},
+                 failures={name: [float(data[name][failed].min()), float(data[name][failed].max())]
+                           for name in ('motor_gain', 'ball_mass', 'panel_noise', 'imu_latency')} if failed.any() else {})
+    return entry
+
+
+def _rounded(value):
+    ''' @brief  Rounds the floats of a report so it compares cleanly between revisions
+    '''
+    if isinstance(value, float):
+        return float('{:.6g}'.format(value)) if np.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _rounded(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_rounded(item) for item in value]
+    if isinstance(value, np.generic):
+        return _rounded(value.item())
+    return value
+
+
+def revision():
+    ''' @brief      Identifies the revision of the package the report is made from
+        @details    Git runs in the package directory, wherever the tool is started from.
+        @return     A dictionary with the short commit hash and whether the working tree has
+                    uncommitted changes, or None outside a repository
+    '''
+    def git(*args):
+        return subprocess.run(('git',) + args, cwd=PACKAGE_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+
+    try:
+        return {'commit': git('rev-parse', '--short', 'HEAD'), 'dirty': bool(git('status', '--porcelain'))}
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    ''' @brief Parses the command line, runs the benchmark and writes the report
+    '''
+    parser = argparse.ArgumentParser(prog='python -m tools.robustness',
+                                     description='Monte Carlo robustness benchmark of the ClosedLoopPair gains.')
+    parser.add_argument('--gains', help='JSON 2x4 gain matrix, by default the gains in --config')
+    parser.add_argument('--config', default=config.CONFIG_FILE, help='configuration file the gains are read from')
+    parser.add_argument('--configurations', help='JSON file with a list of configurations')
+    parser.add_argument('--draws', type=int, default=2000, help='draws per configuration')
+    parser.add_argument('--chunk', type=int, default=250, help='draws simulated together in one worker')
+    parser.add_argument('--offset', type=float, default=30.0, help='largest initial ball offset in mm')
+    parser.add_argument('--seconds', type=float, default=2.0, help='simulated time per draw')
+    parser.add_argument('--period', type=float, default=500, help='control period in microseconds')
+    parser.add_argument('--tolerance', type=float, default=5.0, help='settling tolerance in mm')
+    parser.add_argument('--saturation', type=float, default=config.DEFAULTS['saturation'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes in the pool')
+    parser.add_argument('--report', default='robustness.json', help='JSON report written')
+    args = parser.parse_args(argv)
+
+    gains = json.loads(args.gains) if args.gains else read_gains(args.config)
+    configurations = CONFIGURATIONS
+    if args.configurations:
+        with open(args.configurations) as f:
+            configurations = json.load(f)
+    settings = {'gains': gains, 'saturation': args.saturation, 'draws': args.draws, 'chunk': args.chunk,
+                'offset': args.offset, 'seconds': args.seconds, 'period': args.period,
+                'tolerance': args.tolerance, 'seed': args.seed}
+
+    tasks = []
+    for number, cfg in enumerate(configurations):
+        sizes = [args.chunk]*(args.draws//args.chunk) + ([args.draws % args.chunk] if args.draws % args.chunk else [])
+        seeds = np.random.SeedSequence([args.seed, number]).spawn(len(sizes))
+        tasks += [(cfg, size, seed, settings) for size, seed in zip(sizes, seeds)]
+    with multiprocessing.Pool(args.workers) as pool:
+        results = pool.map(run_chunk, tasks)
+
+    entries = []
+    for cfg in configurations:
+        entries.append(summarize(cfg, [r for task, r in zip(tasks, results) if task[0] is cfg]))
+        e = entries[-1]
+        print('{:<12}{:>7.1%} success  [{:.1%}, {:.1%}]  {:>5} diverged'.format(
+              e['name'], e['success_rate'], e['success_interval'][0], e['success_interval'][1], e['diverged']))
+    model_check = plant.check()
+    warning = plant.check_warning(model_check)
+    if warning:
+        print(warning)
+    report = {'version': REPORT_VERSION, 'revision': revision(), 'model_check': model_check, 'settings': settings,
+              'margins': linear_margins(gains, args.period), 'configurations': entries}
+    with open(args.report, 'w') as f:
+        json.dump(_rounded(report), f, indent=1)
+    print('Report written to ' + args.report)
+
+
+if __name__ == '__main__':
+    main()